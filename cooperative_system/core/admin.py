@@ -86,7 +86,8 @@ from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from .models import (
     User, Student, Instructor, Course, Enrollment, Attendance,
     Payment, Member, InstructorHours, FinancialReport, ProfitDistribution,
-    Expense, ExpenseCategory, RecurringExpense, AuditLog
+    Expense, ExpenseCategory, RecurringExpense, AuditLog, MonthlyKpiSnapshot, Job, PaymentTransaction,
+    AttendanceMonthlyRollup, AttendanceSyncBatch, AttendanceArchive
 )
 
 # ==============================================================================
@@ -137,11 +138,11 @@ class InstructorAdmin(admin.ModelAdmin):
 
 @admin.register(Course)
 class CourseAdmin(admin.ModelAdmin):
-    list_display = ['name', 'course_type', 'subject', 'monthly_fee', 'enrollment_limit', 'is_active']
+    list_display = ['name', 'course_type', 'subject', 'monthly_fee', 'active_enrollment_count', 'enrollment_limit', 'is_active']
     list_filter = ['course_type', 'subject', 'is_active']
     search_fields = ['name', 'description']
     filter_horizontal = ['instructors']
-    readonly_fields = ['created_at', 'updated_at']
+    readonly_fields = ['active_enrollment_count', 'created_at', 'updated_at']
 
 
 @admin.register(Enrollment)
@@ -162,17 +163,67 @@ class AttendanceAdmin(admin.ModelAdmin):
     readonly_fields = ['created_at', 'updated_at']
 
 
+@admin.register(AttendanceMonthlyRollup)
+class AttendanceMonthlyRollupAdmin(admin.ModelAdmin):
+    list_display = ['enrollment', 'month', 'present', 'absent', 'excused', 'updated_at']
+    date_hierarchy = 'month'
+    search_fields = ['enrollment__student__first_name', 'enrollment__student__last_name']
+    readonly_fields = [field.name for field in AttendanceMonthlyRollup._meta.fields]
+    
+    def has_add_permission(self, request):
+        # Rollups are maintained from attendance records
+        return False
+
+
+@admin.register(AttendanceArchive)
+class AttendanceArchiveAdmin(admin.ModelAdmin):
+    list_display = ['enrollment', 'date', 'status', 'archived_at']
+    list_filter = ['status']
+    date_hierarchy = 'date'
+    search_fields = ['enrollment__student__first_name', 'enrollment__student__last_name']
+    readonly_fields = [field.name for field in AttendanceArchive._meta.fields]
+    
+    def has_add_permission(self, request):
+        # Rows are moved here by the archive_attendance command
+        return False
+
+
+@admin.register(AttendanceSyncBatch)
+class AttendanceSyncBatchAdmin(admin.ModelAdmin):
+    list_display = ['key', 'user', 'item_count', 'applied', 'created_at']
+    list_filter = ['created_at']
+    search_fields = ['key', 'user__username']
+    readonly_fields = [field.name for field in AttendanceSyncBatch._meta.fields]
+    
+    def has_add_permission(self, request):
+        # Batches are recorded by the attendance sync API
+        return False
+
+
 # ==============================================================================
 # FINANCIAL MANAGEMENT
 # ==============================================================================
 
+class PaymentTransactionInline(admin.TabularInline):
+    model = PaymentTransaction
+    fields = ['payment_date', 'amount', 'method', 'reference', 'recorded_by', 'created_at']
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        # Receipts are appended through the ledger so amount_paid stays in step
+        return False
+
+
 @admin.register(Payment)
 class PaymentAdmin(admin.ModelAdmin):
     list_display = ['payment_type', 'student', 'instructor', 'amount', 'amount_paid', 'status', 'month']
     list_filter = ['payment_type', 'status', 'month']
     search_fields = ['student__first_name', 'student__last_name', 'instructor__first_name', 'instructor__last_name']
     date_hierarchy = 'month'
-    readonly_fields = ['created_at', 'updated_at']
+    readonly_fields = ['amount_paid', 'created_at', 'updated_at']
+    inlines = [PaymentTransactionInline]
 
 
 @admin.register(Member)
@@ -200,6 +251,17 @@ class FinancialReportAdmin(admin.ModelAdmin):
     readonly_fields = ['created_at', 'updated_at']
 
 
+@admin.register(MonthlyKpiSnapshot)
+class MonthlyKpiSnapshotAdmin(admin.ModelAdmin):
+    list_display = ['month', 'revenue_expected', 'revenue_paid', 'instructor_payouts', 'operational_expenses', 'pending_student_payments', 'updated_at']
+    date_hierarchy = 'month'
+    readonly_fields = [field.name for field in MonthlyKpiSnapshot._meta.fields]
+    
+    def has_add_permission(self, request):
+        # Snapshots are maintained from payments and expenses
+        return False
+
+
 @admin.register(ProfitDistribution)
 class ProfitDistributionAdmin(admin.ModelAdmin):
     list_display = ['member', 'financial_report', 'share_percentage', 'amount', 'is_paid']
@@ -293,6 +355,19 @@ class AuditLogAdmin(admin.ModelAdmin):
         return request.user.is_superuser
 
 
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'kind', 'status', 'progress', 'total', 'attempts', 'worker', 'created_by', 'created_at', 'finished_at']
+    list_filter = ['status', 'kind']
+    search_fields = ['kind', 'message', 'error']
+    date_hierarchy = 'created_at'
+    readonly_fields = [field.name for field in Job._meta.fields]
+    
+    def has_add_permission(self, request):
+        # Jobs are queued by the views that need them
+        return False
+
+
 # ==============================================================================
 # ADMIN SITE CUSTOMIZATION
 # ==============================================================================
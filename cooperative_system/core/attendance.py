@@ -0,0 +1,357 @@
+"""
+Attendance write and reporting helpers for the Educational Cooperative System
+
+Attendance older than ATTENDANCE_HOT_MONTHS is moved to AttendanceArchive by
+``manage.py archive_attendance``. Readers go through ``attendance_tiers``,
+which adds the archive only when the requested dates reach into it, so
+current reports touch the live table alone.
+"""
+
+import hashlib
+import json
+from datetime import timedelta
+
+from dateutil.relativedelta import relativedelta
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from .attendance_codes import STATUS_CODES
+from .decorators import may_record_attendance
+from .forms import AttendanceMarkForm
+from .models import Attendance, AttendanceArchive, AttendanceMonthlyRollup, AttendanceSyncBatch, Enrollment
+
+
+VALID_STATUSES = {value for value, label in Attendance.STATUS_CHOICES}
+
+
+def upsert_attendance(records, update_fields=('status',), batch_size=1000):
+    """
+    Insert or update attendance rows keyed on (enrollment, date) in one
+    transaction using INSERT ... ON CONFLICT DO UPDATE.
+
+    ``records`` is an iterable of unsaved Attendance instances. Only
+    ``update_fields`` (plus updated_at) are overwritten on existing rows.
+    Archived rows for the same days are dropped, and the monthly rollups of
+    the affected enrollments are refreshed, in the same transaction.
+    """
+    records = list(records)
+    if not records:
+        return records
+    with transaction.atomic():
+        AttendanceArchive.release((record.enrollment_id, record.date) for record in records)
+        Attendance.objects.bulk_create(
+            records,
+            batch_size=batch_size,
+            update_conflicts=True,
+            unique_fields=['enrollment', 'date'],
+            update_fields=list(update_fields) + ['updated_at'],
+        )
+        # bulk_create bypasses the signal handlers that maintain the rollups
+        AttendanceMonthlyRollup.refresh(
+            {record.enrollment_id for record in records},
+            {record.date.replace(day=1) for record in records},
+        )
+    return records
+
+
+# ==============================================================================
+# ARCHIVE
+# ==============================================================================
+
+DEFAULT_HOT_MONTHS = 24
+ARCHIVE_BATCH_SIZE = 2000
+ARCHIVE_FIELDS = ['enrollment_id', 'date', 'status', 'notes', 'created_at', 'updated_at']
+
+
+def archive_cutoff(today):
+    """First day of the oldest month kept in the live attendance table."""
+    months = getattr(settings, 'ATTENDANCE_HOT_MONTHS', DEFAULT_HOT_MONTHS)
+    return today.replace(day=1) - relativedelta(months=months)
+
+
+def attendance_tiers(start=None, end=None):
+    """
+    Querysets of the attendance dated between ``start`` and ``end`` (inclusive;
+    either may be None): the live table, followed by the archive only if it
+    has rows in that range. Both have the same fields.
+    """
+    tiers = [Attendance.objects.all(), AttendanceArchive.objects.all()]
+    if start is not None:
+        tiers = [tier.filter(date__gte=start) for tier in tiers]
+    if end is not None:
+        tiers = [tier.filter(date__lte=end) for tier in tiers]
+    if not tiers[1].exists():
+        del tiers[1]
+    return tiers
+
+
+def archive_attendance(before, batch_size=ARCHIVE_BATCH_SIZE):
+    """
+    Move attendance dated before ``before`` into AttendanceArchive, oldest
+    first, one batch per transaction. Returns the number of rows moved.
+
+    Rollups count both tables, so moving a row leaves them as they are; only
+    a row that replaces an archived one for the same day has its month
+    recomputed.
+    """
+    moved = 0
+    while True:
+        with transaction.atomic():
+            rows = list(
+                Attendance.objects.select_for_update()
+                .filter(date__lt=before)
+                .order_by('date', 'pk')
+                .values_list('pk', *ARCHIVE_FIELDS)[:batch_size]
+            )
+            if not rows:
+                return moved
+            keys = {(enrollment_id, day) for _, enrollment_id, day, *_ in rows}
+            replaced = keys.intersection(
+                AttendanceArchive.objects.filter(
+                    enrollment_id__in={enrollment_id for enrollment_id, _ in keys},
+                    date__gte=rows[0][2], date__lte=rows[-1][2],
+                ).values_list('enrollment_id', 'date')
+            )
+            AttendanceArchive.objects.bulk_create(
+                [AttendanceArchive(**dict(zip(ARCHIVE_FIELDS, row[1:]))) for row in rows],
+                update_conflicts=True,
+                unique_fields=['enrollment', 'date'],
+                update_fields=['status', 'notes', 'created_at', 'updated_at'],
+            )
+            # A raw delete skips the per-row Attendance signal handlers, which
+            # would recompute rollups whose totals have not changed
+            moved_rows = Attendance.objects.filter(pk__in=[row[0] for row in rows])
+            moved_rows._raw_delete(moved_rows.db)
+            if replaced:
+                AttendanceMonthlyRollup.refresh(
+                    {enrollment_id for enrollment_id, _ in replaced}, {day.replace(day=1) for _, day in replaced}
+                )
+        moved += len(rows)
+
+
+# ==============================================================================
+# REPORTING
+# ==============================================================================
+
+def _next_month(day):
+    return (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def attendance_counts(start=None, end=None, course_id=None):
+    """
+    Return {status: count} for attendance between ``start`` and ``end``
+    (inclusive dates; either may be None), optionally for one course.
+
+    Whole months are summed from AttendanceMonthlyRollup. Only the partial
+    months at either end of the range read attendance rows, by date index,
+    and the archive only when those months have been archived.
+    """
+    # Whole months in the range are first_full <= month < after_full
+    first_full = start if start is None or start.day == 1 else _next_month(start)
+    after_full = None
+    if end is not None:
+        after_full = _next_month(end) if _next_month(end) - timedelta(days=1) == end else end.replace(day=1)
+
+    counts = dict.fromkeys(AttendanceMonthlyRollup.STATUS_FIELDS, 0)
+    partial_ranges = []
+    if first_full is not None and after_full is not None and first_full >= after_full:
+        partial_ranges.append((start, end))
+    else:
+        rollups = AttendanceMonthlyRollup.objects.all()
+        if first_full is not None:
+            rollups = rollups.filter(month__gte=first_full)
+        if after_full is not None:
+            rollups = rollups.filter(month__lt=after_full)
+        if course_id:
+            rollups = rollups.filter(enrollment__course_id=course_id)
+        totals = rollups.aggregate(**{field: Sum(field) for field in counts})
+        counts.update({field: value or 0 for field, value in totals.items()})
+        if start is not None and start < first_full:
+            partial_ranges.append((start, first_full - timedelta(days=1)))
+        if end is not None and after_full <= end:
+            partial_ranges.append((after_full, end))
+
+    for low, high in partial_ranges:
+        for attendance in attendance_tiers(low, high):
+            if course_id:
+                attendance = attendance.filter(enrollment__course_id=course_id)
+            for row in attendance.values('status').annotate(count=Count('id')).order_by():
+                counts[row['status']] += row['count']
+    return counts
+
+
+# ==============================================================================
+# ATTENDANCE MATRIX
+# ==============================================================================
+
+
+class AttendanceMatrix:
+    """
+    Students by session dates for one course and month.
+
+    ``students`` holds (enrollment_id, last_name, first_name) rows and
+    ``dates`` the days with at least one record. Cells live in one flat
+    bytearray, row-major, holding the STATUS_CODES of each record.
+    """
+
+    def __init__(self, course, month, students, dates):
+        self.course = course
+        self.month = month
+        self.students = students
+        self.dates = dates
+        self.cells = bytearray(len(students) * len(dates))
+
+    def __len__(self):
+        return len(self.students)
+
+    def codes(self, index):
+        width = len(self.dates)
+        return self.cells[index * width:(index + 1) * width]
+
+    def rows(self):
+        """Yield (last_name, first_name, status codes, {status: count}) per student."""
+        for index, (_, last_name, first_name) in enumerate(self.students):
+            codes = self.codes(index)
+            totals = {status: codes.count(code) for status, code in STATUS_CODES.items()}
+            yield last_name, first_name, codes, totals
+
+    def date_totals(self, status='present'):
+        """How many students had ``status`` on each date."""
+        width, code = len(self.dates), STATUS_CODES[status]
+        return [self.cells[column::width].count(code) if width else 0 for column in range(width)]
+
+
+def attendance_matrix(course, month):
+    """
+    Build the AttendanceMatrix of ``course`` for the month containing ``month``.
+
+    The month's attendance is read with one values_list query per tier of
+    attendance_tiers and the roster with another: active enrollments plus
+    any inactive ones that still have records that month. Nothing else is
+    queried, whatever the class size.
+    """
+    start = month.replace(day=1)
+    records = []
+    # Archive first, so a live row recorded for an archived day wins its cell
+    for tier in reversed(attendance_tiers(start, _next_month(start) - timedelta(days=1))):
+        records.extend(
+            tier.filter(enrollment__course=course).values_list('enrollment_id', 'date', 'status').order_by()
+        )
+    recorded = {enrollment_id for enrollment_id, _, _ in records}
+    students = list(
+        Enrollment.objects.filter(course=course)
+        .filter(Q(is_active=True) | Q(pk__in=recorded))
+        .order_by('student__last_name', 'student__first_name', 'pk')
+        .values_list('pk', 'student__last_name', 'student__first_name')
+    )
+    dates = sorted({day for _, day, _ in records})
+
+    matrix = AttendanceMatrix(course, start, students, dates)
+    width = len(dates)
+    row_of = {student[0]: index for index, student in enumerate(students)}
+    column_of = {day: index for index, day in enumerate(dates)}
+    for enrollment_id, day, status in records:
+        matrix.cells[row_of[enrollment_id] * width + column_of[day]] = STATUS_CODES[status]
+    return matrix
+
+
+# ==============================================================================
+# ATTENDANCE SYNC
+# ==============================================================================
+
+MAX_SYNC_MARKS = 2000
+# Keys older than this are forgotten; a client retries long before
+SYNC_KEY_RETENTION = timedelta(days=30)
+
+
+class SyncKeyConflict(ValueError):
+    """An idempotency key that was already used for a different batch."""
+
+
+def recordable_courses(user, course_ids):
+    """
+    The subset of ``course_ids`` that ``user`` may record attendance for: the
+    can_record_attendance roles may record any course, as in attendance_record.
+    """
+    if not course_ids or not may_record_attendance(user):
+        return set()
+    return set(course_ids)
+
+
+def sync_attendance(user, key, items):
+    """
+    Apply a batch of attendance marks uploaded under the idempotency ``key``.
+
+    ``items`` are dicts with ``course``, ``student``, ``date``, ``status`` and
+    optionally ``notes``. Valid marks are upserted in one transaction; the
+    others are rejected individually. Returns (AttendanceSyncBatch, replayed):
+    a batch already stored under ``key`` is returned as it is instead of being
+    applied again, and SyncKeyConflict is raised if it held different marks.
+    """
+    digest = hashlib.sha256(json.dumps(items, sort_keys=True, default=str).encode()).hexdigest()
+    existing = AttendanceSyncBatch.objects.filter(user=user, key=key).first()
+    if existing is not None:
+        return _replay(existing, digest), True
+
+    results = [{'index': index, 'status': 'applied'} for index in range(len(items))]
+    marks = []
+    for index, item in enumerate(items):
+        form = AttendanceMarkForm(item if isinstance(item, dict) else {})
+        if form.is_valid():
+            marks.append((index, form.cleaned_data, 'notes' in item))
+        else:
+            results[index].update(status='rejected', error='Invalid mark.', fields=form.errors.get_json_data())
+
+    # Permissions are checked once per batch, enrollments resolved in one query
+    allowed = recordable_courses(user, {mark['course'] for _, mark, _ in marks})
+    enrollments = {
+        (course_id, student_id): pk
+        for course_id, student_id, pk in Enrollment.objects.filter(
+            course_id__in=allowed, student_id__in={mark['student'] for _, mark, _ in marks}
+        ).values_list('course_id', 'student_id', 'pk')
+    }
+
+    # Later marks for the same student and date win, as if posted one by one
+    records = {}
+    for index, mark, has_notes in marks:
+        if mark['course'] not in allowed:
+            results[index].update(status='rejected', error=f'You may not record attendance for course {mark["course"]}.')
+            continue
+        enrollment_id = enrollments.get((mark['course'], mark['student']))
+        if enrollment_id is None:
+            results[index].update(
+                status='rejected', error=f'Student {mark["student"]} is not enrolled in course {mark["course"]}.'
+            )
+            continue
+        records[(enrollment_id, mark['date'])] = (
+            Attendance(enrollment_id=enrollment_id, date=mark['date'], status=mark['status'], notes=mark['notes']),
+            has_notes,
+        )
+
+    applied = sum(result['status'] == 'applied' for result in results)
+    try:
+        with transaction.atomic():
+            # Marks without notes leave the notes already on the row alone
+            upsert_attendance(
+                [record for record, has_notes in records.values() if has_notes], update_fields=('status', 'notes')
+            )
+            upsert_attendance([record for record, has_notes in records.values() if not has_notes])
+            AttendanceSyncBatch.objects.filter(user=user, created_at__lt=timezone.now() - SYNC_KEY_RETENTION).delete()
+            batch = AttendanceSyncBatch.objects.create(
+                user=user, key=key, digest=digest, item_count=len(items), applied=applied, results=results
+            )
+    except IntegrityError:
+        # A concurrent upload of the same batch won; everything above rolled back
+        existing = AttendanceSyncBatch.objects.filter(user=user, key=key).first()
+        if existing is None:
+            raise
+        return _replay(existing, digest), True
+    return batch, False
+
+
+def _replay(batch, digest):
+    if batch.digest != digest:
+        raise SyncKeyConflict(f'Key {batch.key} was already used for a different batch.')
+    return batch
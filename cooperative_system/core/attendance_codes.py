@@ -0,0 +1,10 @@
+"""
+Compact attendance status codes for the Educational Cooperative System
+
+Kept free of Django imports so the PDF worker processes in core/pdf_engine.py,
+which never call ``django.setup()``, can import them through pdf_generator.
+"""
+
+# One byte per cell of an attendance matrix; 0 means no record
+STATUS_CODES = {'present': 1, 'absent': 2, 'excused': 3}
+STATUS_LETTERS = ['', 'P', 'A', 'E']
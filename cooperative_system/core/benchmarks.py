@@ -0,0 +1,260 @@
+"""
+View benchmarks for the Educational Cooperative System
+
+Times every read-only page of the app against a generated dataset and
+compares latency and SQL query counts with the committed baseline in
+benchmark_baseline.json. Used by the benchmark_views command and the query
+budget tests.
+
+``full_table_scans`` checks the query plans of the dashboard and report pages
+for full scans of the tables that grow with the cooperative.
+"""
+
+import io
+import json
+import math
+import re
+import time
+from pathlib import Path
+
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from . import jobs
+from .models import Course, FinancialReport, Instructor, Job, Member, Payment, Student, User
+
+
+BASELINE_PATH = Path(__file__).resolve().parent / 'benchmark_baseline.json'
+
+DEFAULT_DATASET = {
+    'students': 500,
+    'courses': 20,
+    'months': 6,
+    'end_month': '2025-12',
+    'seed': 42,
+}
+
+# A p50 slower than baseline * threshold, and by more than this, is a
+# regression; p95 over a handful of requests is too noisy to gate on
+DEFAULT_THRESHOLD = 1.5
+MIN_REGRESSION_MS = 10.0
+
+# (URL name, URL kwarg, model whose first row provides the kwarg)
+BENCHMARK_VIEWS = [
+    ('core:dashboard', None, None),
+    ('core:financial_overview', None, None),
+    ('core:intelligence_dashboard', None, None),
+    ('core:compliance_dashboard', None, None),
+    ('core:comprehensive_report', None, None),
+    ('core:api_financial_summary', None, None),
+    ('core:api_enrollment_stats', None, None),
+    ('core:api_financial_series', None, None),
+    ('core:user_management', None, None),
+    ('core:create_user', None, None),
+    ('core:change_password', None, None),
+    ('core:expense_list', None, None),
+    ('core:expense_create', None, None),
+    ('core:expense_report', None, None),
+    ('core:recurring_expense_list', None, None),
+    ('core:recurring_expense_create', None, None),
+    ('core:audit_log', None, None),
+    ('core:student_list', None, None),
+    ('core:student_create', None, None),
+    ('core:student_detail', 'pk', Student),
+    ('core:student_edit', 'pk', Student),
+    ('core:instructor_list', None, None),
+    ('core:instructor_create', None, None),
+    ('core:instructor_detail', 'pk', Instructor),
+    ('core:instructor_edit', 'pk', Instructor),
+    ('core:course_list', None, None),
+    ('core:course_create', None, None),
+    ('core:course_detail', 'pk', Course),
+    ('core:course_edit', 'pk', Course),
+    ('core:enrollment_list', None, None),
+    ('core:enrollment_create', None, None),
+    ('core:attendance_list', None, None),
+    ('core:attendance_record', None, None),
+    ('core:attendance_report', None, None),
+    ('core:attendance_matrix', None, None),
+    ('core:payment_list', None, None),
+    ('core:student_payment_list', None, None),
+    ('core:instructor_payment_list', None, None),
+    ('core:generate_monthly_payments', None, None),
+    ('core:record_payment', 'pk', Payment),
+    ('core:member_list', None, None),
+    ('core:member_create', None, None),
+    ('core:member_detail', 'pk', Member),
+    ('core:member_edit', 'pk', Member),
+    ('core:financial_report_detail', 'pk', FinancialReport),
+    ('core:distribute_profits', 'pk', FinancialReport),
+    ('core:generate_financial_report', None, None),
+    ('core:generate_invoice_pdf', 'payment_pk', Payment),
+    ('core:bulk_invoices', None, None),
+    ('core:generate_contract_pdf', 'instructor_pk', Instructor),
+    ('core:generate_report_pdf', 'report_pk', FinancialReport),
+    ('core:job_detail', 'pk', Job),
+    ('core:job_status', 'pk', Job),
+]
+
+
+def load_baseline(path=BASELINE_PATH):
+    path = Path(path)
+    if not path.exists():
+        return None
+    with path.open() as fp:
+        return json.load(fp)
+
+
+def write_baseline(results, dataset, threshold, path=BASELINE_PATH):
+    payload = {'dataset': dataset, 'threshold': threshold, 'views': results}
+    with Path(path).open('w') as fp:
+        json.dump(payload, fp, indent=2, sort_keys=True)
+        fp.write('\n')
+
+
+def build_dataset(dataset):
+    """Generate the benchmark dataset and the objects the detail pages need."""
+    call_command('generate_fixture_data', flush=True, stdout=io.StringIO(), **dataset)
+    user = User.objects.create_user('benchmark', role='admin', is_staff=True, is_superuser=True)
+    client = Client()
+    client.force_login(user)
+    client.post(reverse('core:generate_financial_report'), {'month': dataset['end_month']})
+    jobs.work(once=True)
+    return client
+
+
+def benchmark_urls():
+    """Yield (name, url) for every benchmarked view; pk-based views use the first row."""
+    for name, kwarg, model in BENCHMARK_VIEWS:
+        if kwarg is None:
+            yield name, reverse(name)
+            continue
+        pk = model.objects.order_by('pk').values_list('pk', flat=True).first()
+        if pk is not None:
+            yield name, reverse(name, kwargs={kwarg: pk})
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def measure(client, url, repeat):
+    """Time ``repeat`` GETs of ``url`` after one warm-up request."""
+    client.get(url)
+    timings = []
+    for _ in range(repeat):
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            response = client.get(url)
+            if response.streaming:
+                b''.join(response.streaming_content)
+            timings.append((time.perf_counter() - start) * 1000)
+    return {
+        'status': response.status_code,
+        'queries': len(queries),
+        'p50_ms': round(percentile(timings, 0.5), 2),
+        'p95_ms': round(percentile(timings, 0.95), 2),
+    }
+
+
+# ==============================================================================
+# QUERY PLANS
+# ==============================================================================
+
+# Tables that grow with the number of students and months
+LARGE_TABLES = {
+    'core_student', 'core_enrollment', 'core_attendance', 'core_payment',
+    'core_attendancearchive', 'core_paymenttransaction', 'core_expense', 'core_auditlog',
+}
+
+# Dashboard and report pages whose queries must all be served by an index
+EXPLAIN_VIEWS = [
+    'core:dashboard',
+    'core:financial_overview',
+    'core:intelligence_dashboard',
+    'core:compliance_dashboard',
+    'core:comprehensive_report',
+    'core:api_financial_summary',
+    'core:api_financial_series',
+    'core:expense_report',
+    'core:attendance_report',
+    'core:attendance_matrix',
+    'core:financial_report_detail',
+    'core:payment_list',
+    'core:audit_log',
+]
+
+# SQLite: "SCAN core_payment" without "USING ... INDEX"; PostgreSQL: "Seq Scan on core_payment"
+_SQLITE_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)(?!.*USING)')
+_POSTGRES_SCAN = re.compile(r'Seq Scan on (\w+)')
+
+
+def _plan_scans(cursor, sql, params):
+    if connection.vendor == 'postgresql':
+        # Small test tables are cheaper to scan; only a missing index should show up
+        cursor.execute('SET LOCAL enable_seqscan = off')
+        cursor.execute('EXPLAIN ' + sql, params)
+        pattern = _POSTGRES_SCAN
+    else:
+        cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+        pattern = _SQLITE_SCAN
+    tables = set()
+    for row in cursor.fetchall():
+        match = pattern.search(row[-1].strip())
+        if match and match.group(1) in LARGE_TABLES:
+            tables.add(match.group(1))
+    return tables
+
+
+def full_table_scans(client, url):
+    """
+    GET ``url`` and EXPLAIN every SELECT it ran. Returns (status, [(tables, sql)])
+    for the queries that read a large table without an index.
+    """
+    statements = []
+
+    def capture(execute, sql, params, many, context):
+        if sql.lstrip().upper().startswith('SELECT'):
+            statements.append((sql, params))
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(capture):
+        response = client.get(url)
+    if response.streaming:
+        b''.join(response.streaming_content)
+
+    scans = []
+    with transaction.atomic(), connection.cursor() as cursor:
+        for sql, params in statements:
+            tables = _plan_scans(cursor, sql, params)
+            if tables:
+                scans.append((sorted(tables), sql))
+    return response.status_code, scans
+
+
+def run_benchmarks(client, repeat=5):
+    return {name: measure(client, url, repeat) for name, url in benchmark_urls()}
+
+
+def compare(results, baseline, threshold=None):
+    """Return a list of human-readable budget and regression failures."""
+    threshold = threshold or baseline.get('threshold', DEFAULT_THRESHOLD)
+    failures = []
+    for name, result in results.items():
+        if result['status'] != 200:
+            failures.append(f'{name}: returned HTTP {result["status"]}')
+        expected = baseline['views'].get(name)
+        if expected is None:
+            continue
+        if result['queries'] > expected['queries']:
+            failures.append(f'{name}: {result["queries"]} queries, budget is {expected["queries"]}')
+        limit = expected['p50_ms'] * threshold
+        if result['p50_ms'] > limit and result['p50_ms'] - expected['p50_ms'] > MIN_REGRESSION_MS:
+            failures.append(f'{name}: p50 {result["p50_ms"]} ms, baseline {expected["p50_ms"]} ms')
+    return failures
+
@@ -0,0 +1,160 @@
+"""
+Monthly billing engine for the Educational Cooperative System
+
+Plans student fee and instructor payments for a billing month with a fixed
+number of set-based queries and writes them with bulk inserts.
+"""
+
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, Sum
+
+from . import signals
+from .models import Course, Enrollment, InstructorHours, Payment
+
+
+TUTORING_RATE_PER_STUDENT = Decimal('100')
+IT_HOURLY_RATE = Decimal('120')
+MAX_IT_HOURS = Decimal('8')
+
+
+class BillingPlan:
+    """Payments and instructor hours to create for one billing month."""
+
+    def __init__(self, month):
+        self.month = month
+        self.student_payments = []
+        self.instructor_payments = []
+        self.instructor_hours = []
+        # (payment_type, payee_id) -> (existing amount, planned amount)
+        self.existing = {}
+        # payment_type -> rows actually inserted by apply_billing_plan
+        self.created = {}
+
+    @property
+    def payments(self):
+        return self.student_payments + self.instructor_payments
+
+    def skipped(self, payment_type):
+        """Planned payments of ``payment_type`` that were already there when the plan was applied."""
+        planned = sum(payment.payment_type == payment_type for payment in self.payments)
+        return planned - self.created.get(payment_type, 0)
+
+    @property
+    def changed(self):
+        """Existing payments whose stored amount differs from the planned one."""
+        return {key: amounts for key, amounts in self.existing.items() if amounts[0] != amounts[1]}
+
+
+def plan_monthly_payments(month):
+    """Compute the billing plan for ``month`` without writing anything."""
+    plan = BillingPlan(month)
+
+    existing = {}
+    for payment_type, student_id, instructor_id, amount in Payment.objects.filter(month=month).values_list(
+        'payment_type', 'student_id', 'instructor_id', 'amount'
+    ):
+        payee_id = student_id if payment_type == 'student_fee' else instructor_id
+        existing[(payment_type, payee_id)] = amount
+
+    def add_payment(target, payment_type, payee_field, payee_id, amount):
+        key = (payment_type, payee_id)
+        if key in existing:
+            plan.existing[key] = (existing[key], amount)
+        else:
+            target.append(Payment(
+                payment_type=payment_type,
+                month=month,
+                amount=amount,
+                status='pending',
+                **{payee_field: payee_id}
+            ))
+
+    # Student fees: one payment per student covering every active enrollment
+    student_fees = (
+        Enrollment.objects.filter(is_active=True)
+        .values('student_id')
+        .annotate(total=Sum('course__monthly_fee'))
+        .order_by('student_id')
+    )
+    for row in student_fees:
+        add_payment(plan.student_payments, 'student_fee', 'student_id', row['student_id'], row['total'])
+
+    # Instructor payments
+    courses = {
+        pk: (course_type, duration_hours, enrolled)
+        for pk, course_type, duration_hours, enrolled in Course.objects.filter(is_active=True)
+        .with_enrollment_stats()
+        .values_list('pk', 'course_type', 'duration_hours', 'enrolled_total')
+    }
+    assignments = (
+        Course.instructors.through.objects.filter(course_id__in=courses)
+        .order_by('instructor_id', 'course_id')
+        .values_list('instructor_id', 'course_id')
+    )
+    hours_worked = {
+        (instructor_id, course_id): hours
+        for instructor_id, course_id, hours in InstructorHours.objects.filter(month=month).values_list(
+            'instructor_id', 'course_id', 'hours_worked'
+        )
+    }
+
+    instructor_totals = defaultdict(Decimal)
+    for instructor_id, course_id in assignments:
+        course_type, duration_hours, enrolled = courses[course_id]
+        if course_type == 'tutoring':
+            amount = TUTORING_RATE_PER_STUDENT * enrolled
+        else:
+            hours = hours_worked.get((instructor_id, course_id))
+            if hours is None:
+                hours = min(Decimal(duration_hours), MAX_IT_HOURS)
+                plan.instructor_hours.append(InstructorHours(
+                    instructor_id=instructor_id,
+                    course_id=course_id,
+                    month=month,
+                    hours_worked=hours,
+                ))
+            amount = IT_HOURLY_RATE * min(hours, MAX_IT_HOURS)
+        instructor_totals[instructor_id] += amount
+
+    for instructor_id, amount in instructor_totals.items():
+        if amount > 0:
+            add_payment(plan.instructor_payments, 'instructor_payment', 'instructor_id', instructor_id, amount)
+
+    return plan
+
+
+def _payment_counts(month):
+    return dict(
+        Payment.objects.filter(month=month).values_list('payment_type').annotate(count=Count('id')).order_by()
+    )
+
+
+def apply_billing_plan(plan, batch_size=1000):
+    """
+    Write a billing plan and record in ``plan.created`` how many payments of
+    each type were inserted. Rows that already exist (e.g. created by a
+    concurrent run since the plan was made) are skipped by the unique
+    constraints on Payment and InstructorHours.
+    """
+    with transaction.atomic():
+        InstructorHours.objects.bulk_create(plan.instructor_hours, batch_size=batch_size, ignore_conflicts=True)
+        # ignore_conflicts hides which rows were skipped; count what is there
+        before = _payment_counts(plan.month)
+        Payment.objects.bulk_create(plan.payments, batch_size=batch_size, ignore_conflicts=True)
+        after = _payment_counts(plan.month)
+        plan.created = {
+            payment_type: after.get(payment_type, 0) - before.get(payment_type, 0)
+            for payment_type, _ in Payment.PAYMENT_TYPE_CHOICES
+        }
+        # bulk_create bypasses the Payment post_save handlers
+        signals.months_changed({plan.month})
+
+
+def generate_monthly_payments(month):
+    """Plan and write payments for ``month``; returns the applied plan."""
+    plan = plan_monthly_payments(month)
+    apply_billing_plan(plan)
+    return plan
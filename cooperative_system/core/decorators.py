@@ -103,12 +103,20 @@ def can_manage_enrollments(view_func):
     return wrapper
 
 
+ATTENDANCE_ROLES = ['instructor', 'staff', 'manager', 'admin']
+
+
+def may_record_attendance(user):
+    """The role check behind can_record_attendance"""
+    return user.role in ATTENDANCE_ROLES
+
+
 def can_record_attendance(view_func):
     """Decorator for views that can record attendance (instructors and higher)"""
     @wraps(view_func)
     @login_required
     def wrapper(request, *args, **kwargs):
-        if request.user.role not in ['instructor', 'staff', 'manager', 'admin']:
+        if not may_record_attendance(request.user):
             messages.error(request, 'You do not have permission to record attendance.')
             return redirect('core:attendance_list')
         return view_func(request, *args, **kwargs)
@@ -0,0 +1,295 @@
+"""
+Financial report and profit distribution logic for the Educational Cooperative System
+
+Shared by the views, the background job handlers in core/jobs.py and the
+refresh_reports command. Reports are kept current incrementally: the Payment
+and Expense signal handlers mark changed months in DirtyReportMonth and
+``refresh_dirty_reports`` recomputes just those months.
+"""
+
+from decimal import Decimal
+
+from dateutil.relativedelta import relativedelta
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q, Sum
+from django.db.models.functions import Trunc
+from django.utils import timezone
+
+from . import pdf_cache
+from .models import CacheVersion, DirtyReportMonth, Expense, FinancialReport, Member, Payment, ProfitDistribution
+
+
+# ==============================================================================
+# FINANCIAL REPORTS
+# ==============================================================================
+
+REPORT_FIELDS = ['total_revenue', 'total_instructor_payments', 'total_expenses', 'gross_profit', 'net_profit']
+
+
+def report_totals(months):
+    """
+    Return {month: report field values} for ``months`` with one grouped query
+    per source table. Months without any data get zero totals.
+    """
+    totals = {
+        month: {'total_revenue': Decimal('0'), 'total_instructor_payments': Decimal('0'), 'total_expenses': Decimal('0')}
+        for month in months
+    }
+    payment_rows = (
+        Payment.objects.filter(month__in=totals, status='paid')
+        .values('month')
+        .annotate(
+            total_revenue=Sum('amount_paid', filter=Q(payment_type='student_fee')),
+            total_instructor_payments=Sum('amount_paid', filter=Q(payment_type='instructor_payment')),
+        )
+        .order_by()
+    )
+    for row in payment_rows:
+        totals[row['month']]['total_revenue'] = row['total_revenue'] or Decimal('0')
+        totals[row['month']]['total_instructor_payments'] = row['total_instructor_payments'] or Decimal('0')
+
+    expense_rows = (
+        Expense.objects.filter(month__in=totals, status='paid')
+        .values('month')
+        .annotate(total_expenses=Sum('amount'))
+        .order_by()
+    )
+    for row in expense_rows:
+        totals[row['month']]['total_expenses'] = row['total_expenses'] or Decimal('0')
+
+    for values in totals.values():
+        values['gross_profit'] = values['total_revenue'] - values['total_instructor_payments']
+        values['net_profit'] = values['gross_profit'] - values['total_expenses']
+    return totals
+
+
+def build_financial_report(month):
+    """Create or update the FinancialReport for ``month``; returns (report, created)."""
+    return FinancialReport.objects.update_or_create(month=month, defaults=report_totals([month])[month])
+
+
+def refresh_financial_reports(months, create=False):
+    """
+    Recompute the non-finalized reports for ``months`` in one pass. Months
+    without a report are skipped unless ``create`` is set. Returns the number
+    of reports written.
+    """
+    months = {m for m in months if m is not None}
+    if not months:
+        return 0
+
+    with transaction.atomic():
+        existing = dict(
+            FinancialReport.objects.select_for_update()
+            .filter(month__in=months)
+            .values_list('month', 'is_finalized')
+        )
+        targets = {
+            month for month in months
+            if not existing.get(month, False) and (create or month in existing)
+        }
+        if not targets:
+            return 0
+
+        totals = report_totals(targets)
+        # bulk_create bypasses the post_save handler that drops cached PDFs
+        FinancialReport.objects.bulk_create(
+            [FinancialReport(month=month, **values) for month, values in totals.items()],
+            update_conflicts=True,
+            unique_fields=['month'],
+            update_fields=REPORT_FIELDS + ['updated_at'],
+        )
+        for pk in FinancialReport.objects.filter(month__in=targets).values_list('pk', flat=True):
+            pdf_cache.invalidate('financial_report', pk)
+    return len(targets)
+
+
+def refresh_dirty_reports():
+    """Recompute every report marked dirty and clear the marks; returns (months seen, reports written)."""
+    started_at = timezone.now()
+    months = set(DirtyReportMonth.objects.values_list('month', flat=True))
+    if not months:
+        return 0, 0
+    written = refresh_financial_reports(months)
+    # Months marked again while this ran keep their mark for the next refresh
+    DirtyReportMonth.objects.filter(month__in=months, marked_at__lte=started_at).delete()
+    return len(months), written
+
+
+# ==============================================================================
+# TIME SERIES
+# ==============================================================================
+
+SERIES_GRANULARITIES = {'month': 1, 'quarter': 3, 'year': 12}
+SERIES_MAX_PERIODS = 600
+SERIES_CACHE_TIMEOUT = 15 * 60
+# The cache is per process; the version lives in the database so that
+# changes made in one process (web or job worker) reach all of them
+SERIES_VERSION = 'financial_series'
+
+
+def series_period_start(month, granularity):
+    """First month of the period containing ``month``."""
+    step = SERIES_GRANULARITIES[granularity]
+    return month.replace(month=(month.month - 1) // step * step + 1, day=1)
+
+
+def series_period_label(period, granularity):
+    if granularity == 'year':
+        return str(period.year)
+    if granularity == 'quarter':
+        return f'{period.year}-Q{(period.month - 1) // 3 + 1}'
+    return period.strftime('%Y-%m')
+
+
+def invalidate_series():
+    """Make every cached series stale; called when payments or expenses change."""
+    CacheVersion.bump(SERIES_VERSION)
+
+
+def financial_series(start, end, granularity='month'):
+    """
+    Revenue, instructor payouts, expenses and profit per period from ``start``
+    to ``end`` (first days of months, inclusive), as parallel lists.
+
+    Amounts follow the FinancialReport definitions (paid rows only) and are
+    computed with one grouped query over Payment and one over Expense. Results
+    are cached per range until a payment or expense changes.
+    """
+    version = CacheVersion.current(SERIES_VERSION)
+    key = f'financial-series:{version}:{granularity}:{start:%Y-%m}:{end:%Y-%m}'
+    series = cache.get(key)
+    if series is None:
+        series = _compute_series(start, end, granularity)
+        cache.set(key, series, SERIES_CACHE_TIMEOUT)
+    return series
+
+
+def _compute_series(start, end, granularity):
+    step = relativedelta(months=SERIES_GRANULARITIES[granularity])
+    periods = []
+    period = series_period_start(start, granularity)
+    while period <= end:
+        periods.append(period)
+        period += step
+    index = {period: i for i, period in enumerate(periods)}
+    columns = {name: [Decimal('0')] * len(periods) for name in ('revenue', 'instructor_payouts', 'expenses')}
+
+    payment_rows = (
+        Payment.objects.filter(month__gte=start, month__lte=end, status='paid')
+        .annotate(period=Trunc('month', granularity))
+        .values('period')
+        .annotate(
+            revenue=Sum('amount_paid', filter=Q(payment_type='student_fee')),
+            instructor_payouts=Sum('amount_paid', filter=Q(payment_type='instructor_payment')),
+        )
+        .order_by()
+    )
+    for row in payment_rows:
+        i = index[row['period']]
+        columns['revenue'][i] = row['revenue'] or Decimal('0')
+        columns['instructor_payouts'][i] = row['instructor_payouts'] or Decimal('0')
+
+    expense_rows = (
+        Expense.objects.filter(month__gte=start, month__lte=end, status='paid')
+        .annotate(period=Trunc('month', granularity))
+        .values('period')
+        .annotate(expenses=Sum('amount'))
+        .order_by()
+    )
+    for row in expense_rows:
+        columns['expenses'][index[row['period']]] = row['expenses'] or Decimal('0')
+
+    profit = [
+        revenue - payouts - expenses
+        for revenue, payouts, expenses in zip(columns['revenue'], columns['instructor_payouts'], columns['expenses'])
+    ]
+    return {
+        'granularity': granularity,
+        'from': start.strftime('%Y-%m'),
+        'to': end.strftime('%Y-%m'),
+        'periods': [series_period_label(period, granularity) for period in periods],
+        'revenue': [float(value) for value in columns['revenue']],
+        'instructor_payouts': [float(value) for value in columns['instructor_payouts']],
+        'expenses': [float(value) for value in columns['expenses']],
+        'profit': [float(value) for value in profit],
+    }
+
+
+# ==============================================================================
+# PROFIT DISTRIBUTION
+# ==============================================================================
+
+CENT = Decimal('0.01')
+
+
+def allocate(total, weights):
+    """
+    Split the integer ``total`` into integers proportional to ``weights``
+    (non-negative integers) with the largest-remainder method: every part gets
+    its floor, then the units left over go to the largest remainders, ties to
+    the earlier weight. The parts always add up to ``total``.
+    """
+    weight_sum = sum(weights)
+    if weight_sum == 0:
+        return [0] * len(weights)
+    parts, remainders = [], []
+    for index, weight in enumerate(weights):
+        part, remainder = divmod(total * weight, weight_sum)
+        parts.append(part)
+        remainders.append((-remainder, index))
+    for _, index in sorted(remainders)[:total - sum(parts)]:
+        parts[index] += 1
+    return parts
+
+
+def plan_distribution(report, members=None):
+    """
+    Work out ``report``'s profit distribution without writing anything.
+
+    Returns (member, share_percentage, amount) tuples for the active members
+    (or ``members``). Amounts are split to the centime and percentages to the
+    hundredth by largest remainder, so they add up to exactly the net profit
+    and 100%.
+    """
+    if members is None:
+        members = Member.objects.filter(is_active=True).only('first_name', 'last_name', 'capital_shares')
+    members = list(members)
+    weights = [int(member.capital_shares / CENT) for member in members]
+
+    net_cents = int(report.net_profit.quantize(CENT) / CENT)
+    sign = -1 if net_cents < 0 else 1
+    cents = allocate(abs(net_cents), weights)
+    hundredths = allocate(100 * 100, weights)
+    return [
+        (member, Decimal(share) * CENT, Decimal(sign * amount) * CENT)
+        for member, share, amount in zip(members, hundredths, cents)
+    ]
+
+
+def distribute_profits(report):
+    """
+    Split ``report``'s net profit over active members by capital share and
+    finalize it, in one transaction. Returns the number of members paid out.
+    """
+    plan = plan_distribution(report)
+    with transaction.atomic():
+        # bulk_create bypasses the ProfitDistribution signals; saving the
+        # report below drops its cached PDF instead
+        ProfitDistribution.objects.bulk_create(
+            [
+                ProfitDistribution(financial_report=report, member=member, share_percentage=share, amount=amount)
+                for member, share, amount in plan
+            ],
+            update_conflicts=True,
+            unique_fields=['financial_report', 'member'],
+            update_fields=['share_percentage', 'amount', 'updated_at'],
+        )
+        # Unpaid shares of members who have left since an earlier run would
+        # break the totals; paid ones are payout history and stay
+        report.distributions.exclude(member__is_active=True).filter(is_paid=False).delete()
+
+        report.is_finalized = True
+        report.save()
+    return len(plan)
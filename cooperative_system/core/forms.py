@@ -1,5 +1,7 @@
+from decimal import Decimal
+
 from django import forms
-from .models import Student, Instructor, Course, Enrollment, Attendance, Payment, Member, InstructorHours
+from .models import Student, Instructor, Course, Enrollment, Attendance, Payment, Member, InstructorHours, PaymentTransaction
 
 class StudentForm(forms.ModelForm):
     class Meta:
@@ -40,7 +42,14 @@ class EnrollmentForm(forms.ModelForm):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.fields['student'].queryset = Student.objects.filter(is_active=True)
-        self.fields['course'].queryset = Course.objects.filter(is_active=True)
+        self.fields['course'].queryset = Course.objects.filter(is_active=True).with_enrollment_stats()
+    
+    def clean(self):
+        cleaned_data = super().clean()
+        course = cleaned_data.get('course')
+        if course and cleaned_data.get('is_active') and self.instance._state.adding and course.is_full:
+            raise forms.ValidationError(f'{course.name} is full ({course.enrollment_limit} students).')
+        return cleaned_data
 
 
 class AttendanceForm(forms.ModelForm):
@@ -54,14 +63,60 @@ class AttendanceForm(forms.ModelForm):
 
 
 class BulkAttendanceForm(forms.Form):
+    MAX_DATES = 7
+    
     course = forms.ModelChoiceField(queryset=Course.objects.filter(is_active=True))
     date = forms.DateField(widget=forms.DateInput(attrs={'type': 'date'}))
+    extra_dates = forms.CharField(
+        required=False,
+        widget=forms.HiddenInput,
+        help_text="Comma-separated additional session dates (YYYY-MM-DD)"
+    )
+    
+    def clean_extra_dates(self):
+        field = forms.DateField()
+        values = [value.strip() for value in self.cleaned_data['extra_dates'].split(',') if value.strip()]
+        return [field.clean(value) for value in values]
+    
+    def clean(self):
+        cleaned_data = super().clean()
+        if cleaned_data.get('date'):
+            dates = sorted({cleaned_data['date'], *cleaned_data.get('extra_dates', [])})
+            if len(dates) > self.MAX_DATES:
+                raise forms.ValidationError(f'Attendance can be recorded for at most {self.MAX_DATES} dates at once.')
+            cleaned_data['dates'] = dates
+        return cleaned_data
+
+
+class AttendanceMarkForm(forms.Form):
+    """One mark in a batch posted to the attendance sync API."""
+    course = forms.IntegerField()
+    student = forms.IntegerField()
+    date = forms.DateField()
+    status = forms.ChoiceField(choices=Attendance.STATUS_CHOICES)
+    notes = forms.CharField(required=False)
 
 
 class PaymentRecordForm(forms.Form):
-    amount_paid = forms.DecimalField(max_digits=10, decimal_places=2, min_value=0)
+    METHOD_CHOICES = [choice for choice in PaymentTransaction.METHOD_CHOICES if choice[0] != 'opening']
+    
+    amount_paid = forms.DecimalField(max_digits=10, decimal_places=2, min_value=Decimal('0.01'))
     payment_date = forms.DateField(widget=forms.DateInput(attrs={'type': 'date'}))
+    method = forms.ChoiceField(choices=METHOD_CHOICES, initial='cash')
+    reference = forms.CharField(max_length=100, required=False)
     notes = forms.CharField(required=False, widget=forms.Textarea(attrs={'rows': 2}))
+    
+    def receipt(self, payment_pk):
+        data = self.cleaned_data
+        return {
+            'payment': payment_pk, 'amount': data['amount_paid'], 'payment_date': data['payment_date'],
+            'method': data['method'], 'reference': data['reference'], 'notes': data['notes'],
+        }
+
+
+class PaymentReceiptForm(PaymentRecordForm):
+    """One receipt in a batch posted to the payment receipts API."""
+    payment = forms.IntegerField()
 
 
 class MemberForm(forms.ModelForm):
@@ -94,3 +149,22 @@ class GeneratePaymentsForm(forms.Form):
         widget=forms.DateInput(attrs={'type': 'date'}),
         help_text="First day of the month to generate payments for"
     )
+
+
+class BulkInvoiceForm(forms.Form):
+    OUTPUT_CHOICES = [
+        ('pdf', 'Single PDF (one page per invoice)'),
+        ('zip', 'ZIP archive of invoice PDFs'),
+    ]
+    
+    month = forms.DateField(
+        widget=forms.DateInput(attrs={'type': 'date'}),
+        help_text="Any day in the billing month"
+    )
+    status = forms.ChoiceField(choices=[('', 'All Statuses')] + Payment.PAYMENT_STATUS_CHOICES, required=False)
+    course = forms.ModelChoiceField(
+        queryset=Course.objects.filter(is_active=True).order_by('name'),
+        required=False,
+        empty_label='All Courses'
+    )
+    output = forms.ChoiceField(choices=OUTPUT_CHOICES, initial='pdf')
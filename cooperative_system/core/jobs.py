@@ -0,0 +1,347 @@
+"""
+Database-backed background jobs for the Educational Cooperative System
+
+Views enqueue a Job row and return immediately; ``manage.py run_workers``
+processes claim queued jobs and run the handler registered for their kind.
+The queue lives in the application database, so no broker is needed.
+
+Claiming uses SELECT ... FOR UPDATE SKIP LOCKED where the database supports
+it (PostgreSQL), so concurrent workers neither block on nor double-claim a
+row. SQLite has no row locks; there a worker claims with a conditional
+UPDATE of a still-queued row, which SQLite's single writer makes atomic, and
+moves on to the next row if another worker got there first.
+"""
+
+import os
+import shutil
+import socket
+import threading
+import time
+import traceback
+from datetime import date, timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, connection, transaction
+from django.db.models import F
+from django.urls import reverse
+from django.utils import timezone
+
+from . import billing, finance
+from .models import AuditLog, Enrollment, FinancialReport, Job, Payment
+from .pdf_generator import iter_invoice_zip, render_invoice_batch
+
+
+HANDLERS = {}
+
+DEFAULT_POLL_INTERVAL = 1.0
+# Progress is written at most this often (seconds); each write doubles as a heartbeat
+PROGRESS_INTERVAL = 1.0
+# Running jobs without a heartbeat for this long belong to a dead worker
+DEFAULT_STALE_AFTER = 30 * 60
+# A running handler's job row is touched this often (seconds), even while
+# one long step such as laying out a PDF gives it no chance to report progress
+DEFAULT_HEARTBEAT_INTERVAL = 60
+MAX_ATTEMPTS = 3
+# Files written by finished jobs are deleted after this long (seconds)
+DEFAULT_FILE_RETENTION = 7 * 24 * 60 * 60
+# Long-running workers repeat the startup housekeeping this often (seconds)
+MAINTENANCE_INTERVAL = 10 * 60
+
+
+def job_handler(kind):
+    """Register ``func(job, **params)`` as the handler for jobs of ``kind``."""
+    def decorator(func):
+        HANDLERS[kind] = func
+        return func
+    return decorator
+
+
+def enqueue(kind, params=None, user=None):
+    if kind not in HANDLERS:
+        raise ValueError(f'Unknown job kind: {kind}')
+    return Job.objects.create(kind=kind, params=params or {}, created_by=user)
+
+
+def enqueue_unique(kind, params=None, user=None):
+    """Enqueue a job unless an identical one is still waiting in the queue."""
+    params = params or {}
+    queued = Job.objects.filter(kind=kind, params=params, status='queued').order_by('pk').first()
+    return queued or enqueue(kind, params, user)
+
+
+def default_worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def claim_next(worker):
+    """Mark the oldest queued job as running for ``worker`` and return it, or None."""
+    queued = Job.objects.filter(status='queued').order_by('created_at', 'pk')
+
+    def claim(pk):
+        now = timezone.now()
+        return Job.objects.filter(pk=pk, status='queued').update(
+            status='running', worker=worker, attempts=F('attempts') + 1,
+            started_at=now, updated_at=now,
+        )
+
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            pk = queued.select_for_update(skip_locked=True).values_list('pk', flat=True).first()
+            if pk is None:
+                return None
+            claim(pk)
+    else:
+        while True:
+            pk = queued.values_list('pk', flat=True).first()
+            if pk is None:
+                return None
+            if claim(pk):
+                break
+    return Job.objects.get(pk=pk)
+
+
+def report_progress(job, done, total=None, message=None, force=False):
+    """Record a handler's progress; writes are throttled to PROGRESS_INTERVAL."""
+    job.progress = done
+    if total is not None:
+        job.total = total
+    if message is not None:
+        job.message = message[:255]
+    now = time.monotonic()
+    if not force and now - getattr(job, '_progress_written', 0) < PROGRESS_INTERVAL:
+        return
+    job._progress_written = now
+    Job.objects.filter(pk=job.pk).update(
+        progress=job.progress, total=job.total, message=job.message, updated_at=timezone.now()
+    )
+
+
+class Heartbeat(threading.Thread):
+    """Touches a running job's row every JOB_HEARTBEAT_INTERVAL seconds until stopped."""
+
+    def __init__(self, job):
+        super().__init__(name=f'job-{job.pk}-heartbeat', daemon=True)
+        self.job_pk = job.pk
+        self.interval = getattr(settings, 'JOB_HEARTBEAT_INTERVAL', DEFAULT_HEARTBEAT_INTERVAL)
+        self.stopped = threading.Event()
+
+    def run(self):
+        try:
+            while not self.stopped.wait(self.interval):
+                try:
+                    Job.objects.filter(pk=self.job_pk, status='running').update(updated_at=timezone.now())
+                except DatabaseError:
+                    # e.g. the SQLite write lock; the next beat tries again
+                    pass
+        finally:
+            connection.close()
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+def run_job(job):
+    """Run a claimed job's handler and store its result or traceback."""
+    heartbeat = Heartbeat(job)
+    heartbeat.start()
+    try:
+        handler = HANDLERS.get(job.kind)
+        if handler is None:
+            raise LookupError(f'No handler registered for job kind {job.kind!r}')
+        result = handler(job, **job.params)
+    except Exception:
+        status, fields = 'failed', {'error': traceback.format_exc()}
+    else:
+        status, fields = 'succeeded', {'result': result, 'progress': job.total or job.progress}
+    finally:
+        heartbeat.stop()
+
+    now = timezone.now()
+    Job.objects.filter(pk=job.pk).update(
+        status=status, total=job.total, message=job.message, finished_at=now, updated_at=now, **fields
+    )
+    return status
+
+
+def requeue_stale(stale_after=None):
+    """Give running jobs whose worker stopped reporting back to the queue, up to MAX_ATTEMPTS."""
+    if stale_after is None:
+        stale_after = getattr(settings, 'JOB_STALE_AFTER', DEFAULT_STALE_AFTER)
+    now = timezone.now()
+    stale = Job.objects.filter(status='running', updated_at__lt=now - timedelta(seconds=stale_after))
+    requeued = stale.filter(attempts__lt=MAX_ATTEMPTS).update(status='queued', worker='', updated_at=now)
+    stale.update(
+        status='failed', error='Worker stopped responding; giving up after repeated attempts.',
+        finished_at=now, updated_at=now,
+    )
+    return requeued
+
+
+def purge_job_files(retention=None):
+    """
+    Delete the files of jobs that finished more than ``retention`` seconds
+    ago (default: JOB_FILE_RETENTION), and of jobs that no longer exist.
+    Returns the number of job directories removed.
+    """
+    if retention is None:
+        retention = getattr(settings, 'JOB_FILE_RETENTION', DEFAULT_FILE_RETENTION)
+    root = Path(settings.MEDIA_ROOT) / 'jobs'
+    if not root.is_dir():
+        return 0
+    directories = {int(path.name): path for path in root.iterdir() if path.is_dir() and path.name.isdigit()}
+    cutoff = timezone.now() - timedelta(seconds=retention)
+    keep = set(
+        Job.objects.filter(pk__in=directories).exclude(finished_at__lt=cutoff).values_list('pk', flat=True)
+    )
+    removed = 0
+    for pk, path in directories.items():
+        if pk not in keep:
+            shutil.rmtree(path, ignore_errors=True)
+            removed += 1
+    return removed
+
+
+def maintain():
+    """Housekeeping every worker does on start and every MAINTENANCE_INTERVAL."""
+    requeue_stale()
+    purge_job_files()
+
+
+def work(worker=None, poll_interval=DEFAULT_POLL_INTERVAL, once=False, max_jobs=None):
+    """
+    Claim and run jobs until ``max_jobs`` have run, or with ``once`` until the
+    queue is empty; otherwise poll forever. Returns the number of jobs run.
+    """
+    worker = worker or default_worker_name()
+    maintain()
+    maintained_at = time.monotonic()
+    processed = 0
+    while max_jobs is None or processed < max_jobs:
+        close_old_connections()
+        if time.monotonic() - maintained_at >= MAINTENANCE_INTERVAL:
+            maintain()
+            maintained_at = time.monotonic()
+        job = claim_next(worker)
+        if job is None:
+            if once:
+                break
+            time.sleep(poll_interval)
+            continue
+        run_job(job)
+        processed += 1
+    return processed
+
+
+def in_chunks(queryset, chunk_size=200):
+    """
+    Iterate ``queryset`` (which must be ordered) one chunk of rows at a time.
+
+    Unlike ``iterator()`` no cursor stays open between chunks: on SQLite an
+    open read blocks every other worker's commits for as long as it lasts.
+    """
+    pks = list(queryset.values_list('pk', flat=True))
+    for start in range(0, len(pks), chunk_size):
+        yield from queryset.filter(pk__in=pks[start:start + chunk_size])
+
+
+def job_file_path(job, filename):
+    """Where a job stores a file it produces, relative to MEDIA_ROOT."""
+    return Path('jobs') / str(job.pk) / filename
+
+
+# ==============================================================================
+# HANDLERS
+# ==============================================================================
+
+@job_handler('monthly_payments')
+def monthly_payments_job(job, month):
+    month = date.fromisoformat(month)
+    report_progress(job, 0, message=f'Billing {month.strftime("%B %Y")}', force=True)
+    plan = billing.generate_monthly_payments(month)
+    return {
+        'summary': f'Generated {plan.created["student_fee"]} student payments and '
+                   f'{plan.created["instructor_payment"]} instructor payments for {month.strftime("%B %Y")}; '
+                   f'{plan.skipped("student_fee") + plan.skipped("instructor_payment")} already existed.',
+        'student_payments': plan.created['student_fee'],
+        'instructor_payments': plan.created['instructor_payment'],
+        'skipped': plan.skipped('student_fee') + plan.skipped('instructor_payment'),
+        'url': reverse('core:payment_list'),
+    }
+
+
+@job_handler('financial_report')
+def financial_report_job(job, month, ip_address=None):
+    month = date.fromisoformat(month)
+    report, created = finance.build_financial_report(month)
+
+    AuditLog.objects.create(
+        user=job.created_by,
+        action='create' if created else 'update',
+        model_name='FinancialReport',
+        object_id=report.pk,
+        description=f'{"Generated" if created else "Updated"} financial report for {month.strftime("%B %Y")}',
+        ip_address=ip_address
+    )
+
+    action = 'generated' if created else 'updated'
+    return {
+        'summary': f'Financial report for {month.strftime("%B %Y")} {action}. '
+                   f'Total expenses: {report.total_expenses} DH included.',
+        'report_id': report.pk,
+        'url': reverse('core:financial_report_detail', kwargs={'pk': report.pk}),
+    }
+
+
+@job_handler('distribute_profits')
+def distribute_profits_job(job, report_id):
+    report = FinancialReport.objects.get(pk=report_id)
+    members = finance.distribute_profits(report)
+    return {
+        'summary': f'Profits distributed to {members} members.',
+        'url': reverse('core:financial_report_detail', kwargs={'pk': report.pk}),
+    }
+
+
+@job_handler('refresh_reports')
+def refresh_reports_job(job):
+    months, written = finance.refresh_dirty_reports()
+    return {'summary': f'Refreshed {written} financial report(s) across {months} changed month(s).'}
+
+
+@job_handler('bulk_invoices')
+def bulk_invoices_job(job, month, status='', course_id=None, output='pdf'):
+    month = date.fromisoformat(month)
+    payments = Payment.objects.filter(payment_type='student_fee', month=month).select_related('student')
+    if status:
+        payments = payments.filter(status=status)
+    if course_id:
+        payments = payments.filter(student_id__in=Enrollment.objects.filter(
+            course_id=course_id, is_active=True
+        ).values('student_id'))
+    payments = payments.order_by('student__last_name', 'student__first_name', 'pk')
+    total = payments.count()
+    report_progress(job, 0, total, 'Rendering invoices', force=True)
+
+    def counted(rows):
+        for done, payment in enumerate(rows, 1):
+            yield payment
+            report_progress(job, done)
+
+    payments = counted(in_chunks(payments))
+    relative_path = job_file_path(job, f'invoices_{month.strftime("%Y_%m")}.{output}')
+    path = Path(settings.MEDIA_ROOT) / relative_path
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open('wb') as fp:
+        if output == 'zip':
+            for chunk in iter_invoice_zip(payments):
+                fp.write(chunk)
+        else:
+            render_invoice_batch(payments, fp)
+
+    return {
+        'summary': f'{total} invoices for {month.strftime("%B %Y")} are ready.',
+        'file': str(relative_path),
+        'url': reverse('core:job_download', kwargs={'pk': job.pk}),
+    }
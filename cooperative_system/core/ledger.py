@@ -0,0 +1,153 @@
+"""
+Payment ledger for the Educational Cooperative System
+
+Every receipt is appended as a PaymentTransaction. Recording locks the
+affected Payment rows with SELECT ... FOR UPDATE and moves ``amount_paid``
+with F() expressions in the same transaction, so two cashiers recording
+against one invoice at the same time both count. Status is derived from
+``amount_paid`` in SQL, and ``reconcile_payments`` rebuilds both from the
+ledger sums with set-based UPDATEs instead of replaying receipts.
+"""
+
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, DecimalField, F, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import pdf_cache
+from .models import Payment, PaymentTransaction
+from .signals import months_changed
+
+
+MAX_BATCH_RECEIPTS = 1000
+
+
+class ReceiptError(ValueError):
+    """A receipt that cannot be recorded; ``index`` is its position in the batch."""
+
+    def __init__(self, message, index=0):
+        super().__init__(message)
+        self.index = index
+
+
+def derived_status():
+    """A payment's status as a function of its amount_paid, for use in UPDATEs."""
+    return Case(
+        When(amount_paid__gt=0, amount_paid__gte=F('amount'), then=Value('paid')),
+        When(amount_paid__gt=0, then=Value('partial')),
+        When(status__in=['paid', 'partial'], then=Value('pending')),
+        default=F('status'),
+    )
+
+
+def record_receipts(receipts, user=None):
+    """
+    Record ``receipts`` in one transaction and return the updated payments by pk.
+
+    Each receipt is a dict with ``payment`` (a pk), ``amount`` and
+    ``payment_date``, and optionally ``method``, ``reference`` and ``notes``.
+    As before the ledger, a payment may be paid past its amount, and a
+    receipt's notes also replace the payment's notes. Nothing is recorded if
+    any receipt is not positive or names an unknown payment; ReceiptError
+    says which.
+    """
+    if len(receipts) > MAX_BATCH_RECEIPTS:
+        raise ReceiptError(f'At most {MAX_BATCH_RECEIPTS} receipts per batch.', MAX_BATCH_RECEIPTS)
+    if not receipts:
+        return {}
+
+    with transaction.atomic():
+        locked = Payment.objects.select_for_update().in_bulk({receipt['payment'] for receipt in receipts})
+        totals = defaultdict(Decimal)
+        latest = {}
+        notes = {}
+        for index, receipt in enumerate(receipts):
+            payment = locked.get(receipt['payment'])
+            if payment is None:
+                raise ReceiptError(f'Payment {receipt["payment"]} does not exist.', index)
+            if receipt['amount'] <= 0:
+                raise ReceiptError('Amount must be positive.', index)
+            totals[payment.pk] += receipt['amount']
+            if receipt.get('notes'):
+                notes[payment.pk] = receipt['notes']
+            latest[payment.pk] = max(latest.get(payment.pk, receipt['payment_date']), receipt['payment_date'])
+
+        PaymentTransaction.objects.bulk_create([
+            PaymentTransaction(
+                payment_id=receipt['payment'],
+                amount=receipt['amount'],
+                payment_date=receipt['payment_date'],
+                method=receipt.get('method') or 'cash',
+                reference=receipt.get('reference', ''),
+                notes=receipt.get('notes', ''),
+                recorded_by=user,
+            )
+            for receipt in receipts
+        ])
+
+        # One UPDATE per distinct (amount, date): a batch of equal fees moves together
+        groups = defaultdict(list)
+        for pk, total in totals.items():
+            groups[(total, latest[pk])].append(pk)
+        now = timezone.now()
+        for (total, payment_date), pks in groups.items():
+            Payment.objects.filter(pk__in=pks).update(
+                amount_paid=F('amount_paid') + total, payment_date=payment_date, updated_at=now,
+            )
+        Payment.objects.filter(pk__in=totals).update(status=derived_status())
+        # The last note in the batch wins, as the last form post did
+        by_note = defaultdict(list)
+        for pk, note in notes.items():
+            by_note[note].append(pk)
+        for note, pks in by_note.items():
+            Payment.objects.filter(pk__in=pks).update(notes=note)
+
+        _payments_changed(locked.values())
+    return Payment.objects.in_bulk(list(totals))
+
+
+def _ledger_total():
+    return Coalesce(
+        Subquery(
+            PaymentTransaction.objects.filter(payment=OuterRef('pk'))
+            .order_by()
+            .values('payment')
+            .annotate(total=Sum('amount'))
+            .values('total')
+        ),
+        Value(Decimal('0')),
+        output_field=DecimalField(max_digits=10, decimal_places=2),
+    )
+
+
+def with_ledger_drift(payments=None):
+    """Payments (default: all) whose amount_paid differs from their ledger total, annotated with ``ledger_total``."""
+    if payments is None:
+        payments = Payment.objects.all()
+    return payments.annotate(ledger_total=_ledger_total()).exclude(amount_paid=F('ledger_total'))
+
+
+def reconcile_payments(payments=None):
+    """
+    Reset ``amount_paid`` and status to what the ledger says for the payments
+    (default: all) that have drifted from it; returns how many were corrected.
+    """
+    with transaction.atomic():
+        drifted = list(with_ledger_drift(payments).select_for_update())
+        if not drifted:
+            return 0
+        corrected = Payment.objects.filter(pk__in=[payment.pk for payment in drifted])
+        corrected.update(amount_paid=_ledger_total(), updated_at=timezone.now())
+        corrected.update(status=derived_status())
+        _payments_changed(drifted)
+    return len(drifted)
+
+
+def _payments_changed(payments):
+    # update() skips the Payment post_save handlers
+    months_changed({payment.month for payment in payments})
+    for payment in payments:
+        pdf_cache.invalidate('invoice', payment.pk)
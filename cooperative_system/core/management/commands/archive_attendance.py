@@ -0,0 +1,43 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.attendance import ARCHIVE_BATCH_SIZE, archive_attendance, archive_cutoff
+from core.models import Attendance
+from core.utils import parse_month
+
+
+class Command(BaseCommand):
+    help = 'Move old attendance rows into the attendance archive'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--before',
+            metavar='YYYY-MM',
+            help='Archive attendance dated before this month. Defaults to keeping '
+                 'settings.ATTENDANCE_HOT_MONTHS months (24 unless set) in the live table.',
+        )
+        parser.add_argument('--batch-size', type=int, default=ARCHIVE_BATCH_SIZE)
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only count the rows that would be archived.',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            before = parse_month(options['before']) if options['before'] else archive_cutoff(date.today())
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive.')
+
+        if options['dry_run']:
+            count = Attendance.objects.filter(date__lt=before).count()
+            self.stdout.write(f'{count} attendance row(s) dated before {before:%Y-%m-%d} would be archived.')
+            return
+
+        moved = archive_attendance(before, options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Archived {moved} attendance row(s) dated before {before:%Y-%m-%d}.'
+        ))
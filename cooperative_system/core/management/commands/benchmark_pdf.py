@@ -0,0 +1,65 @@
+import statistics
+import time
+from datetime import date
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+
+from core.pdf_generator import render_contract, render_financial_report, render_invoice
+
+
+SAMPLE_INVOICE = {
+    'pk': 1,
+    'month': date(2025, 11, 1),
+    'amount': Decimal('500.00'),
+    'amount_paid': Decimal('250.00'),
+    'remaining_amount': Decimal('250.00'),
+    'status_display': 'Partial',
+    'student': {'full_name': 'Sara Bennani', 'email': 'sara@example.com', 'phone': '0600000001'},
+}
+SAMPLE_CONTRACT = {
+    'pk': 1,
+    'full_name': 'Youssef Idrissi',
+    'email': 'youssef@example.com',
+    'phone': '0661000001',
+    'specialization': 'Mathematics',
+    'course': {'name': 'Mathematics 2BAC', 'course_type': 'tutoring'},
+}
+SAMPLE_REPORT = {
+    'pk': 1,
+    'month': date(2025, 11, 1),
+    'total_revenue': Decimal('120000.00'),
+    'total_instructor_payments': Decimal('45000.00'),
+    'gross_profit': Decimal('75000.00'),
+    'net_profit': Decimal('61000.00'),
+    'is_finalized': True,
+    'distributions': [
+        (f'Member {i}', Decimal('5.00'), Decimal('3050.00'))
+        for i in range(20)
+    ],
+}
+
+
+class Command(BaseCommand):
+    help = 'Measure per-document PDF render time on fixed sample data'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=200)
+
+    def handle(self, *args, **options):
+        documents = [
+            ('invoice', render_invoice, SAMPLE_INVOICE),
+            ('contract', render_contract, SAMPLE_CONTRACT),
+            ('financial_report', render_financial_report, SAMPLE_REPORT),
+        ]
+        self.stdout.write(f'{"document":<18} {"mean ms":>9} {"p50 ms":>9} {"min ms":>9}')
+        for name, render, data in documents:
+            render(data)
+            timings = []
+            for _ in range(options['iterations']):
+                start = time.perf_counter()
+                render(data)
+                timings.append((time.perf_counter() - start) * 1000)
+            self.stdout.write(
+                f'{name:<18} {statistics.mean(timings):>9.2f} {statistics.median(timings):>9.2f} {min(timings):>9.2f}'
+            )
@@ -0,0 +1,72 @@
+import json
+import tempfile
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+
+from core import benchmarks
+
+
+class Command(BaseCommand):
+    help = 'Time every page on a generated dataset and check it against the committed benchmark baseline'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, help='Dataset size (default: the baseline dataset).')
+        parser.add_argument('--courses', type=int)
+        parser.add_argument('--months', type=int)
+        parser.add_argument('--repeat', type=int, default=10, help='Timed requests per view.')
+        parser.add_argument('--threshold', type=float, help='Allowed p50 slowdown factor against the baseline.')
+        parser.add_argument('--output', help='Also write the results to this JSON file.')
+        parser.add_argument('--baseline', default=str(benchmarks.BASELINE_PATH))
+        parser.add_argument(
+            '--update-baseline',
+            action='store_true',
+            help='Record these results as the new baseline instead of comparing.',
+        )
+
+    def handle(self, *args, **options):
+        baseline = benchmarks.load_baseline(options['baseline'])
+        dataset = dict(baseline['dataset'] if baseline else benchmarks.DEFAULT_DATASET)
+        for key in ('students', 'courses', 'months'):
+            if options[key]:
+                dataset[key] = options[key]
+        threshold = options['threshold'] or (baseline or {}).get('threshold', benchmarks.DEFAULT_THRESHOLD)
+
+        # Run against a throwaway test database and media directory
+        setup_test_environment()
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+                self.stdout.write(f'Generating dataset: {dataset}')
+                client = benchmarks.build_dataset(dataset)
+                results = benchmarks.run_benchmarks(client, repeat=options['repeat'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        self.stdout.write(f'{"view":<36} {"queries":>8} {"p50 ms":>9} {"p95 ms":>9}')
+        for name, result in results.items():
+            self.stdout.write(f'{name:<36} {result["queries"]:>8} {result["p50_ms"]:>9} {result["p95_ms"]:>9}')
+
+        if options['output']:
+            with open(options['output'], 'w') as fp:
+                json.dump({'dataset': dataset, 'views': results}, fp, indent=2, sort_keys=True)
+
+        if options['update_baseline']:
+            benchmarks.write_baseline(results, dataset, threshold, options['baseline'])
+            self.stdout.write(self.style.SUCCESS(f'Baseline written to {options["baseline"]}'))
+            return
+
+        if baseline is None:
+            raise CommandError('No baseline found; run with --update-baseline first.')
+        if dataset != baseline['dataset']:
+            self.stdout.write(self.style.WARNING('Dataset differs from the baseline; query budgets may not apply.'))
+
+        failures = benchmarks.compare(results, baseline, threshold)
+        if failures:
+            for failure in failures:
+                self.stderr.write(failure)
+            raise CommandError(f'{len(failures)} benchmark check(s) failed.')
+        self.stdout.write(self.style.SUCCESS('All views are within their query budgets and latency thresholds.'))
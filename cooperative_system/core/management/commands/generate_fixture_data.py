@@ -0,0 +1,508 @@
+import random
+from contextlib import contextmanager
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+from dateutil.relativedelta import relativedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from core.finance import invalidate_series
+from core.models import (
+    AuditLog, Attendance, AttendanceArchive, AttendanceMonthlyRollup, Course, Enrollment, Expense, ExpenseCategory,
+    Instructor, InstructorHours, Member, MonthlyKpiSnapshot, Payment, PaymentTransaction, ProfitDistribution, Student,
+    User
+)
+from core.utils import parse_month
+
+
+FIXTURE_DOMAIN = '@fixtures.example.com'
+FIXTURE_USER_PREFIX = 'fixture_'
+FIXTURE_COURSE_MARKER = '[fixture]'
+
+FIRST_NAMES = [
+    'Adam', 'Sara', 'Youssef', 'Lina', 'Hamza', 'Amal', 'Imane', 'Mehdi', 'Othmane', 'Aya',
+    'Issam', 'Salma', 'Reda', 'Fatima', 'Yassine', 'Kenza', 'Soufiane', 'Naoufal', 'Marwa',
+    'Rania', 'Sami', 'Rachid', 'Wiam', 'Ines', 'Amine', 'Nora', 'Karim', 'Hiba', 'Omar', 'Zineb',
+]
+LAST_NAMES = [
+    'Bennani', 'El Amrani', 'Ait Ali', 'Idrissi', 'Outmane', 'Soufi', 'Karimi', 'Rachidi',
+    'El Fassi', 'Zahra', 'Bouchaib', 'Fadili', 'Chami', 'Lamrani', 'Jabrane', 'Benomar',
+    'Tahiri', 'El Ghali', 'El Khatib', 'Bakkali', 'Douiri', 'El Hani', 'Bennouna', 'Harrak',
+    'Guessous', 'Mansouri', 'Lamarti', 'Ettayeb', 'Cherif', 'Alaoui',
+]
+COURSE_LEVELS = ['1AC', '2AC', '3AC', 'TC', '1BAC', '2BAC']
+SUBJECT_FEES = {
+    'math': ('tutoring', Decimal('250')),
+    'physics': ('tutoring', Decimal('250')),
+    'life_sciences': ('tutoring', Decimal('250')),
+    'it_training': ('it_course', Decimal('500')),
+}
+EXPENSE_AMOUNTS = {
+    'rent': (3000, 6000),
+    'utilities': (300, 1200),
+    'supplies': (50, 600),
+    'maintenance': (100, 2000),
+    'marketing': (200, 1500),
+    'insurance': (500, 2000),
+    'salaries': (2500, 6000),
+    'technology': (100, 1500),
+    'other': (50, 800),
+}
+
+
+@contextmanager
+def preserved_timestamps(*models):
+    """Let bulk_create store the generated created_at/updated_at/timestamp values."""
+    fields = [
+        field for model in models for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+    ]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class Command(BaseCommand):
+    help = 'Generate a deterministic synthetic dataset for development and benchmarking'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=1000)
+        parser.add_argument('--courses', type=int, default=40)
+        parser.add_argument('--instructors', type=int, default=None, help='Defaults to one per two courses.')
+        parser.add_argument('--months', type=int, default=12, help='Months of history to generate.')
+        parser.add_argument('--end-month', metavar='YYYY-MM', help='Last generated month (default: current month).')
+        parser.add_argument(
+            '--as-of', metavar='YYYY-MM-DD',
+            help='No attendance is generated after this day (default: today, or the end of --end-month if given).',
+        )
+        parser.add_argument('--max-enrollments', type=int, default=2, help='Maximum courses per student.')
+        parser.add_argument('--sessions-per-month', type=int, default=4, help='Attendance sessions per course per month.')
+        parser.add_argument('--expenses-per-month', type=int, default=20)
+        parser.add_argument('--audit-logs-per-month', type=int, default=200)
+        parser.add_argument('--members', type=int, default=10)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument(
+            '--flush',
+            action='store_true',
+            help='Delete previously generated fixture data before generating.',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            end_month = parse_month(options['end_month']) if options['end_month'] else timezone.localdate().replace(day=1)
+            if options['as_of']:
+                as_of = date.fromisoformat(options['as_of'])
+            elif options['end_month']:
+                # Fixed by the arguments, so the same seed gives the same data on any day
+                as_of = end_month + relativedelta(months=1, days=-1)
+            else:
+                as_of = timezone.localdate()
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        if options['students'] < 1 or options['courses'] < 1 or options['months'] < 1:
+            raise CommandError('--students, --courses and --months must be at least 1.')
+
+        if options['flush']:
+            self.flush()
+        elif Student.objects.filter(email__endswith=FIXTURE_DOMAIN).exists():
+            raise CommandError('Fixture data already exists; rerun with --flush to replace it.')
+
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.tz = timezone.get_current_timezone()
+        self.months = [end_month - relativedelta(months=i) for i in reversed(range(options['months']))]
+        self.end_month = end_month
+        self.as_of = as_of
+
+        self.create_users()
+        self.create_members(options['members'])
+        instructor_ids = self.create_instructors(options['instructors'] or max(1, options['courses'] // 2))
+        courses = self.create_courses(options['courses'], instructor_ids, options['students'], options['max_enrollments'])
+        student_ids = self.create_students(options['students'])
+        enrollments = self.create_enrollments(student_ids, courses, options['max_enrollments'])
+        self.create_attendance(enrollments, courses, options['sessions_per_month'])
+        self.create_payments(enrollments, courses)
+        self.create_expenses(options['expenses_per_month'])
+        self.create_audit_logs(options['audit_logs_per_month'])
+
+        # bulk_create bypasses the signals that maintain derived tables
+        Course.objects.filter(description=FIXTURE_COURSE_MARKER).reconcile_enrollment_counts()
+        MonthlyKpiSnapshot.refresh()
+        AttendanceMonthlyRollup.refresh()
+        invalidate_series()
+        self.stdout.write(self.style.SUCCESS('Fixture data generated.'))
+
+    # --------------------------------------------------------------------------
+
+    def bulk_create(self, model, objs):
+        model.objects.bulk_create(objs, batch_size=self.batch_size)
+
+    def stream(self, model, rows, label):
+        """bulk_create an iterable of instances in batches, in one transaction."""
+        total = 0
+        batch = []
+        with transaction.atomic():
+            for obj in rows:
+                batch.append(obj)
+                if len(batch) >= self.batch_size:
+                    self.bulk_create(model, batch)
+                    total += len(batch)
+                    batch = []
+            if batch:
+                self.bulk_create(model, batch)
+                total += len(batch)
+        self.stdout.write(f'  {label}: {total}')
+        return total
+
+    def aware(self, day, hour=9, minute=0):
+        return timezone.make_aware(datetime.combine(day, time(hour, minute)), self.tz)
+
+    def name(self):
+        return self.rng.choice(FIRST_NAMES), self.rng.choice(LAST_NAMES)
+
+    def month_days(self, month):
+        next_month = month + relativedelta(months=1)
+        return [month + timedelta(days=i) for i in range((next_month - month).days)]
+
+    # --------------------------------------------------------------------------
+
+    def flush(self):
+        fixture_students = Student.objects.filter(email__endswith=FIXTURE_DOMAIN)
+        fixture_instructors = Instructor.objects.filter(email__endswith=FIXTURE_DOMAIN)
+        fixture_users = User.objects.filter(username__startswith=FIXTURE_USER_PREFIX)
+        fixture_courses = Course.objects.filter(description=FIXTURE_COURSE_MARKER)
+        fixture_members = Member.objects.filter(email__endswith=FIXTURE_DOMAIN)
+
+        # Raw deletes skip per-row signals and cascade collection, which would
+        # otherwise load millions of rows; derived tables are rebuilt below.
+        querysets = [
+            AuditLog.objects.filter(user__in=fixture_users),
+            Expense.objects.filter(submitted_by__in=fixture_users),
+            AttendanceMonthlyRollup.objects.filter(enrollment__course__in=fixture_courses),
+            AttendanceMonthlyRollup.objects.filter(enrollment__student__in=fixture_students),
+            Attendance.objects.filter(enrollment__course__in=fixture_courses),
+            Attendance.objects.filter(enrollment__student__in=fixture_students),
+            AttendanceArchive.objects.filter(enrollment__course__in=fixture_courses),
+            AttendanceArchive.objects.filter(enrollment__student__in=fixture_students),
+            PaymentTransaction.objects.filter(payment__student__in=fixture_students),
+            PaymentTransaction.objects.filter(payment__instructor__in=fixture_instructors),
+            Payment.objects.filter(student__in=fixture_students),
+            Payment.objects.filter(instructor__in=fixture_instructors),
+            InstructorHours.objects.filter(instructor__in=fixture_instructors),
+            Enrollment.objects.filter(course__in=fixture_courses),
+            Enrollment.objects.filter(student__in=fixture_students),
+            Course.instructors.through.objects.filter(course__in=fixture_courses),
+            Course.instructors.through.objects.filter(instructor__in=fixture_instructors),
+            ProfitDistribution.objects.filter(member__in=fixture_members),
+        ]
+        with transaction.atomic():
+            for queryset in querysets:
+                queryset._raw_delete(queryset.db)
+            fixture_users.update(instructor_profile=None)
+            for queryset in [fixture_courses, fixture_students, fixture_instructors, fixture_members]:
+                queryset._raw_delete(queryset.db)
+            fixture_users.delete()
+            Course.objects.reconcile_enrollment_counts()
+            MonthlyKpiSnapshot.refresh()
+            invalidate_series()
+        self.stdout.write('Removed previous fixture data.')
+
+    def create_users(self):
+        roles = ['admin', 'manager', 'accountant', 'staff', 'staff']
+        users = []
+        for i, role in enumerate(roles, start=1):
+            user = User(username=f'{FIXTURE_USER_PREFIX}{role}{i}', role=role, email=f'{role}{i}{FIXTURE_DOMAIN}')
+            user.set_unusable_password()
+            users.append(user)
+        self.bulk_create(User, users)
+        self.user_ids = list(
+            User.objects.filter(username__startswith=FIXTURE_USER_PREFIX).order_by('pk').values_list('pk', flat=True)
+        )
+
+    def create_members(self, count):
+        members = []
+        for i in range(count):
+            first_name, last_name = self.name()
+            members.append(Member(
+                first_name=first_name,
+                last_name=last_name,
+                email=f'member{i + 1}{FIXTURE_DOMAIN}',
+                member_type='active' if i % 3 else 'passive',
+                capital_shares=Decimal(self.rng.randrange(1000, 20000, 500)),
+                join_date=self.months[0],
+            ))
+        self.bulk_create(Member, members)
+
+    def create_instructors(self, count):
+        instructors = []
+        for i in range(count):
+            first_name, last_name = self.name()
+            subject = self.rng.choice(list(SUBJECT_FEES))
+            instructors.append(Instructor(
+                first_name=first_name,
+                last_name=last_name,
+                email=f'instructor{i + 1}{FIXTURE_DOMAIN}',
+                phone=f'0661{i:06d}',
+                specialization=dict(Course.SUBJECT_CHOICES)[subject],
+            ))
+        self.bulk_create(Instructor, instructors)
+        self.stdout.write(f'  instructors: {count}')
+        return list(
+            Instructor.objects.filter(email__endswith=FIXTURE_DOMAIN).order_by('pk').values_list('pk', flat=True)
+        )
+
+    def create_courses(self, count, instructor_ids, student_count, max_enrollments):
+        # Size limits so that roughly every student finds a seat
+        average_seats = max(10, -(-student_count * (1 + max_enrollments) // (2 * count)))
+        courses = []
+        for i in range(count):
+            subject = self.rng.choice(list(SUBJECT_FEES))
+            course_type, fee = SUBJECT_FEES[subject]
+            courses.append(Course(
+                name=f'{dict(Course.SUBJECT_CHOICES)[subject]} {self.rng.choice(COURSE_LEVELS)} #{i + 1}',
+                course_type=course_type,
+                subject=subject,
+                description=FIXTURE_COURSE_MARKER,
+                monthly_fee=fee,
+                enrollment_limit=self.rng.randint(average_seats, average_seats * 2),
+                duration_hours=8 if course_type == 'it_course' else 12,
+                start_date=self.months[0],
+                is_active=self.rng.random() > 0.05,
+            ))
+        self.bulk_create(Course, courses)
+
+        courses = {
+            pk: {'type': course_type, 'fee': fee, 'limit': limit, 'active': active, 'weekday': pk % 6}
+            for pk, course_type, fee, limit, active in Course.objects.filter(description=FIXTURE_COURSE_MARKER)
+            .order_by('pk').values_list('pk', 'course_type', 'monthly_fee', 'enrollment_limit', 'is_active')
+        }
+        assignments = []
+        for course_id, course in courses.items():
+            course['instructors'] = self.rng.sample(instructor_ids, min(len(instructor_ids), self.rng.choice([1, 1, 2])))
+            assignments.extend(
+                Course.instructors.through(course_id=course_id, instructor_id=instructor_id)
+                for instructor_id in course['instructors']
+            )
+        self.bulk_create(Course.instructors.through, assignments)
+        self.stdout.write(f'  courses: {count}')
+        return courses
+
+    def create_students(self, count):
+        def rows():
+            for i in range(count):
+                first_name, last_name = self.name()
+                yield Student(
+                    first_name=first_name,
+                    last_name=last_name,
+                    email=f'student{i + 1}{FIXTURE_DOMAIN}',
+                    phone=f'0600{i:06d}',
+                    parent_name=f'{self.rng.choice(FIRST_NAMES)} {last_name}',
+                    address='Morocco',
+                    registration_date=self.rng.choice(self.months),
+                    is_active=self.rng.random() > 0.05,
+                )
+        self.stream(Student, rows(), 'students')
+        return list(
+            Student.objects.filter(email__endswith=FIXTURE_DOMAIN).order_by('pk').values_list('pk', flat=True)
+        )
+
+    def create_enrollments(self, student_ids, courses, max_enrollments):
+        open_courses = [pk for pk, course in courses.items() if course['active']] or list(courses)
+        seats = {pk: courses[pk]['limit'] for pk in open_courses}
+        # (student_id, course_id) -> (first month, last month, is_active)
+        planned = {}
+        for student_id in student_ids:
+            wanted = self.rng.randint(1, max(1, max_enrollments))
+            for course_id in self.rng.sample(open_courses, min(wanted, len(open_courses))):
+                if seats[course_id] <= 0:
+                    continue
+                first = self.rng.randrange(len(self.months))
+                active = self.rng.random() > 0.1
+                last = len(self.months) - 1 if active else self.rng.randrange(first, len(self.months))
+                if active:
+                    seats[course_id] -= 1
+                planned[(student_id, course_id)] = (first, last, active)
+
+        self.stream(Enrollment, (
+            Enrollment(
+                student_id=student_id,
+                course_id=course_id,
+                enrollment_date=self.months[first],
+                is_active=active,
+            )
+            for (student_id, course_id), (first, last, active) in planned.items()
+        ), 'enrollments')
+
+        return [
+            (pk, student_id, course_id) + planned[(student_id, course_id)]
+            for pk, student_id, course_id in Enrollment.objects.filter(course__description=FIXTURE_COURSE_MARKER)
+            .order_by('pk').values_list('pk', 'student_id', 'course_id').iterator(chunk_size=self.batch_size)
+        ]
+
+    def create_attendance(self, enrollments, courses, sessions_per_month):
+        sessions = {}
+        for month in self.months:
+            for weekday in range(6):
+                days = [day for day in self.month_days(month) if day.weekday() == weekday and day <= self.as_of]
+                sessions[(month, weekday)] = days[:sessions_per_month]
+
+        def rows():
+            for pk, student_id, course_id, first, last, active in enrollments:
+                weekday = courses[course_id]['weekday']
+                for month in self.months[first:last + 1]:
+                    for day in sessions[(month, weekday)]:
+                        roll = self.rng.random()
+                        status = 'present' if roll < 0.85 else 'absent' if roll < 0.95 else 'excused'
+                        stamp = self.aware(day, 18)
+                        yield Attendance(
+                            enrollment_id=pk,
+                            date=day,
+                            status=status,
+                            created_at=stamp,
+                            updated_at=stamp,
+                        )
+        with preserved_timestamps(Attendance):
+            self.stream(Attendance, rows(), 'attendance')
+
+    def create_payments(self, enrollments, courses):
+        tutoring_students = {}
+        for pk, student_id, course_id, first, last, active in enrollments:
+            if courses[course_id]['type'] == 'tutoring':
+                for index in range(first, last + 1):
+                    tutoring_students[(course_id, index)] = tutoring_students.get((course_id, index), 0) + 1
+
+        def settle(amount, month):
+            roll = self.rng.random()
+            if month == self.end_month:
+                status = 'pending' if roll < 0.6 else 'paid' if roll < 0.9 else 'partial'
+            else:
+                status = 'paid' if roll < 0.85 else 'overdue' if roll < 0.95 else 'partial'
+            if status == 'paid':
+                paid = amount
+            elif status == 'partial':
+                paid = (amount / 2).quantize(Decimal('0.01'))
+            else:
+                paid = Decimal('0')
+            payment_date = month + timedelta(days=self.rng.randrange(5, 25)) if paid else None
+            stamp = self.aware(month, 8)
+            return dict(
+                amount=amount, amount_paid=paid, month=month, status=status,
+                payment_date=payment_date, created_at=stamp, updated_at=stamp,
+            )
+
+        def student_rows():
+            # One month at a time keeps memory proportional to the student count
+            for index, month in enumerate(self.months):
+                fees = {}
+                for pk, student_id, course_id, first, last, active in enrollments:
+                    if first <= index <= last:
+                        fees[student_id] = fees.get(student_id, Decimal('0')) + courses[course_id]['fee']
+                for student_id in sorted(fees):
+                    yield Payment(student_id=student_id, payment_type='student_fee', **settle(fees[student_id], month))
+
+        hours = []
+        instructor_totals = {}
+        for index, month in enumerate(self.months):
+            for course_id, course in courses.items():
+                for instructor_id in course['instructors']:
+                    if course['type'] == 'tutoring':
+                        amount = 100 * tutoring_students.get((course_id, index), 0)
+                    else:
+                        worked = Decimal(self.rng.randrange(8, 17)) / 2
+                        hours.append(InstructorHours(
+                            instructor_id=instructor_id, course_id=course_id, month=month, hours_worked=worked,
+                        ))
+                        amount = 120 * worked
+                    key = (instructor_id, index)
+                    instructor_totals[key] = instructor_totals.get(key, Decimal('0')) + amount
+
+        def instructor_rows():
+            for (instructor_id, index), amount in sorted(instructor_totals.items(), key=lambda item: (item[0][1], item[0][0])):
+                if amount > 0:
+                    yield Payment(instructor_id=instructor_id, payment_type='instructor_payment', **settle(amount, self.months[index]))
+
+        self.stream(InstructorHours, hours, 'instructor hours')
+        with preserved_timestamps(Payment):
+            self.stream(Payment, student_rows(), 'student payments')
+            self.stream(Payment, instructor_rows(), 'instructor payments')
+
+        # Every amount paid is backed by a receipt in the ledger
+        def receipt_rows():
+            paid = Payment.objects.filter(
+                Q(student__email__endswith=FIXTURE_DOMAIN) | Q(instructor__email__endswith=FIXTURE_DOMAIN),
+                amount_paid__gt=0,
+            ).order_by('pk').values_list('pk', 'amount_paid', 'payment_date', 'created_at')
+            for pk, amount_paid, payment_date, stamp in paid.iterator(chunk_size=self.batch_size):
+                yield PaymentTransaction(
+                    payment_id=pk, amount=amount_paid, payment_date=payment_date, method='cash', created_at=stamp,
+                )
+        with preserved_timestamps(PaymentTransaction):
+            self.stream(PaymentTransaction, receipt_rows(), 'payment receipts')
+
+    def create_expenses(self, per_month):
+        categories = {}
+        for expense_type, label in Expense.EXPENSE_TYPE_CHOICES:
+            categories[expense_type], _ = ExpenseCategory.objects.get_or_create(name=label)
+
+        def rows():
+            for month in self.months:
+                days = self.month_days(month)
+                for i in range(per_month):
+                    # Rent is due once a month; the rest is spread over the types
+                    expense_type = 'rent' if i == 0 else self.rng.choice(list(EXPENSE_AMOUNTS)[1:])
+                    low, high = EXPENSE_AMOUNTS[expense_type]
+                    day = self.rng.choice(days)
+                    if month == self.end_month:
+                        status = self.rng.choice(['pending', 'approved', 'paid'])
+                    else:
+                        status = 'paid' if self.rng.random() > 0.03 else 'rejected'
+                    stamp = self.aware(day, 10)
+                    yield Expense(
+                        expense_type=expense_type,
+                        category=categories[expense_type],
+                        description=f'{categories[expense_type].name} - {month.strftime("%B %Y")}',
+                        amount=Decimal(self.rng.randint(low * 100, high * 100)) / 100,
+                        expense_date=day,
+                        month=month,
+                        status=status,
+                        submitted_by_id=self.rng.choice(self.user_ids),
+                        approved_by_id=self.user_ids[0] if status in ('approved', 'paid') else None,
+                        approval_date=day if status in ('approved', 'paid') else None,
+                        paid_date=day if status == 'paid' else None,
+                        payment_method='bank_transfer' if status == 'paid' else '',
+                        created_at=stamp,
+                        updated_at=stamp,
+                    )
+        with preserved_timestamps(Expense):
+            self.stream(Expense, rows(), 'expenses')
+
+    def create_audit_logs(self, per_month):
+        actions = [choice for choice, _ in AuditLog.ACTION_CHOICES]
+        model_names = ['Student', 'Course', 'Enrollment', 'Payment', 'Expense', 'Attendance']
+
+        def rows():
+            for month in self.months:
+                days = self.month_days(month)
+                for _ in range(per_month):
+                    action = self.rng.choice(actions)
+                    model_name = 'User' if action in ('login', 'logout') else self.rng.choice(model_names)
+                    yield AuditLog(
+                        user_id=self.rng.choice(self.user_ids),
+                        action=action,
+                        model_name=model_name,
+                        object_id=self.rng.randint(1, 10000),
+                        description=f'{action.title()} {model_name}',
+                        ip_address=f'10.0.{self.rng.randint(0, 255)}.{self.rng.randint(1, 254)}',
+                        timestamp=self.aware(self.rng.choice(days), self.rng.randint(8, 19), self.rng.randint(0, 59)),
+                    )
+        with preserved_timestamps(AuditLog):
+            self.stream(AuditLog, rows(), 'audit logs')
@@ -0,0 +1,65 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.billing import apply_billing_plan, plan_monthly_payments
+from core.models import Instructor, Payment, Student
+from core.utils import parse_month
+
+
+class Command(BaseCommand):
+    help = 'Generate student fee and instructor payments for a billing month'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--month', required=True, metavar='YYYY-MM', help='Billing month to generate.')
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Show what would be created or differs from existing payments without writing anything.',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            month = parse_month(options['month'])
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+        plan = plan_monthly_payments(month)
+
+        if options['dry_run']:
+            self.print_diff(plan)
+            return
+
+        apply_billing_plan(plan)
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated {plan.created["student_fee"]} student payments and '
+            f'{plan.created["instructor_payment"]} instructor payments for {month.strftime("%B %Y")}; '
+            f'skipped {plan.skipped("student_fee")} student and {plan.skipped("instructor_payment")} '
+            f'instructor payments that already existed.'
+        ))
+
+    def print_diff(self, plan):
+        student_ids = {p.student_id for p in plan.student_payments}
+        instructor_ids = {p.instructor_id for p in plan.instructor_payments}
+        for payment_type, payee_id in plan.changed:
+            (student_ids if payment_type == 'student_fee' else instructor_ids).add(payee_id)
+        names = {
+            'student_fee': Student.objects.in_bulk(student_ids),
+            'instructor_payment': Instructor.objects.in_bulk(instructor_ids),
+        }
+
+        for payment in plan.payments:
+            payee_id = payment.student_id or payment.instructor_id
+            payee = names[payment.payment_type].get(payee_id)
+            self.stdout.write(f'+ {payment.get_payment_type_display()} #{payee_id} {payee}: {payment.amount:.2f} DH')
+        for (payment_type, payee_id), (existing, planned) in plan.changed.items():
+            payee = names[payment_type].get(payee_id)
+            self.stdout.write(
+                f'~ {dict(Payment.PAYMENT_TYPE_CHOICES)[payment_type]} #{payee_id} {payee}: '
+                f'existing {existing:.2f} DH, planned {planned:.2f} DH (kept)'
+            )
+        for hours in plan.instructor_hours:
+            self.stdout.write(f'+ Instructor hours #{hours.instructor_id} course #{hours.course_id}: {hours.hours_worked} h')
+
+        self.stdout.write(
+            f'{len(plan.student_payments)} student and {len(plan.instructor_payments)} instructor payments to create, '
+            f'{len(plan.existing) - len(plan.changed)} unchanged, {len(plan.changed)} differing. Nothing was written.'
+        )
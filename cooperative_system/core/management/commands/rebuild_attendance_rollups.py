@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import AttendanceMonthlyRollup
+from core.utils import parse_month
+
+
+class Command(BaseCommand):
+    help = 'Rebuild monthly attendance rollups from the attendance table'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--month',
+            action='append',
+            dest='months',
+            metavar='YYYY-MM',
+            help='Only rebuild the given month (can be repeated). Rebuilds every month by default.',
+        )
+
+    def handle(self, *args, **options):
+        months = None
+        if options['months']:
+            try:
+                months = {parse_month(value) for value in options['months']}
+            except ValueError as exc:
+                raise CommandError(str(exc))
+
+        count = AttendanceMonthlyRollup.refresh(months=months)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {count} attendance rollup(s).'))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import Course
+
+
+class Command(BaseCommand):
+    help = 'Verify Course.active_enrollment_count against the enrollment table and repair drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Only report drift; exit with an error instead of repairing it.',
+        )
+
+    def handle(self, *args, **options):
+        drifted = list(
+            Course.objects.with_enrollment_drift().values_list('pk', 'name', 'active_enrollment_count', 'actual_enrollment_count')
+        )
+        for pk, name, stored, actual in drifted:
+            self.stdout.write(f'Course #{pk} {name}: stored {stored}, actual {actual}')
+
+        if not drifted:
+            self.stdout.write(self.style.SUCCESS('All course enrollment counts are consistent.'))
+            return
+
+        if options['check']:
+            raise CommandError(f'{len(drifted)} course(s) have drifted enrollment counts.')
+
+        Course.objects.filter(pk__in=[row[0] for row in drifted]).reconcile_enrollment_counts()
+        self.stdout.write(self.style.SUCCESS(f'Repaired enrollment counts for {len(drifted)} course(s).'))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.ledger import reconcile_payments, with_ledger_drift
+
+
+class Command(BaseCommand):
+    help = 'Verify Payment.amount_paid against the payment ledger and repair drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Only report drift; exit with an error instead of repairing it.',
+        )
+
+    def handle(self, *args, **options):
+        drifted = list(with_ledger_drift().values_list('pk', 'amount_paid', 'ledger_total').order_by('pk'))
+        for pk, stored, actual in drifted:
+            self.stdout.write(f'Payment #{pk}: stored {stored} DH, ledger {actual} DH')
+
+        if not drifted:
+            self.stdout.write(self.style.SUCCESS('All payments match their ledger.'))
+            return
+
+        if options['check']:
+            raise CommandError(f'{len(drifted)} payment(s) have drifted from the ledger.')
+
+        repaired = reconcile_payments()
+        self.stdout.write(self.style.SUCCESS(f'Repaired {repaired} payment(s) from the ledger.'))
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.finance import refresh_dirty_reports, refresh_financial_reports
+from core.models import Expense, FinancialReport, Payment
+from core.utils import parse_month
+
+
+class Command(BaseCommand):
+    help = 'Recompute financial reports for months whose payments or expenses changed'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--since',
+            metavar='YYYY-MM',
+            help='Rebuild every month from this one on that has payments, expenses or a report, '
+                 'creating missing reports. Without it only months marked dirty are refreshed.',
+        )
+
+    def handle(self, *args, **options):
+        if not options['since']:
+            months, written = refresh_dirty_reports()
+            self.stdout.write(self.style.SUCCESS(
+                f'Refreshed {written} financial report(s) across {months} changed month(s).'
+            ))
+            return
+
+        try:
+            since = parse_month(options['since'])
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+        months = set()
+        for model in (Payment, Expense, FinancialReport):
+            months.update(model.objects.filter(month__gte=since).values_list('month', flat=True).distinct())
+        written = refresh_financial_reports(months, create=True)
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt {written} financial report(s) for {len(months)} month(s); finalized reports were left as they are.'
+        ))
@@ -0,0 +1,71 @@
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import FinancialReport, Instructor, Payment
+from core.pdf_engine import default_workers, render_many
+from core.pdf_generator import contract_data, invoice_data, report_data
+from core.utils import parse_month
+
+
+class Command(BaseCommand):
+    help = 'Render invoices, contracts or financial reports to a directory using the PDF worker pool'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=['invoice', 'contract', 'financial_report'])
+        parser.add_argument('--month', metavar='YYYY-MM', help='Billing month (required for invoices).')
+        parser.add_argument('--status', help='Only invoices with this payment status.')
+        parser.add_argument('--output-dir', required=True, help='Directory to write the PDFs to.')
+        parser.add_argument('--workers', type=int, help='Worker processes (default: one per CPU).')
+
+    def handle(self, *args, **options):
+        try:
+            month = parse_month(options['month']) if options['month'] else None
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+        kind = options['kind']
+        if kind == 'invoice':
+            if month is None:
+                raise CommandError('--month is required for invoices.')
+            payments = Payment.objects.filter(payment_type='student_fee', month=month).select_related('student')
+            if options['status']:
+                payments = payments.filter(status=options['status'])
+            documents = (
+                (f'invoice_{payment.pk}.pdf', invoice_data(payment))
+                for payment in payments.order_by('pk').iterator(chunk_size=200)
+            )
+        elif kind == 'contract':
+            documents = (
+                (f'contract_{instructor.pk}.pdf', contract_data(instructor))
+                for instructor in Instructor.objects.filter(is_active=True).order_by('pk').iterator(chunk_size=200)
+            )
+        else:
+            reports = FinancialReport.objects.order_by('month')
+            if month:
+                reports = reports.filter(month=month)
+            documents = (
+                (f'financial_report_{report.month.strftime("%Y_%m")}.pdf', report_data(report, stream=False))
+                for report in reports
+            )
+
+        output_dir = Path(options['output_dir'])
+        output_dir.mkdir(parents=True, exist_ok=True)
+        workers = options['workers'] or default_workers()
+
+        names = []
+
+        def jobs():
+            for name, data in documents:
+                names.append(name)
+                yield kind, data
+
+        start = time.perf_counter()
+        count = 0
+        for count, pdf in enumerate(render_many(jobs(), workers=workers), start=1):
+            (output_dir / names[count - 1]).write_bytes(pdf)
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f'Rendered {count} {kind} PDF(s) to {output_dir} in {elapsed:.1f}s with {workers} worker(s).'
+        ))
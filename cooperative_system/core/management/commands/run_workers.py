@@ -0,0 +1,66 @@
+import multiprocessing
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+def _worker_main(options):
+    # Runs in a freshly spawned interpreter, so Django has to be set up again
+    # before anything that touches models can be imported
+    django.setup()
+    from core.jobs import work
+    work(**options)
+
+
+class Command(BaseCommand):
+    help = 'Run background job workers until interrupted'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, help='Worker processes (default: JOB_WORKER_PROCESSES or 1).')
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='Seconds to wait when the queue is empty.')
+        parser.add_argument('--once', action='store_true', help='Exit once the queue is empty.')
+        parser.add_argument('--max-jobs', type=int, help='Exit after each worker has run this many jobs.')
+
+    def handle(self, *args, **options):
+        from core.jobs import work
+
+        processes = options['processes'] or getattr(settings, 'JOB_WORKER_PROCESSES', 1)
+        if processes < 1:
+            raise CommandError('--processes must be at least 1.')
+        work_options = {
+            'poll_interval': options['poll_interval'],
+            'once': options['once'],
+            'max_jobs': options['max_jobs'],
+        }
+
+        if processes == 1:
+            try:
+                processed = work(**work_options)
+            except KeyboardInterrupt:
+                return
+            self.stdout.write(self.style.SUCCESS(f'Processed {processed} jobs.'))
+            return
+
+        # spawn, not fork: forked children would share the parent's open
+        # database connection
+        context = multiprocessing.get_context('spawn')
+        workers = [
+            context.Process(target=_worker_main, args=(work_options,), name=f'job-worker-{index}')
+            for index in range(processes)
+        ]
+        for worker in workers:
+            worker.start()
+        self.stdout.write(f'Started {processes} job workers.')
+        try:
+            for worker in workers:
+                worker.join()
+        except KeyboardInterrupt:
+            for worker in workers:
+                worker.terminate()
+            for worker in workers:
+                worker.join()
+        failed = [worker.name for worker in workers if worker.exitcode not in (0, None, -15)]
+        if failed:
+            raise CommandError(f'Workers exited abnormally: {", ".join(failed)}')
+        self.stdout.write(self.style.SUCCESS('All job workers stopped.'))
@@ -0,0 +1,143 @@
+"""
+In-process request metrics for the Educational Cooperative System
+
+MetricsMiddleware records, per URL name, request latency, SQL query count and
+SQL time (via ``connection.execute_wrapper``). PDF render time is recorded by
+the ``timed_pdf`` decorator used in pdf_generator. Everything is kept in
+histograms in memory and rendered in Prometheus text format for the
+``/metrics`` view. Each worker process keeps its own histograms.
+"""
+
+import threading
+import time
+from functools import wraps
+
+from django.db import connection
+
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+METRICS = {
+    'http_request_duration_seconds': ('Request latency by URL name', LATENCY_BUCKETS),
+    'http_request_sql_queries': ('SQL queries per request by URL name', QUERY_COUNT_BUCKETS),
+    'http_request_sql_duration_seconds': ('SQL time per request by URL name', LATENCY_BUCKETS),
+    'pdf_render_duration_seconds': ('PDF render time by document type', LATENCY_BUCKETS),
+}
+
+
+class Histogram:
+    """Cumulative histogram with fixed upper bounds, like a Prometheus histogram."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.count += 1
+        self.sum += value
+
+
+_lock = threading.Lock()
+# (metric name, sorted label items) -> Histogram
+_histograms = {}
+
+
+def observe(name, value, **labels):
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = Histogram(METRICS[name][1])
+        histogram.observe(value)
+
+
+def reset():
+    with _lock:
+        _histograms.clear()
+
+
+def _format_labels(labels, **extra):
+    items = list(labels) + list(extra.items())
+    if not items:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"') for _, value in items)
+    return '{' + ','.join(f'{key}="{value}"' for (key, _), value in zip(items, escaped)) + '}'
+
+
+def render_prometheus():
+    """Return all histograms in the Prometheus text exposition format."""
+    with _lock:
+        snapshot = {
+            key: (list(h.counts), h.count, h.sum, h.buckets) for key, h in _histograms.items()
+        }
+
+    lines = []
+    for name, (help_text, _) in METRICS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} histogram')
+        for (metric, labels), (counts, count, total, buckets) in sorted(snapshot.items()):
+            if metric != name:
+                continue
+            for bound, bucket_count in zip(buckets, counts):
+                lines.append(f'{name}_bucket{_format_labels(labels, le=bound)} {bucket_count}')
+            lines.append(f'{name}_bucket{_format_labels(labels, le="+Inf")} {count}')
+            lines.append(f'{name}_sum{_format_labels(labels)} {total}')
+            lines.append(f'{name}_count{_format_labels(labels)} {count}')
+    return '\n'.join(lines) + '\n'
+
+
+class _QueryTimer:
+    """execute_wrapper that counts queries and accumulates their duration."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+
+
+class MetricsMiddleware:
+    """Record latency and SQL usage of every request, labelled by URL name."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timer = _QueryTimer()
+        start = time.perf_counter()
+        with connection.execute_wrapper(timer):
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - start
+
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else 'unmatched'
+        observe('http_request_duration_seconds', elapsed, view=view)
+        observe('http_request_sql_queries', timer.count, view=view)
+        observe('http_request_sql_duration_seconds', timer.duration, view=view)
+        return response
+
+
+def timed_pdf(document):
+    """Decorator recording how long a PDF generator function takes."""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                observe('pdf_render_duration_seconds', time.perf_counter() - start, document=document)
+        return wrapper
+    return decorator
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.8 on 2026-10-17 10:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MonthlyKpiSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(help_text='First day of the billing month', unique=True)),
+                ('revenue_expected', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('revenue_collected', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('revenue_paid', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('pending_student_payments', models.PositiveIntegerField(default=0)),
+                ('instructor_payouts_expected', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('instructor_payouts_disbursed', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('instructor_payouts', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('operational_expenses', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('pending_expenses', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['-month'],
+            },
+        ),
+    ]
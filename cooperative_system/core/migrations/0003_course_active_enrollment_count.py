@@ -0,0 +1,34 @@
+# Generated by Django 5.2.8 on 2026-10-17 10:30
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def populate_active_enrollment_count(apps, schema_editor):
+    Course = apps.get_model('core', 'Course')
+    Enrollment = apps.get_model('core', 'Enrollment')
+    active = Enrollment.objects.filter(course=OuterRef('pk'), is_active=True).order_by().values('course')
+    Course.objects.update(
+        active_enrollment_count=Coalesce(Subquery(active.annotate(n=Count('id')).values('n')), 0)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_monthly_kpi_snapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='active_enrollment_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Maintained from Enrollment changes; repair with reconcile_enrollment_counts'),
+        ),
+        migrations.RunPython(populate_active_enrollment_count, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(fields=['is_active', '-active_enrollment_count'], name='course_active_enrolled_idx'),
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.2.8 on 2026-10-17 10:31
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def drop_duplicate_payments(apps, schema_editor):
+    """Collapse rows a repeated generator run left before the constraints.
+
+    Each duplicate group keeps the row with the most paid on it (oldest on a
+    tie). Extra rows with nothing paid are deleted; if two rows in a group
+    both carry money the migration stops and lists them so they can be
+    merged by hand.
+    """
+    Payment = apps.get_model('core', 'Payment')
+    conflicts = []
+    for party in ('student', 'instructor'):
+        groups = (Payment.objects.filter(**{f'{party}__isnull': False})
+                  .values(party, 'payment_type', 'month')
+                  .annotate(n=Count('id')).filter(n__gt=1).order_by())
+        for group in groups:
+            rows = list(Payment.objects.filter(
+                **{party: group[party]}, payment_type=group['payment_type'], month=group['month'],
+            ).order_by('-amount_paid', 'pk'))
+            extra = rows[1:]
+            if any(row.amount_paid for row in extra):
+                conflicts.append(
+                    f"{party} {group[party]}, {group['payment_type']} {group['month']:%Y-%m}: "
+                    f"payments {', '.join(str(row.pk) for row in rows)}"
+                )
+                continue
+            Payment.objects.filter(pk__in=[row.pk for row in extra]).delete()
+    if conflicts:
+        raise RuntimeError(
+            'Duplicate payments with money recorded on more than one row; merge them '
+            'before migrating:\n' + '\n'.join(conflicts)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_course_active_enrollment_count'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_duplicate_payments, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='payment',
+            constraint=models.UniqueConstraint(fields=('student', 'payment_type', 'month'), name='unique_student_payment_per_month'),
+        ),
+        migrations.AddConstraint(
+            model_name='payment',
+            constraint=models.UniqueConstraint(fields=('instructor', 'payment_type', 'month'), name='unique_instructor_payment_per_month'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.8 on 2026-10-17 11:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DirtyReportMonth',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(help_text='First day of the reporting month', unique=True)),
+                ('marked_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['month'],
+            },
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.8 on 2026-10-17 11:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def open_ledgers(apps, schema_editor):
+    """Record what each payment has been paid so far as one opening transaction."""
+    Payment = apps.get_model('core', 'Payment')
+    PaymentTransaction = apps.get_model('core', 'PaymentTransaction')
+    paid = Payment.objects.filter(amount_paid__gt=0).order_by('pk').values_list('pk', 'amount_paid', 'payment_date', 'month')
+    batch = []
+    for pk, amount_paid, payment_date, month in paid.iterator(chunk_size=1000):
+        batch.append(PaymentTransaction(
+            payment_id=pk, amount=amount_paid, payment_date=payment_date or month, method='opening',
+        ))
+        if len(batch) >= 1000:
+            PaymentTransaction.objects.bulk_create(batch)
+            batch = []
+    PaymentTransaction.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_dirty_report_month'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PaymentTransaction',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('payment_date', models.DateField()),
+                ('method', models.CharField(choices=[('cash', 'Cash'), ('bank_transfer', 'Bank Transfer'), ('cheque', 'Cheque'), ('card', 'Card'), ('opening', 'Opening Balance')], default='cash', max_length=20)),
+                ('reference', models.CharField(blank=True, max_length=100)),
+                ('notes', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('payment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='transactions', to='core.payment')),
+                ('recorded_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='payment_transactions', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['payment_date', 'pk'],
+            },
+        ),
+        migrations.RunPython(open_ledgers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.8 on 2026-10-17 11:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Q
+from django.db.models.functions import TruncMonth
+
+
+def build_rollups(apps, schema_editor):
+    Attendance = apps.get_model('core', 'Attendance')
+    AttendanceMonthlyRollup = apps.get_model('core', 'AttendanceMonthlyRollup')
+    rows = (
+        Attendance.objects.annotate(month=TruncMonth('date'))
+        .values('enrollment_id', 'month')
+        .annotate(**{status: Count('id', filter=Q(status=status)) for status in ['present', 'absent', 'excused']})
+        .order_by()
+    )
+    batch = []
+    for row in rows.iterator(chunk_size=2000):
+        batch.append(AttendanceMonthlyRollup(**row))
+        if len(batch) >= 2000:
+            AttendanceMonthlyRollup.objects.bulk_create(batch)
+            batch = []
+    AttendanceMonthlyRollup.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_hot_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AttendanceMonthlyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(help_text='First day of the month')),
+                ('present', models.PositiveIntegerField(default=0)),
+                ('absent', models.PositiveIntegerField(default=0)),
+                ('excused', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('enrollment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attendance_rollups', to='core.enrollment')),
+            ],
+            options={
+                'ordering': ['-month'],
+                'indexes': [models.Index(fields=['month'], name='attendance_rollup_month_idx')],
+                'unique_together': {('enrollment', 'month')},
+            },
+        ),
+        migrations.RunPython(build_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.8 on 2026-10-17 11:51
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_attendance_monthly_rollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AttendanceSyncBatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64)),
+                ('digest', models.CharField(max_length=64)),
+                ('item_count', models.PositiveIntegerField()),
+                ('applied', models.PositiveIntegerField()),
+                ('results', models.JSONField(default=list)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attendance_syncs', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['user', 'created_at'], name='attendance_sync_user_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'key'), name='unique_attendance_sync_key')],
+            },
+        ),
+    ]
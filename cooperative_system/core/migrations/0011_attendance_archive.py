@@ -0,0 +1,32 @@
+# Generated by Django 5.2.8 on 2026-10-17 11:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_attendance_sync_batch'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AttendanceArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('status', models.CharField(choices=[('present', 'Present'), ('absent', 'Absent'), ('excused', 'Excused')], max_length=10)),
+                ('notes', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('enrollment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_attendances', to='core.enrollment')),
+            ],
+            options={
+                'ordering': ['-date'],
+                'indexes': [models.Index(fields=['date', 'status'], name='attendance_archive_date_idx')],
+                'unique_together': {('enrollment', 'date')},
+            },
+        ),
+    ]
@@ -1,7 +1,13 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import Coalesce, TruncMonth
+from django.utils import timezone
 from django.core.validators import MinValueValidator, MaxValueValidator
 from decimal import Decimal
-from datetime import date
+from datetime import date, timedelta
+from heapq import merge
+from itertools import groupby
+from operator import itemgetter
 
 class Member(models.Model):
     MEMBER_TYPE_CHOICES = [
@@ -53,6 +59,38 @@ class Instructor(models.Model):
         ordering = ['last_name', 'first_name']
 
 
+def _active_enrollment_count_subquery():
+    active = Enrollment.objects.filter(course=models.OuterRef('pk'), is_active=True).order_by().values('course')
+    return Coalesce(models.Subquery(active.annotate(n=Count('id')).values('n')), 0)
+
+
+class CourseQuerySet(models.QuerySet):
+    def with_enrollment_drift(self):
+        """Courses whose stored active_enrollment_count disagrees with the enrollment table."""
+        return self.annotate(
+            actual_enrollment_count=_active_enrollment_count_subquery()
+        ).exclude(active_enrollment_count=models.F('actual_enrollment_count'))
+    
+    def reconcile_enrollment_counts(self):
+        """Reset active_enrollment_count from the enrollment table in one UPDATE."""
+        return self.update(active_enrollment_count=_active_enrollment_count_subquery())
+    
+    def with_enrollment_stats(self):
+        """
+        Annotate active enrollment count, remaining slots and expected monthly
+        revenue in the same query, so per-course properties don't hit the DB.
+        """
+        return self.annotate(
+            enrolled_total=Count('enrollments', filter=Q(enrollments__is_active=True), distinct=True),
+        ).annotate(
+            slots_left=models.F('enrollment_limit') - models.F('enrolled_total'),
+            expected_revenue=models.ExpressionWrapper(
+                models.F('monthly_fee') * models.F('enrolled_total'),
+                output_field=models.DecimalField(max_digits=12, decimal_places=2),
+            ),
+        )
+
+
 class Course(models.Model):
     COURSE_TYPE_CHOICES = [
         ('tutoring', 'Tutoring'),
@@ -77,22 +115,46 @@ class Course(models.Model):
     start_date = models.DateField(null=True, blank=True)
     end_date = models.DateField(null=True, blank=True)
     is_active = models.BooleanField(default=True)
+    active_enrollment_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        help_text="Maintained from Enrollment changes; repair with reconcile_enrollment_counts"
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = CourseQuerySet.as_manager()
+    
     def __str__(self):
         return f"{self.name} ({self.get_course_type_display()})"
     
     @property
     def enrolled_count(self):
-        return self.enrollments.filter(is_active=True).count()
+        if 'enrolled_total' in self.__dict__:
+            return self.enrolled_total
+        return self.active_enrollment_count
     
     @property
     def available_slots(self):
+        if 'slots_left' in self.__dict__:
+            return self.slots_left
         return self.enrollment_limit - self.enrolled_count
     
+    @property
+    def monthly_revenue(self):
+        if 'expected_revenue' in self.__dict__:
+            return self.expected_revenue
+        return self.monthly_fee * self.enrolled_count
+    
+    @property
+    def is_full(self):
+        return self.enrolled_count >= self.enrollment_limit
+    
     class Meta:
         ordering = ['name']
+        indexes = [
+            models.Index(fields=['is_active', '-active_enrollment_count'], name='course_active_enrolled_idx'),
+        ]
 
 
 class Student(models.Model):
@@ -122,6 +184,11 @@ class Student(models.Model):
     
     class Meta:
         ordering = ['last_name', 'first_name']
+        indexes = [
+            models.Index(fields=['last_name', 'first_name', 'id'], name='student_name_idx'),
+            models.Index(fields=['last_name', 'first_name'], condition=Q(is_active=True), name='student_active_name_idx'),
+            models.Index(fields=['registration_date'], name='student_registered_idx'),
+        ]
 
 
 class Enrollment(models.Model):
@@ -135,9 +202,20 @@ class Enrollment(models.Model):
     def __str__(self):
         return f"{self.student} - {self.course}"
     
+    def save(self, *args, **kwargs):
+        # Course.active_enrollment_count is adjusted by a post_save handler
+        # (core/signals.py); keep both writes in one transaction.
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+    
     class Meta:
         unique_together = ['student', 'course']
         ordering = ['-enrollment_date']
+        indexes = [
+            models.Index(fields=['course', 'is_active'], name='enrollment_course_active_idx'),
+            models.Index(fields=['course'], condition=Q(is_active=True), name='enrollment_active_idx'),
+            models.Index(fields=['-enrollment_date'], name='enrollment_date_idx'),
+        ]
 
 
 class Attendance(models.Model):
@@ -160,6 +238,9 @@ class Attendance(models.Model):
     class Meta:
         unique_together = ['enrollment', 'date']
         ordering = ['-date']
+        indexes = [
+            models.Index(fields=['date', 'status'], name='attendance_date_status_idx'),
+        ]
 
 
 class Payment(models.Model):
@@ -198,6 +279,21 @@ class Payment(models.Model):
     
     class Meta:
         ordering = ['-month', '-created_at']
+        indexes = [
+            models.Index(fields=['payment_type', 'month', 'status'], name='payment_type_month_status_idx'),
+            models.Index(fields=['status', 'month'], name='payment_status_month_idx'),
+            models.Index(fields=['-month', '-created_at'], name='payment_month_created_idx'),
+            models.Index(fields=['payment_type', '-created_at'], name='payment_type_created_idx'),
+            models.Index(
+                fields=['payment_type', 'month'],
+                condition=Q(status__in=['pending', 'partial', 'overdue']),
+                name='payment_outstanding_idx',
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['student', 'payment_type', 'month'], name='unique_student_payment_per_month'),
+            models.UniqueConstraint(fields=['instructor', 'payment_type', 'month'], name='unique_instructor_payment_per_month'),
+        ]
 
 
 class InstructorHours(models.Model):
@@ -416,6 +512,11 @@ class Expense(models.Model):
     
     class Meta:
         ordering = ['-expense_date', '-created_at']
+        indexes = [
+            models.Index(fields=['month', 'status'], name='expense_month_status_idx'),
+            models.Index(fields=['status', '-expense_date'], name='expense_status_date_idx'),
+            models.Index(fields=['-expense_date'], condition=Q(status='pending'), name='expense_pending_idx'),
+        ]
 
 
 class RecurringExpense(models.Model):
@@ -489,5 +590,548 @@ class AuditLog(models.Model):
     
     class Meta:
         ordering = ['-timestamp']
+        indexes = [
+            models.Index(fields=['-timestamp'], name='auditlog_timestamp_idx'),
+        ]
         verbose_name = 'Audit Log'
         verbose_name_plural = 'Audit Logs'
+
+
+# ==============================================================================
+# KPI SNAPSHOTS
+# ==============================================================================
+
+class MonthlyKpiSnapshot(models.Model):
+    """
+    Pre-aggregated financial KPIs for one billing month.
+
+    Saving or deleting a Payment or Expense moves its month's row by the
+    difference it makes (see core/signals.py); writers that use update() or
+    bulk_create() recompute whole months with ``refresh``. Dashboards read a
+    single row instead of re-aggregating the payment and expense tables.
+    """
+    month = models.DateField(unique=True, help_text="First day of the billing month")
+
+    # Student fees
+    revenue_expected = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    revenue_collected = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    revenue_paid = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    pending_student_payments = models.PositiveIntegerField(default=0)
+
+    # Instructor payments
+    instructor_payouts_expected = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    instructor_payouts_disbursed = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    instructor_payouts = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    # Operational expenses
+    operational_expenses = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    pending_expenses = models.PositiveIntegerField(default=0)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    PAYMENT_FIELDS = [
+        'revenue_expected', 'revenue_collected', 'revenue_paid', 'pending_student_payments',
+        'instructor_payouts_expected', 'instructor_payouts_disbursed', 'instructor_payouts',
+    ]
+    EXPENSE_FIELDS = ['operational_expenses', 'pending_expenses']
+
+    def __str__(self):
+        return f"KPI Snapshot - {self.month.strftime('%B %Y')}"
+
+    @classmethod
+    def for_month(cls, month):
+        """Return the snapshot for ``month`` (an unsaved zero row if none exists)."""
+        return cls.objects.filter(month=month).first() or cls(month=month)
+
+    @staticmethod
+    def payment_aggregates():
+        student = Q(payment_type='student_fee')
+        instructor = Q(payment_type='instructor_payment')
+        return {
+            'revenue_expected': Sum('amount', filter=student),
+            'revenue_collected': Sum('amount_paid', filter=student),
+            'revenue_paid': Sum('amount_paid', filter=student & Q(status='paid')),
+            'pending_student_payments': Count('id', filter=student & Q(status__in=['pending', 'partial', 'overdue'])),
+            'instructor_payouts_expected': Sum('amount', filter=instructor),
+            'instructor_payouts_disbursed': Sum('amount_paid', filter=instructor),
+            'instructor_payouts': Sum('amount_paid', filter=instructor & Q(status='paid')),
+        }
+
+    @staticmethod
+    def expense_aggregates():
+        return {
+            'operational_expenses': Sum('amount', filter=Q(status='paid')),
+            'pending_expenses': Count('id', filter=Q(status='pending')),
+        }
+
+    # What one row adds to its month, mirroring the aggregates above
+    CONTRIBUTION_FIELDS = {
+        'Payment': ['month', 'payment_type', 'amount', 'amount_paid', 'status'],
+        'Expense': ['month', 'amount', 'status'],
+    }
+
+    @classmethod
+    def contribution(cls, instance):
+        """
+        Return (month, {field: value}) that the Payment or Expense ``instance``
+        adds to the snapshots, from its loaded or assigned values; None when
+        one of them is deferred or an expression.
+        """
+        values = {}
+        for name in cls.CONTRIBUTION_FIELDS[type(instance).__name__]:
+            value = instance.__dict__.get(name)
+            if value is None or hasattr(value, 'resolve_expression'):
+                return None
+            values[name] = instance._meta.get_field(name).to_python(value)
+
+        if isinstance(instance, Expense):
+            return values['month'], {
+                'operational_expenses': values['amount'] if values['status'] == 'paid' else 0,
+                'pending_expenses': int(values['status'] == 'pending'),
+            }
+        paid = values['status'] == 'paid'
+        if values['payment_type'] == 'student_fee':
+            return values['month'], {
+                'revenue_expected': values['amount'],
+                'revenue_collected': values['amount_paid'],
+                'revenue_paid': values['amount_paid'] if paid else 0,
+                'pending_student_payments': int(values['status'] in ['pending', 'partial', 'overdue']),
+            }
+        if values['payment_type'] == 'instructor_payment':
+            return values['month'], {
+                'instructor_payouts_expected': values['amount'],
+                'instructor_payouts_disbursed': values['amount_paid'],
+                'instructor_payouts': values['amount_paid'] if paid else 0,
+            }
+        return values['month'], {}
+
+    @classmethod
+    def apply_change(cls, old, new):
+        """
+        Move the snapshots from one row's ``old`` contribution to its ``new``
+        one (None for no row) with F() updates, so concurrent writers add up.
+        A month without a snapshot, or whose counts would go negative after
+        drifting, is recomputed with ``refresh`` instead.
+        """
+        deltas = {}
+        for contribution, sign in [(old, -1), (new, 1)]:
+            if contribution is None:
+                continue
+            month, values = contribution
+            month_deltas = deltas.setdefault(month, {})
+            for field, value in values.items():
+                month_deltas[field] = month_deltas.get(field, 0) + sign * value
+
+        stale = set()
+        for month, month_deltas in deltas.items():
+            changes = {field: F(field) + delta for field, delta in month_deltas.items() if delta}
+            if not changes:
+                continue
+            snapshots = cls.objects.filter(month=month)
+            for field in ['pending_student_payments', 'pending_expenses']:
+                if month_deltas.get(field, 0) < 0:
+                    snapshots = snapshots.filter(**{f'{field}__gte': -month_deltas[field]})
+            if not snapshots.update(**changes, updated_at=timezone.now()):
+                stale.add(month)
+        if stale:
+            cls.refresh(stale)
+
+    @classmethod
+    def refresh(cls, months=None):
+        """
+        Recompute snapshots for ``months`` with one grouped query per source table.
+
+        When ``months`` is None every month found in the payment and expense
+        tables is rebuilt and snapshots for months without any data are removed.
+        """
+        if months is not None:
+            months = {m for m in months if m is not None}
+            if not months:
+                return 0
+
+        sources = [
+            (Payment, cls.payment_aggregates(), cls.PAYMENT_FIELDS),
+            (Expense, cls.expense_aggregates(), cls.EXPENSE_FIELDS),
+        ]
+        totals = {}
+        for model, aggregates, fields in sources:
+            queryset = model.objects.all()
+            if months is not None:
+                queryset = queryset.filter(month__in=months)
+            for row in queryset.values('month').annotate(**aggregates).order_by():
+                totals.setdefault(row['month'], {}).update(
+                    {field: row[field] or 0 for field in fields}
+                )
+
+        target_months = set(totals) if months is None else months
+        snapshots = [cls(month=month, **totals.get(month, {})) for month in target_months]
+
+        with transaction.atomic():
+            if months is None:
+                cls.objects.exclude(month__in=target_months).delete()
+            cls.objects.bulk_create(
+                snapshots,
+                update_conflicts=True,
+                unique_fields=['month'],
+                update_fields=cls.PAYMENT_FIELDS + cls.EXPENSE_FIELDS + ['updated_at'],
+            )
+        return len(snapshots)
+
+    class Meta:
+        ordering = ['-month']
+
+
+# ==============================================================================
+# FINANCIAL REPORT REFRESH QUEUE
+# ==============================================================================
+
+class DirtyReportMonth(models.Model):
+    """
+    A month whose FinancialReport may no longer match its payments and expenses.
+
+    Rows are added by the Payment and Expense signal handlers and consumed by
+    ``finance.refresh_dirty_reports``.
+    """
+    month = models.DateField(unique=True, help_text="First day of the reporting month")
+    marked_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.month.strftime('%B %Y')
+
+    @classmethod
+    def mark(cls, months):
+        months = {m for m in months if m is not None}
+        if not months:
+            return 0
+        cls.objects.bulk_create(
+            [cls(month=month) for month in months],
+            update_conflicts=True,
+            unique_fields=['month'],
+            update_fields=['marked_at'],
+        )
+        return len(months)
+
+    class Meta:
+        ordering = ['month']
+
+
+class CacheVersion(models.Model):
+    """
+    A counter shared by every process through the database.
+
+    Per-process caches put the current version in their keys, so a bump from
+    any web process or job worker makes every process's cached copies stale.
+    """
+    name = models.CharField(max_length=50, unique=True)
+    version = models.PositiveIntegerField(default=1)
+
+    def __str__(self):
+        return f"{self.name} v{self.version}"
+
+    @classmethod
+    def current(cls, name):
+        return cls.objects.filter(name=name).values_list('version', flat=True).first() or 0
+
+    @classmethod
+    def bump(cls, name):
+        if not cls.objects.filter(name=name).update(version=F('version') + 1):
+            cls.objects.get_or_create(name=name)
+
+
+# ==============================================================================
+# BACKGROUND JOBS
+# ==============================================================================
+
+class Job(models.Model):
+    """
+    A unit of work queued by a request and run by the ``run_workers`` command.
+
+    Handlers are registered by ``kind`` in core/jobs.py; ``params`` holds their
+    JSON-serializable arguments and ``result`` what they return.
+    """
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('succeeded', 'Succeeded'),
+        ('failed', 'Failed'),
+    ]
+    FINISHED_STATUSES = ('succeeded', 'failed')
+
+    kind = models.CharField(max_length=50)
+    params = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    progress = models.PositiveIntegerField(default=0)
+    total = models.PositiveIntegerField(null=True, blank=True)
+    message = models.CharField(max_length=255, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    worker = models.CharField(max_length=100, blank=True)
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='jobs')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.kind} #{self.pk} ({self.get_status_display()})"
+
+    @property
+    def label(self):
+        return self.kind.replace('_', ' ').capitalize()
+
+    @property
+    def is_finished(self):
+        return self.status in self.FINISHED_STATUSES
+
+    @property
+    def percent(self):
+        if self.status == 'succeeded':
+            return 100
+        if not self.total:
+            return 0
+        return min(100, self.progress * 100 // self.total)
+
+    def as_dict(self):
+        return {
+            'id': self.pk,
+            'kind': self.kind,
+            'status': self.status,
+            'progress': self.progress,
+            'total': self.total,
+            'percent': self.percent,
+            'message': self.message,
+            'result': self.result,
+            'error': self.error.strip().splitlines()[-1] if self.error else '',
+            'created_at': self.created_at.isoformat(),
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [models.Index(fields=['status', 'created_at'])]
+
+
+# ==============================================================================
+# PAYMENT LEDGER
+# ==============================================================================
+
+class PaymentTransaction(models.Model):
+    """
+    One receipt recorded against a Payment.
+
+    Rows are only ever appended, by ``ledger.record_receipts``; a payment's
+    ``amount_paid`` is the sum of its transactions and its status follows from
+    that, so ``ledger.reconcile_payments`` can rebuild both in one UPDATE.
+    """
+    METHOD_CHOICES = [
+        ('cash', 'Cash'),
+        ('bank_transfer', 'Bank Transfer'),
+        ('cheque', 'Cheque'),
+        ('card', 'Card'),
+        ('opening', 'Opening Balance'),
+    ]
+
+    payment = models.ForeignKey(Payment, on_delete=models.CASCADE, related_name='transactions')
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    payment_date = models.DateField()
+    method = models.CharField(max_length=20, choices=METHOD_CHOICES, default='cash')
+    reference = models.CharField(max_length=100, blank=True)
+    notes = models.TextField(blank=True)
+    recorded_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='payment_transactions')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.amount} DH on {self.payment_date} ({self.get_method_display()})"
+
+    class Meta:
+        ordering = ['payment_date', 'pk']
+
+
+# ==============================================================================
+# ATTENDANCE ROLLUPS
+# ==============================================================================
+
+class AttendanceMonthlyRollup(models.Model):
+    """
+    Present, absent and excused counts per enrollment per month.
+
+    Attendance reports and rates read these instead of the attendance table.
+    Counts cover both the live attendance table and AttendanceArchive, so
+    archiving rows leaves them unchanged. ``refresh`` is called by
+    ``attendance.upsert_attendance`` and the Attendance signal handlers;
+    ``manage.py rebuild_attendance_rollups`` rebuilds them from scratch.
+    """
+    STATUS_FIELDS = ['present', 'absent', 'excused']
+
+    enrollment = models.ForeignKey(Enrollment, on_delete=models.CASCADE, related_name='attendance_rollups')
+    month = models.DateField(help_text="First day of the month")
+    present = models.PositiveIntegerField(default=0)
+    absent = models.PositiveIntegerField(default=0)
+    excused = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.enrollment} - {self.month.strftime('%B %Y')}"
+
+    @property
+    def total(self):
+        return self.present + self.absent + self.excused
+
+    @classmethod
+    def refresh(cls, enrollment_ids=None, months=None, batch_size=2000):
+        """
+        Recompute rollups with one grouped query over the attendance table
+        and one over the archive, merged as they stream in.
+
+        The work is limited to ``enrollment_ids`` and/or ``months`` when given;
+        rollups in that scope whose attendance is gone are removed. With
+        neither, every rollup is rebuilt. Returns the number of rollups written.
+        """
+        sources = [Attendance.objects.all(), AttendanceArchive.objects.all()]
+        rollups = cls.objects.all()
+        if enrollment_ids is not None:
+            enrollment_ids = {pk for pk in enrollment_ids if pk is not None}
+            if not enrollment_ids:
+                return 0
+            sources = [source.filter(enrollment_id__in=enrollment_ids) for source in sources]
+            rollups = rollups.filter(enrollment_id__in=enrollment_ids)
+        if months is not None:
+            months = {m for m in months if m is not None}
+            if not months:
+                return 0
+            after_last = (max(months).replace(day=28) + timedelta(days=4)).replace(day=1)
+            sources = [source.filter(date__gte=min(months), date__lt=after_last) for source in sources]
+            rollups = rollups.filter(month__in=months)
+
+        key = itemgetter('enrollment_id', 'month')
+        streams = [
+            source.annotate(month=TruncMonth('date'))
+            .values('enrollment_id', 'month')
+            .annotate(**{field: Count('id', filter=Q(status=field)) for field in cls.STATUS_FIELDS})
+            .order_by('enrollment_id', 'month')
+            .iterator(chunk_size=batch_size)
+            for source in sources
+        ]
+        written = 0
+        batch = []
+        with transaction.atomic():
+            rollups.delete()
+            # Attendance recorded later for an archived month goes to the live
+            # table, so a month can span both; a day never does, see
+            # AttendanceArchive.release
+            for (enrollment_id, month), group in groupby(merge(*streams, key=key), key=key):
+                if months is not None and month not in months:
+                    continue
+                group = list(group)
+                batch.append(cls(
+                    enrollment_id=enrollment_id, month=month,
+                    **{field: sum(row[field] for row in group) for field in cls.STATUS_FIELDS}
+                ))
+                if len(batch) >= batch_size:
+                    written += cls._upsert(batch)
+                    batch = []
+            written += cls._upsert(batch)
+        return written
+
+    @classmethod
+    def _upsert(cls, rollups):
+        # A concurrent refresh of the same scope may have written the row first
+        cls.objects.bulk_create(
+            rollups,
+            update_conflicts=True,
+            unique_fields=['enrollment', 'month'],
+            update_fields=cls.STATUS_FIELDS + ['updated_at'],
+        )
+        return len(rollups)
+
+    class Meta:
+        unique_together = ['enrollment', 'month']
+        ordering = ['-month']
+        indexes = [
+            models.Index(fields=['month'], name='attendance_rollup_month_idx'),
+        ]
+
+
+# ==============================================================================
+# ATTENDANCE SYNC
+# ==============================================================================
+
+class AttendanceSyncBatch(models.Model):
+    """
+    A batch of attendance marks uploaded through the sync API, kept under the
+    client's idempotency key so a retried upload returns the stored results
+    instead of being applied twice.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='attendance_syncs')
+    key = models.CharField(max_length=64)
+    # sha256 of the marks, to tell a retry from a different batch reusing the key
+    digest = models.CharField(max_length=64)
+    item_count = models.PositiveIntegerField()
+    applied = models.PositiveIntegerField()
+    results = models.JSONField(default=list)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Attendance sync {self.key} by {self.user} ({self.applied}/{self.item_count})"
+
+    class Meta:
+        ordering = ['-created_at']
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='unique_attendance_sync_key'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'created_at'], name='attendance_sync_user_idx'),
+        ]
+
+
+# ==============================================================================
+# ATTENDANCE ARCHIVE
+# ==============================================================================
+
+class AttendanceArchive(models.Model):
+    """
+    Attendance rows older than the archive cutoff, moved out of the attendance
+    table by ``manage.py archive_attendance`` so the live table stays small.
+
+    Rows keep their fields as recorded. They are read only when a report's
+    date range reaches back past the cutoff; see core/attendance.py.
+    """
+    enrollment = models.ForeignKey(Enrollment, on_delete=models.CASCADE, related_name='archived_attendances')
+    date = models.DateField()
+    status = models.CharField(max_length=10, choices=Attendance.STATUS_CHOICES)
+    notes = models.TextField(blank=True)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.enrollment} - {self.date} - {self.status} (archived)"
+
+    @classmethod
+    def release(cls, keys):
+        """
+        Delete the archived rows for the (enrollment_id, date) ``keys`` that are
+        being recorded again in the live table, so that the live row wins and
+        no day is counted twice. Returns the number of rows deleted.
+        """
+        keys = set(keys)
+        if not keys:
+            return 0
+        dates = [day for _, day in keys]
+        candidates = cls.objects.filter(
+            enrollment_id__in={enrollment_id for enrollment_id, _ in keys},
+            date__gte=min(dates), date__lte=max(dates),
+        ).values_list('pk', 'enrollment_id', 'date')
+        pks = [pk for pk, enrollment_id, day in candidates if (enrollment_id, day) in keys]
+        if pks:
+            cls.objects.filter(pk__in=pks).delete()
+        return len(pks)
+
+    class Meta:
+        unique_together = ['enrollment', 'date']
+        ordering = ['-date']
+        indexes = [
+            models.Index(fields=['date', 'status'], name='attendance_archive_date_idx'),
+        ]
@@ -0,0 +1,117 @@
+"""
+Keyset (cursor) pagination for large list views
+
+Pages are addressed by the ordering values of the last (or first) row seen
+instead of an OFFSET, so every page costs one indexed range scan no matter
+how deep it is, and no COUNT(*) is needed.
+"""
+
+import base64
+import json
+from functools import reduce
+from operator import or_
+
+from django.db.models import Q
+
+
+DEFAULT_PAGE_SIZE = 50
+
+
+class KeysetPage:
+    """One page of results plus the query strings for its neighbours."""
+
+    def __init__(self, object_list, has_next, has_previous, next_query='', previous_query=''):
+        self.object_list = object_list
+        self.has_next = has_next
+        self.has_previous = has_previous
+        self.next_query = next_query
+        self.previous_query = previous_query
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    @property
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+
+def _encode_cursor(values):
+    payload = json.dumps([None if v is None else str(v) for v in values])
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def _decode_cursor(cursor, fields):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+        if len(values) != len(fields):
+            return None
+        return [field.to_python(value) for field, value in zip(fields, values)]
+    except (ValueError, TypeError, UnicodeDecodeError):
+        return None
+
+
+def _after(keys, values):
+    """Q matching rows strictly after ``values`` in the ordering given by ``keys``."""
+    clauses = []
+    for i, (name, descending) in enumerate(keys):
+        lookup = {f'{name}__lt' if descending else f'{name}__gt': values[i]}
+        lookup.update({prev_name: values[j] for j, (prev_name, _) in enumerate(keys[:i])})
+        clauses.append(Q(**lookup))
+    return reduce(or_, clauses)
+
+
+def keyset_paginate(request, queryset, ordering, per_page=DEFAULT_PAGE_SIZE):
+    """
+    Return a KeysetPage of ``queryset`` ordered by ``ordering``.
+
+    ``ordering`` lists model field names (``-`` prefix for descending) and
+    must end with a unique field (normally ``pk``/``id``) so the order is
+    total. The cursor is read from the ``after``/``before`` query parameters.
+    """
+    model = queryset.model
+    keys = [(name.lstrip('-'), name.startswith('-')) for name in ordering]
+    keys = [(model._meta.pk.name if name == 'pk' else name, descending) for name, descending in keys]
+    fields = [model._meta.get_field(name) for name, _ in keys]
+
+    after = request.GET.get('after')
+    before = request.GET.get('before')
+    cursor = _decode_cursor(after or before or '', fields) if (after or before) else None
+    backwards = bool(before) and cursor is not None
+
+    if backwards:
+        reversed_keys = [(name, not descending) for name, descending in keys]
+        queryset = queryset.filter(_after(reversed_keys, cursor)).order_by(
+            *[('-' if descending else '') + name for name, descending in reversed_keys]
+        )
+    else:
+        if cursor is not None:
+            queryset = queryset.filter(_after(keys, cursor))
+        queryset = queryset.order_by(*[('-' if descending else '') + name for name, descending in keys])
+
+    rows = list(queryset[:per_page + 1])
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+
+    if backwards:
+        rows.reverse()
+        has_next, has_previous = True, has_more
+    else:
+        has_next, has_previous = has_more, cursor is not None
+
+    def query_for(param, row):
+        params = request.GET.copy()
+        params.pop('after', None)
+        params.pop('before', None)
+        params[param] = _encode_cursor([getattr(row, name) for name, _ in keys])
+        return params.urlencode()
+
+    next_query = query_for('after', rows[-1]) if has_next and rows else ''
+    previous_query = query_for('before', rows[0]) if has_previous and rows else ''
+    return KeysetPage(rows, bool(next_query), bool(previous_query), next_query, previous_query)
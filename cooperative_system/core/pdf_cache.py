@@ -0,0 +1,152 @@
+"""
+Content-addressed on-disk cache for generated PDFs
+
+A document is stored under ``MEDIA_ROOT/pdf_cache/<kind>/<pk>/<sha256>.pdf``
+where the hash covers a small signature of the rows it is rendered from:
+their ``updated_at`` values and, for a document listing child rows, an
+aggregate over them. Any change to those rows therefore produces a new file;
+the old one is removed by the signal handlers through ``invalidate`` or
+eventually evicted. The hash doubles as the ETag, so clients that already
+hold the document get a 304 without its data being loaded or the document
+being read or rendered.
+
+Cached documents keep the date printed when they were first rendered.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+from django.http import FileResponse
+from django.utils.cache import get_conditional_response
+
+from .metrics import timed_pdf
+from .pdf_generator import render_contract, render_financial_report, render_invoice
+
+
+RENDERERS = {
+    'invoice': render_invoice,
+    'contract': render_contract,
+    'financial_report': render_financial_report,
+}
+
+DEFAULT_MAX_BYTES = 200 * 1024 * 1024
+# Documents are rendered in memory up to this size and spooled to disk past it
+SPOOL_MAX_SIZE = 5 * 1024 * 1024
+# Evict down to this fraction of the cap, and only rescan the cache after
+# about the remaining headroom has been written by this process
+EVICT_TO = 0.9
+
+_written_since_evict = 0
+
+
+def cache_dir():
+    return Path(getattr(settings, 'PDF_CACHE_DIR', None) or Path(settings.MEDIA_ROOT) / 'pdf_cache')
+
+
+def max_bytes():
+    return getattr(settings, 'PDF_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES)
+
+
+def cache_key(kind, pk, signature):
+    payload = json.dumps([kind, pk, signature], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _entry_path(kind, pk, key):
+    return cache_dir() / kind / str(pk) / f'{key}.pdf'
+
+
+def get_or_render(kind, pk, signature, build_data):
+    """Return (cache key, path) for the document, building its data and rendering it on a miss."""
+    key = cache_key(kind, pk, signature)
+    path = _entry_path(kind, pk, key)
+    if path.exists():
+        # mtime is the recency used by LRU eviction
+        os.utime(path)
+        return key, path
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Render into a spooled buffer, so a render that fails or is killed part
+    # way leaves nothing in the cache directory. The finished document is
+    # copied to a temporary file beside its entry and renamed, so readers
+    # never see partial files.
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE) as spool:
+        timed_pdf(kind)(RENDERERS[kind])(build_data(), spool)
+        size = spool.tell()
+        spool.seek(0)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as fp:
+                shutil.copyfileobj(spool, fp)
+            os.replace(tmp, path)
+        except Exception:
+            os.remove(tmp)
+            raise
+
+    global _written_since_evict
+    _written_since_evict += size
+    if _written_since_evict >= max_bytes() * (1 - EVICT_TO):
+        _written_since_evict = 0
+        evict()
+    return key, path
+
+
+def serve_pdf(request, kind, pk, signature, build_data, filename):
+    """
+    Respond with the cached PDF for ``signature``, or 304 Not Modified when
+    the client's If-None-Match already names it. ``build_data`` is called
+    for the render data only when the document is not cached yet.
+    """
+    etag = f'"{cache_key(kind, pk, signature)}"'
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        not_modified['ETag'] = etag
+        not_modified['Cache-Control'] = 'private, no-cache'
+        return not_modified
+
+    key, path = get_or_render(kind, pk, signature, build_data)
+    response = FileResponse(path.open('rb'), as_attachment=True, filename=filename, content_type='application/pdf')
+    response['ETag'] = f'"{key}"'
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def invalidate(kind, pk):
+    """Drop every cached version of one source row's document."""
+    shutil.rmtree(cache_dir() / kind / str(pk), ignore_errors=True)
+
+
+def evict(limit=None):
+    """Remove least recently used files until the cache is under its size cap."""
+    limit = max_bytes() if limit is None else limit
+    entries = []
+    total = 0
+    for root, _, files in os.walk(cache_dir()):
+        for name in files:
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+    if total <= limit:
+        return 0
+
+    removed = 0
+    target = limit * EVICT_TO
+    for _, size, path in sorted(entries):
+        if total <= target:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            continue
+        total -= size
+        removed += 1
+    return removed
@@ -0,0 +1,71 @@
+"""
+Process-pool PDF rendering engine
+
+ReportLab layout is pure Python and holds the GIL, so bulk document runs are
+spread over worker processes. Jobs are ``(kind, data)`` pairs where ``data``
+comes from the ``*_data()`` serializers in pdf_generator: plain dicts, never
+ORM objects, so workers need no database access. Results come back in the
+order the jobs were given.
+"""
+
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from django.conf import settings
+
+from .pdf_generator import render_contract, render_financial_report, render_invoice
+
+
+RENDERERS = {
+    'invoice': render_invoice,
+    'contract': render_contract,
+    'financial_report': render_financial_report,
+}
+
+# Below this many jobs, starting worker processes costs more than it saves
+MIN_PARALLEL_JOBS = 20
+
+
+def default_workers():
+    return getattr(settings, 'PDF_RENDER_WORKERS', None) or os.cpu_count() or 1
+
+
+def _render_job(job):
+    kind, data = job
+    return RENDERERS[kind](data)
+
+
+def render_many(jobs, workers=None):
+    """
+    Yield the PDF bytes for each ``(kind, data)`` job, in order.
+
+    At most a few jobs per worker are in flight at once, so a slow consumer
+    (e.g. a streamed download) does not pile rendered documents up in memory.
+    """
+    workers = workers or default_workers()
+    jobs = iter(jobs)
+    head = list(islice(jobs, MIN_PARALLEL_JOBS))
+    if workers <= 1 or len(head) < MIN_PARALLEL_JOBS:
+        for job in head:
+            yield _render_job(job)
+        for job in jobs:
+            yield _render_job(job)
+        return
+
+    window = workers * 4
+    # spawn, not fork: forked children would share the parent's open
+    # database sockets and could close them on exit
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        pending = deque()
+        for job in head:
+            pending.append(pool.submit(_render_job, job))
+        for job in jobs:
+            if len(pending) >= window:
+                yield pending.popleft().result()
+            pending.append(pool.submit(_render_job, job))
+        while pending:
+            yield pending.popleft().result()
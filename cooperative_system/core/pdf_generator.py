@@ -1,294 +1,534 @@
+import copy
+import zipfile
+from collections import deque
+from itertools import chain, islice
 from io import BytesIO
 from django.http import HttpResponse
 from reportlab.lib import colors
-from reportlab.lib.pagesizes import A4
+from reportlab.lib.pagesizes import A4, landscape
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch, cm
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, LongTable, TableStyle, PageBreak, Flowable
 from reportlab.lib.enums import TA_CENTER, TA_RIGHT, TA_LEFT
 from datetime import date
 
+from .attendance_codes import STATUS_LETTERS
+from .metrics import timed_pdf
 
-def generate_invoice(payment):
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=72, leftMargin=72, topMargin=72, bottomMargin=72)
-    
-    styles = getSampleStyleSheet()
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=24,
-        alignment=TA_CENTER,
-        spaceAfter=30
-    )
-    
-    header_style = ParagraphStyle(
-        'Header',
-        parent=styles['Normal'],
-        fontSize=12,
-        alignment=TA_CENTER,
-        spaceAfter=20
+
+# ==============================================================================
+# STYLES AND STATIC FLOWABLES
+# Compiled once per process; the document functions below only fill in data.
+# ==============================================================================
+
+BRAND_COLOR = colors.HexColor('#1e3a5f')
+GRID_COLOR = colors.HexColor('#cccccc')
+
+_SAMPLE_STYLES = getSampleStyleSheet()
+NORMAL = _SAMPLE_STYLES['Normal']
+HEADING3 = _SAMPLE_STYLES['Heading3']
+
+INVOICE_TITLE = ParagraphStyle('InvoiceTitle', parent=_SAMPLE_STYLES['Heading1'], fontSize=24, alignment=TA_CENTER, spaceAfter=30)
+DOCUMENT_TITLE = ParagraphStyle('DocumentTitle', parent=_SAMPLE_STYLES['Heading1'], fontSize=22, alignment=TA_CENTER, spaceAfter=30)
+SUBTITLE = ParagraphStyle('Subtitle', parent=_SAMPLE_STYLES['Heading2'], alignment=TA_CENTER)
+INVOICE_HEADER = ParagraphStyle('Header', parent=NORMAL, fontSize=12, alignment=TA_CENTER, spaceAfter=20)
+CENTERED = ParagraphStyle('Centered', parent=NORMAL, alignment=TA_CENTER)
+
+INVOICE_INFO_STYLE = TableStyle([
+    ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+    ('FONTNAME', (1, 0), (1, -1), 'Helvetica'),
+    ('FONTSIZE', (0, 0), (-1, -1), 11),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+])
+INVOICE_ITEMS_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), BRAND_COLOR),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+    ('FONTSIZE', (0, 0), (-1, -1), 11),
+    ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 10),
+    ('TOPPADDING', (0, 0), (-1, -1), 10),
+    ('GRID', (0, 0), (-1, -1), 1, GRID_COLOR),
+])
+INVOICE_TOTALS_STYLE = TableStyle([
+    ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, -1), 11),
+    ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+    ('LINEABOVE', (0, -1), (-1, -1), 2, BRAND_COLOR),
+])
+CONTRACT_INFO_STYLE = TableStyle([
+    ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, -1), 10),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+])
+SIGNATURE_STYLE = TableStyle([
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('FONTSIZE', (0, 0), (-1, -1), 10),
+    ('TOPPADDING', (0, 0), (-1, -1), 15),
+])
+REPORT_SUMMARY_STYLE = TableStyle(INVOICE_ITEMS_STYLE.getCommands() + [
+    ('BACKGROUND', (0, -1), (-1, -1), colors.HexColor('#e6f3ff')),
+    ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+])
+REPORT_DISTRIBUTION_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), BRAND_COLOR),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, -1), 10),
+    ('ALIGN', (1, 0), (-1, -1), 'RIGHT'),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+    ('TOPPADDING', (0, 0), (-1, -1), 8),
+    ('GRID', (0, 0), (-1, -1), 1, GRID_COLOR),
+])
+
+ATTENDANCE_MATRIX_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), BRAND_COLOR),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, -1), 7),
+    ('ALIGN', (1, 0), (-1, -1), 'CENTER'),
+    ('TOPPADDING', (0, 0), (-1, -1), 3),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 3),
+    ('GRID', (0, 0), (-1, -1), 0.5, GRID_COLOR),
+])
+
+DISTRIBUTION_FETCH_SIZE = 1000
+# Upper bound on table rows that fit one page; only this many are laid out at a time
+TABLE_PAGE_ROWS = 60
+
+CONTRACT_TERMS = [
+    "1. The Instructor agrees to provide educational services as assigned by The Cooperative.",
+    "2. Payment will be made monthly based on the compensation structure outlined above.",
+    "3. The Instructor must maintain accurate attendance records for all sessions.",
+    "4. Either party may terminate this contract with 30 days written notice.",
+    "5. The Instructor agrees to comply with all Cooperative policies and regulations.",
+]
+
+# Parsed once; _static() hands out copies because layout stores state on them
+_STATIC = {
+    'invoice_header': [
+        Paragraph("Educational Cooperative", INVOICE_TITLE),
+        Paragraph("INVOICE", INVOICE_HEADER),
+    ],
+    'invoice_footer': [
+        Paragraph("Thank you for choosing our educational services!", CENTERED),
+    ],
+    'contract_header': [
+        Paragraph("Educational Cooperative", DOCUMENT_TITLE),
+        Paragraph("INSTRUCTOR CONTRACT", SUBTITLE),
+    ],
+    'contract_parties': [
+        Paragraph("<b>PARTIES</b>", HEADING3),
+        Paragraph("This contract is entered into between:", NORMAL),
+        Paragraph("<b>1. Educational Cooperative</b> (hereinafter referred to as 'The Cooperative')", NORMAL),
+    ],
+    'contract_terms': [Paragraph("<b>TERMS AND CONDITIONS</b>", HEADING3)] + [
+        flowable for term in CONTRACT_TERMS for flowable in (Paragraph(term, NORMAL), Spacer(1, 5))
+    ],
+    'contract_signatures': [
+        Table([
+            ['_' * 30, '_' * 30],
+            ['Cooperative Representative', 'Instructor Signature'],
+            ['', ''],
+            ['Date: _______________', 'Date: _______________'],
+        ], colWidths=[3*inch, 3*inch], style=SIGNATURE_STYLE),
+    ],
+    'report_title': [Paragraph("Educational Cooperative", DOCUMENT_TITLE)],
+}
+
+
+def _static(name):
+    return [copy.copy(flowable) for flowable in _STATIC[name]]
+
+
+def _document(buffer, pagesize=A4, margin=72):
+    return SimpleDocTemplate(
+        buffer, pagesize=pagesize, rightMargin=margin, leftMargin=margin, topMargin=margin, bottomMargin=margin
     )
-    
-    elements = []
-    
-    elements.append(Paragraph("Educational Cooperative", title_style))
-    elements.append(Paragraph("INVOICE", header_style))
+
+
+def _build(elements, output=None, **document_kwargs):
+    """Lay out ``elements`` into the file object ``output``, or return the PDF bytes."""
+    if output is not None:
+        _document(output, **document_kwargs).build(elements)
+        return None
+    buffer = BytesIO()
+    _document(buffer, **document_kwargs).build(elements)
+    return buffer.getvalue()
+
+
+def _pdf_response(pdf, filename):
+    response = HttpResponse(pdf, content_type='application/pdf')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+# ==============================================================================
+# INVOICES
+# ==============================================================================
+
+def invoice_data(payment):
+    """Plain, picklable data needed to render ``payment``'s invoice."""
+    student = payment.student
+    return {
+        'pk': payment.pk,
+        'month': payment.month,
+        'amount': payment.amount,
+        'amount_paid': payment.amount_paid,
+        'remaining_amount': payment.remaining_amount,
+        'status_display': payment.get_status_display(),
+        'student': {
+            'full_name': student.full_name,
+            'email': student.email,
+            'phone': student.phone,
+        } if student else None,
+    }
+
+
+def _invoice_elements(data):
+    elements = _static('invoice_header')
     elements.append(Spacer(1, 20))
-    
+
     invoice_info = [
-        ['Invoice Number:', f'INV-{payment.pk:05d}'],
+        ['Invoice Number:', f'INV-{data["pk"]:05d}'],
         ['Date:', date.today().strftime('%d/%m/%Y')],
-        ['Billing Period:', payment.month.strftime('%B %Y')],
+        ['Billing Period:', data['month'].strftime('%B %Y')],
     ]
-    
-    info_table = Table(invoice_info, colWidths=[2*inch, 3*inch])
-    info_table.setStyle(TableStyle([
-        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-        ('FONTNAME', (1, 0), (1, -1), 'Helvetica'),
-        ('FONTSIZE', (0, 0), (-1, -1), 11),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-    ]))
-    elements.append(info_table)
+    elements.append(Table(invoice_info, colWidths=[2*inch, 3*inch], style=INVOICE_INFO_STYLE))
     elements.append(Spacer(1, 20))
-    
-    if payment.student:
-        elements.append(Paragraph(f"<b>Bill To:</b>", styles['Normal']))
-        elements.append(Paragraph(f"{payment.student.full_name}", styles['Normal']))
-        if payment.student.email:
-            elements.append(Paragraph(f"{payment.student.email}", styles['Normal']))
-        if payment.student.phone:
-            elements.append(Paragraph(f"{payment.student.phone}", styles['Normal']))
-    
+
+    student = data['student']
+    if student:
+        elements.append(Paragraph(f"<b>Bill To:</b>", NORMAL))
+        elements.append(Paragraph(f"{student['full_name']}", NORMAL))
+        if student['email']:
+            elements.append(Paragraph(f"{student['email']}", NORMAL))
+        if student['phone']:
+            elements.append(Paragraph(f"{student['phone']}", NORMAL))
+
     elements.append(Spacer(1, 30))
-    
-    items = [['Description', 'Amount (DH)']]
-    items.append([f'Monthly Fee - {payment.month.strftime("%B %Y")}', f'{payment.amount:.2f}'])
-    
-    items_table = Table(items, colWidths=[4*inch, 1.5*inch])
-    items_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#1e3a5f')),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-        ('FONTSIZE', (0, 0), (-1, -1), 11),
-        ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 10),
-        ('TOPPADDING', (0, 0), (-1, -1), 10),
-        ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#cccccc')),
-    ]))
-    elements.append(items_table)
+
+    items = [
+        ['Description', 'Amount (DH)'],
+        [f'Monthly Fee - {data["month"].strftime("%B %Y")}', f'{data["amount"]:.2f}'],
+    ]
+    elements.append(Table(items, colWidths=[4*inch, 1.5*inch], style=INVOICE_ITEMS_STYLE))
     elements.append(Spacer(1, 20))
-    
+
     totals = [
-        ['Total Amount:', f'{payment.amount:.2f} DH'],
-        ['Amount Paid:', f'{payment.amount_paid:.2f} DH'],
-        ['Balance Due:', f'{payment.remaining_amount:.2f} DH'],
+        ['Total Amount:', f'{data["amount"]:.2f} DH'],
+        ['Amount Paid:', f'{data["amount_paid"]:.2f} DH'],
+        ['Balance Due:', f'{data["remaining_amount"]:.2f} DH'],
     ]
-    
-    totals_table = Table(totals, colWidths=[4*inch, 1.5*inch])
-    totals_table.setStyle(TableStyle([
-        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, -1), 11),
-        ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-        ('LINEABOVE', (0, -1), (-1, -1), 2, colors.HexColor('#1e3a5f')),
-    ]))
-    elements.append(totals_table)
+    elements.append(Table(totals, colWidths=[4*inch, 1.5*inch], style=INVOICE_TOTALS_STYLE))
     elements.append(Spacer(1, 40))
-    
-    elements.append(Paragraph(f"<b>Payment Status:</b> {payment.get_status_display()}", styles['Normal']))
-    
+
+    elements.append(Paragraph(f"<b>Payment Status:</b> {data['status_display']}", NORMAL))
     elements.append(Spacer(1, 40))
-    elements.append(Paragraph("Thank you for choosing our educational services!", 
-                             ParagraphStyle('Thanks', parent=styles['Normal'], alignment=TA_CENTER)))
-    
-    doc.build(elements)
-    
-    buffer.seek(0)
-    response = HttpResponse(buffer, content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename="invoice_{payment.pk}.pdf"'
-    return response
+    elements.extend(_static('invoice_footer'))
+    return elements
 
 
-def generate_contract(instructor, course=None):
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=72, leftMargin=72, topMargin=72, bottomMargin=72)
-    
-    styles = getSampleStyleSheet()
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=22,
-        alignment=TA_CENTER,
-        spaceAfter=30
-    )
-    
+def render_invoice(data, output=None):
+    """Render one invoice from invoice_data() to PDF bytes, or into ``output``."""
+    return _build(_invoice_elements(data), output)
+
+
+@timed_pdf('invoice_batch')
+def render_invoice_batch(payments, output=None):
+    """One PDF with a page per invoice, as bytes or written into ``output``."""
     elements = []
-    
-    elements.append(Paragraph("Educational Cooperative", title_style))
-    elements.append(Paragraph("INSTRUCTOR CONTRACT", 
-                             ParagraphStyle('Subtitle', parent=styles['Heading2'], alignment=TA_CENTER)))
+    for payment in payments:
+        if elements:
+            elements.append(PageBreak())
+        elements.extend(_invoice_elements(invoice_data(payment)))
+    if not elements:
+        elements.append(Paragraph("No invoices match the selected filters.", NORMAL))
+    return _build(elements, output)
+
+
+class _ZipStream:
+    """Write-only sink for ZipFile whose contents are drained after each entry."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def iter_invoice_zip(payments):
+    """
+    Yield a ZIP archive of per-payment invoice PDFs, one entry at a time.
+    Rendering is spread over the PDF engine's worker processes.
+    """
+    from .pdf_engine import render_many
+
+    names = deque()
+
+    def jobs():
+        for payment in payments:
+            data = invoice_data(payment)
+            names.append(f'invoice_{data["pk"]}.pdf')
+            yield 'invoice', data
+
+    stream = _ZipStream()
+    with zipfile.ZipFile(stream, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for pdf in render_many(jobs()):
+            archive.writestr(names.popleft(), pdf)
+            yield stream.drain()
+    yield stream.drain()
+
+
+# ==============================================================================
+# CONTRACTS
+# ==============================================================================
+
+def contract_data(instructor, course=None):
+    """Plain, picklable data needed to render an instructor contract."""
+    return {
+        'pk': instructor.pk,
+        'full_name': instructor.full_name,
+        'email': instructor.email,
+        'phone': instructor.phone,
+        'specialization': instructor.specialization,
+        'course': {'name': course.name, 'course_type': course.course_type} if course else None,
+    }
+
+
+def _contract_elements(data):
+    elements = _static('contract_header')
     elements.append(Spacer(1, 30))
-    
-    elements.append(Paragraph(f"<b>Contract Date:</b> {date.today().strftime('%d/%m/%Y')}", styles['Normal']))
+
+    elements.append(Paragraph(f"<b>Contract Date:</b> {date.today().strftime('%d/%m/%Y')}", NORMAL))
     elements.append(Spacer(1, 20))
-    
-    elements.append(Paragraph("<b>PARTIES</b>", styles['Heading3']))
-    elements.append(Paragraph("This contract is entered into between:", styles['Normal']))
-    elements.append(Paragraph("<b>1. Educational Cooperative</b> (hereinafter referred to as 'The Cooperative')", styles['Normal']))
-    elements.append(Paragraph(f"<b>2. {instructor.full_name}</b> (hereinafter referred to as 'The Instructor')", styles['Normal']))
+
+    elements.extend(_static('contract_parties'))
+    elements.append(Paragraph(f"<b>2. {data['full_name']}</b> (hereinafter referred to as 'The Instructor')", NORMAL))
     elements.append(Spacer(1, 20))
-    
-    elements.append(Paragraph("<b>INSTRUCTOR INFORMATION</b>", styles['Heading3']))
+
+    elements.append(Paragraph("<b>INSTRUCTOR INFORMATION</b>", HEADING3))
     info = [
-        ['Name:', instructor.full_name],
-        ['Email:', instructor.email or 'N/A'],
-        ['Phone:', instructor.phone or 'N/A'],
-        ['Specialization:', instructor.specialization],
+        ['Name:', data['full_name']],
+        ['Email:', data['email'] or 'N/A'],
+        ['Phone:', data['phone'] or 'N/A'],
+        ['Specialization:', data['specialization']],
     ]
-    
-    info_table = Table(info, colWidths=[2*inch, 4*inch])
-    info_table.setStyle(TableStyle([
-        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, -1), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-    ]))
-    elements.append(info_table)
+    elements.append(Table(info, colWidths=[2*inch, 4*inch], style=CONTRACT_INFO_STYLE))
     elements.append(Spacer(1, 20))
-    
-    elements.append(Paragraph("<b>COMPENSATION</b>", styles['Heading3']))
-    
+
+    elements.append(Paragraph("<b>COMPENSATION</b>", HEADING3))
+
+    course = data['course']
     if course:
-        if course.course_type == 'tutoring':
-            comp_text = f"For tutoring services in {course.name}: 100 DH per student per month"
+        if course['course_type'] == 'tutoring':
+            comp_text = f"For tutoring services in {course['name']}: 100 DH per student per month"
         else:
-            comp_text = f"For IT course {course.name}: 120 DH per hour (maximum 8 hours per month)"
-        elements.append(Paragraph(comp_text, styles['Normal']))
+            comp_text = f"For IT course {course['name']}: 120 DH per hour (maximum 8 hours per month)"
+        elements.append(Paragraph(comp_text, NORMAL))
     else:
-        elements.append(Paragraph("Tutoring: 100 DH per student per month", styles['Normal']))
-        elements.append(Paragraph("IT Courses: 120 DH per hour (maximum 8 hours per month)", styles['Normal']))
-    
+        elements.append(Paragraph("Tutoring: 100 DH per student per month", NORMAL))
+        elements.append(Paragraph("IT Courses: 120 DH per hour (maximum 8 hours per month)", NORMAL))
+
     elements.append(Spacer(1, 20))
-    
-    elements.append(Paragraph("<b>TERMS AND CONDITIONS</b>", styles['Heading3']))
-    terms = [
-        "1. The Instructor agrees to provide educational services as assigned by The Cooperative.",
-        "2. Payment will be made monthly based on the compensation structure outlined above.",
-        "3. The Instructor must maintain accurate attendance records for all sessions.",
-        "4. Either party may terminate this contract with 30 days written notice.",
-        "5. The Instructor agrees to comply with all Cooperative policies and regulations.",
-    ]
-    for term in terms:
-        elements.append(Paragraph(term, styles['Normal']))
-        elements.append(Spacer(1, 5))
-    
+    elements.extend(_static('contract_terms'))
     elements.append(Spacer(1, 40))
-    
-    sig_table = Table([
-        ['_' * 30, '_' * 30],
-        ['Cooperative Representative', 'Instructor Signature'],
-        ['', ''],
-        ['Date: _______________', 'Date: _______________'],
-    ], colWidths=[3*inch, 3*inch])
-    sig_table.setStyle(TableStyle([
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTSIZE', (0, 0), (-1, -1), 10),
-        ('TOPPADDING', (0, 0), (-1, -1), 15),
-    ]))
-    elements.append(sig_table)
-    
-    doc.build(elements)
-    
-    buffer.seek(0)
-    response = HttpResponse(buffer, content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename="contract_{instructor.pk}.pdf"'
-    return response
+    elements.extend(_static('contract_signatures'))
+    return elements
 
 
-def generate_financial_report(report):
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=72, leftMargin=72, topMargin=72, bottomMargin=72)
-    
-    styles = getSampleStyleSheet()
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=22,
-        alignment=TA_CENTER,
-        spaceAfter=30
+def render_contract(data, output=None):
+    """Render an instructor contract from contract_data() to PDF bytes, or into ``output``."""
+    return _build(_contract_elements(data), output)
+
+
+# ==============================================================================
+# FINANCIAL REPORTS
+# ==============================================================================
+
+class PagedTable(Flowable):
+    """
+    A long table laid out one page at a time.
+
+    A plain Table re-measures every remaining row each time it is split
+    across a page, which is quadratic in the row count. Here each split
+    builds a LongTable from the header and the next TABLE_PAGE_ROWS rows only,
+    keeps the part that fits the frame and carries the rest forward, so both
+    layout time and cell memory stay proportional to one page. The header is
+    repeated at the top of every page.
+
+    ``rows`` may be any iterable, including a lazy database iterator: rows are
+    pulled one page at a time, so a table of any length is never held whole.
+    """
+
+    def __init__(self, header, rows, format_row, pending=(), **table_kwargs):
+        super().__init__()
+        self.header = header
+        self.rows = iter(rows)
+        self.format_row = format_row
+        # Rows already pulled from ``rows`` for this page; a split may be
+        # retried in another frame and must see the same rows again
+        self.pending = list(pending)
+        self.table_kwargs = table_kwargs
+
+    def wrap(self, availWidth, availHeight):
+        # Never placed whole: the frame falls back to split() for each page
+        return availWidth, availHeight + 1
+
+    def split(self, availWidth, availHeight):
+        # One row past the page tells whether any rows remain after it
+        self.pending.extend(islice(self.rows, TABLE_PAGE_ROWS + 1 - len(self.pending)))
+        chunk = self.pending[:TABLE_PAGE_ROWS]
+        table = LongTable(
+            [self.header] + [self.format_row(row) for row in chunk], repeatRows=1, **self.table_kwargs
+        )
+        _, height = table.wrap(availWidth, availHeight)
+        if height <= availHeight:
+            consumed = len(chunk)
+        else:
+            parts = table.split(availWidth, availHeight)
+            if not parts:
+                return []
+            table = parts[0]
+            consumed = table._nrows - 1
+        if consumed >= len(self.pending):
+            return [table]
+        rest = PagedTable(self.header, self.rows, self.format_row, self.pending[consumed:], **self.table_kwargs)
+        return [table, rest]
+
+
+def report_data(report, stream=True):
+    """
+    Data needed to render a financial report. Distributions are compact
+    (member, share, amount) rows, since a large cooperative can have
+    thousands of them. By default they are a lazy iterator that reads them
+    in chunks while the table is laid out, so memory stays flat however many
+    there are; it can be consumed once and cannot be pickled. With
+    ``stream=False`` they are a list, to send the data to worker processes.
+    """
+    distributions = report.distributions.values_list(
+        'member__first_name', 'member__last_name', 'share_percentage', 'amount'
     )
-    
-    elements = []
-    
-    elements.append(Paragraph("Educational Cooperative", title_style))
-    elements.append(Paragraph(f"Financial Report - {report.month.strftime('%B %Y')}", 
-                             ParagraphStyle('Subtitle', parent=styles['Heading2'], alignment=TA_CENTER)))
+    rows = (
+        (f'{first_name} {last_name}', share_percentage, amount)
+        for first_name, last_name, share_percentage, amount
+        in distributions.iterator(chunk_size=DISTRIBUTION_FETCH_SIZE)
+    )
+    return {
+        'pk': report.pk,
+        'month': report.month,
+        'total_revenue': report.total_revenue,
+        'total_instructor_payments': report.total_instructor_payments,
+        'gross_profit': report.gross_profit,
+        'net_profit': report.net_profit,
+        'is_finalized': report.is_finalized,
+        'distributions': rows if stream else list(rows),
+    }
+
+
+def _report_elements(data):
+    elements = _static('report_title')
+    elements.append(Paragraph(f"Financial Report - {data['month'].strftime('%B %Y')}", SUBTITLE))
     elements.append(Spacer(1, 30))
-    
-    elements.append(Paragraph(f"<b>Report Generated:</b> {date.today().strftime('%d/%m/%Y')}", styles['Normal']))
+
+    elements.append(Paragraph(f"<b>Report Generated:</b> {date.today().strftime('%d/%m/%Y')}", NORMAL))
     elements.append(Spacer(1, 20))
-    
-    elements.append(Paragraph("<b>FINANCIAL SUMMARY</b>", styles['Heading3']))
-    
+
+    elements.append(Paragraph("<b>FINANCIAL SUMMARY</b>", HEADING3))
+
     summary = [
         ['Category', 'Amount (DH)'],
-        ['Total Revenue (Student Fees)', f'{report.total_revenue:,.2f}'],
-        ['Total Instructor Payments', f'{report.total_instructor_payments:,.2f}'],
-        ['Gross Profit', f'{report.gross_profit:,.2f}'],
-        ['Net Profit', f'{report.net_profit:,.2f}'],
+        ['Total Revenue (Student Fees)', f'{data["total_revenue"]:,.2f}'],
+        ['Total Instructor Payments', f'{data["total_instructor_payments"]:,.2f}'],
+        ['Gross Profit', f'{data["gross_profit"]:,.2f}'],
+        ['Net Profit', f'{data["net_profit"]:,.2f}'],
     ]
-    
-    summary_table = Table(summary, colWidths=[3.5*inch, 2*inch])
-    summary_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#1e3a5f')),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-        ('FONTSIZE', (0, 0), (-1, -1), 11),
-        ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 10),
-        ('TOPPADDING', (0, 0), (-1, -1), 10),
-        ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#cccccc')),
-        ('BACKGROUND', (0, -1), (-1, -1), colors.HexColor('#e6f3ff')),
-        ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
-    ]))
-    elements.append(summary_table)
+    elements.append(Table(summary, colWidths=[3.5*inch, 2*inch], style=REPORT_SUMMARY_STYLE))
     elements.append(Spacer(1, 30))
-    
-    distributions = report.distributions.select_related('member').all()
-    if distributions.exists():
-        elements.append(Paragraph("<b>PROFIT DISTRIBUTION</b>", styles['Heading3']))
-        
-        dist_data = [['Member', 'Capital Share (%)', 'Amount (DH)']]
-        for dist in distributions:
-            dist_data.append([
-                dist.member.full_name,
-                f'{dist.share_percentage:.2f}%',
-                f'{dist.amount:,.2f}'
-            ])
-        
-        dist_table = Table(dist_data, colWidths=[2.5*inch, 1.5*inch, 1.5*inch])
-        dist_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#1e3a5f')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, -1), 10),
-            ('ALIGN', (1, 0), (-1, -1), 'RIGHT'),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-            ('TOPPADDING', (0, 0), (-1, -1), 8),
-            ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#cccccc')),
-        ]))
-        elements.append(dist_table)
-    
+
+    distributions = iter(data['distributions'])
+    first = next(distributions, None)
+    if first is not None:
+        elements.append(Paragraph("<b>PROFIT DISTRIBUTION</b>", HEADING3))
+
+        elements.append(PagedTable(
+            ['Member', 'Capital Share (%)', 'Amount (DH)'],
+            chain([first], distributions),
+            lambda row: [row[0], f'{row[1]:.2f}%', f'{row[2]:,.2f}'],
+            colWidths=[2.5*inch, 1.5*inch, 1.5*inch],
+            style=REPORT_DISTRIBUTION_STYLE,
+        ))
+
     elements.append(Spacer(1, 40))
-    
-    status = "FINALIZED" if report.is_finalized else "DRAFT"
-    elements.append(Paragraph(f"<b>Report Status:</b> {status}", styles['Normal']))
-    
-    doc.build(elements)
-    
-    buffer.seek(0)
-    response = HttpResponse(buffer, content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename="financial_report_{report.month.strftime("%Y_%m")}.pdf"'
-    return response
+
+    status = "FINALIZED" if data['is_finalized'] else "DRAFT"
+    elements.append(Paragraph(f"<b>Report Status:</b> {status}", NORMAL))
+    return elements
+
+
+def render_financial_report(data, output=None):
+    """Render a financial report from report_data() to PDF bytes, or into ``output``."""
+    return _build(_report_elements(data), output)
+
+
+# ==============================================================================
+# ATTENDANCE MATRIX
+# ==============================================================================
+
+ATTENDANCE_MATRIX_MARGIN = 36
+
+
+def attendance_matrix_data(matrix):
+    """Plain data needed to render an AttendanceMatrix, one P/A/E string per cell."""
+    return {
+        'course': matrix.course.name,
+        'month': matrix.month,
+        'dates': matrix.dates,
+        'rows': [
+            (f'{last_name}, {first_name}', [STATUS_LETTERS[code] for code in codes],
+             totals['present'], totals['absent'], totals['excused'])
+            for last_name, first_name, codes, totals in matrix.rows()
+        ],
+    }
+
+
+def render_attendance_matrix(data, output=None):
+    """Render attendance_matrix_data() to landscape PDF bytes, or into ``output``."""
+    pagesize = landscape(A4)
+    name_width, total_width = 2*inch, 0.35*inch
+    available = pagesize[0] - 2 * ATTENDANCE_MATRIX_MARGIN - name_width - 3 * total_width
+    date_width = min(available / max(len(data['dates']), 1), 0.6*inch)
+
+    elements = [
+        Paragraph(f"Attendance - {data['course']}", SUBTITLE),
+        Paragraph(data['month'].strftime('%B %Y'), CENTERED),
+        Spacer(1, 15),
+    ]
+    if data['rows']:
+        elements.append(PagedTable(
+            ['Student'] + [day.strftime('%d') for day in data['dates']] + ['P', 'A', 'E'],
+            data['rows'],
+            lambda row: [row[0]] + row[1] + [row[2], row[3], row[4]],
+            colWidths=[name_width] + [date_width] * len(data['dates']) + [total_width] * 3,
+            style=ATTENDANCE_MATRIX_STYLE,
+        ))
+    else:
+        elements.append(Paragraph("No students enrolled.", CENTERED))
+    return _build(elements, output, pagesize=pagesize, margin=ATTENDANCE_MATRIX_MARGIN)
+
+
+@timed_pdf('attendance_matrix')
+def generate_attendance_matrix(matrix):
+    pdf = render_attendance_matrix(attendance_matrix_data(matrix))
+    return _pdf_response(pdf, f'attendance_{matrix.course.pk}_{matrix.month.strftime("%Y_%m")}.pdf')
@@ -0,0 +1,193 @@
+"""
+Model signal handlers that keep derived tables in sync with their sources
+"""
+
+from django.db.models import F
+from django.db.models.signals import post_init, post_save, post_delete
+from django.dispatch import receiver
+
+from . import finance, jobs, pdf_cache
+from .models import (
+    Course, Enrollment, Payment, Expense, MonthlyKpiSnapshot, DirtyReportMonth,
+    Instructor, FinancialReport, ProfitDistribution, Attendance, AttendanceArchive, AttendanceMonthlyRollup
+)
+
+
+def _month_of(instance):
+    """Return the instance's billing month as a date (forms may assign strings)."""
+    value = instance.__dict__.get('month')
+    if value is None:
+        return None
+    return instance._meta.get_field('month').to_python(value)
+
+
+# ==============================================================================
+# KPI SNAPSHOTS AND FINANCIAL REPORTS
+# ==============================================================================
+
+def months_changed(months):
+    """
+    Refresh what depends on the payments and expenses of ``months``. Called
+    directly by code that writes them with update() or bulk_create().
+    """
+    MonthlyKpiSnapshot.refresh(months)
+    _dependents_changed(months)
+
+
+def _dependents_changed(months):
+    finance.invalidate_series()
+    # Reports are recomputed in the background, all dirty months at once
+    if DirtyReportMonth.mark(months):
+        jobs.enqueue_unique('refresh_reports')
+
+
+def _snapshot_changed(old, new, months):
+    if old is None or new is None:
+        # Values not known on the instance: recompute the months instead
+        MonthlyKpiSnapshot.refresh(months)
+    else:
+        MonthlyKpiSnapshot.apply_change(old, new)
+    _dependents_changed(months)
+
+
+@receiver(post_init, sender=Payment)
+@receiver(post_init, sender=Expense)
+def remember_saved_month(sender, instance, **kwargs):
+    instance._saved_month = _month_of(instance)
+    # What the stored row adds to the KPI snapshots; a new one adds nothing
+    instance._saved_contribution = (
+        (None, {}) if instance.pk is None else MonthlyKpiSnapshot.contribution(instance)
+    )
+
+
+@receiver(post_save, sender=Payment)
+@receiver(post_save, sender=Expense)
+def refresh_month_on_save(sender, instance, created, update_fields=None, **kwargs):
+    month = _month_of(instance)
+    old = (None, {}) if created else getattr(instance, '_saved_contribution', None)
+    # With update_fields, the instance may hold values that were not written
+    new = MonthlyKpiSnapshot.contribution(instance) if update_fields is None else None
+    _snapshot_changed(old, new, {month, getattr(instance, '_saved_month', None)})
+    instance._saved_month = month
+    instance._saved_contribution = new
+
+
+@receiver(post_delete, sender=Payment)
+@receiver(post_delete, sender=Expense)
+def refresh_month_on_delete(sender, instance, **kwargs):
+    old = getattr(instance, '_saved_contribution', None)
+    _snapshot_changed(old, (None, {}), {_month_of(instance), getattr(instance, '_saved_month', None)})
+
+
+# ==============================================================================
+# COURSE ENROLLMENT COUNTERS
+# ==============================================================================
+
+def _adjust_enrollment_count(course_id, delta):
+    courses = Course.objects.filter(pk=course_id)
+    if delta < 0:
+        # Never underflow a drifted counter; reconcile_enrollment_counts repairs it
+        courses = courses.filter(active_enrollment_count__gte=-delta)
+    courses.update(active_enrollment_count=F('active_enrollment_count') + delta)
+
+
+@receiver(post_init, sender=Enrollment)
+def remember_enrollment_state(sender, instance, **kwargs):
+    instance._counted_course_id = instance.__dict__.get('course_id')
+    instance._counted_active = bool(instance.__dict__.get('is_active'))
+
+
+@receiver(post_save, sender=Enrollment)
+def update_enrollment_count_on_save(sender, instance, created, **kwargs):
+    if created:
+        old_course_id, old_active = None, False
+    else:
+        old_course_id, old_active = instance._counted_course_id, instance._counted_active
+    new_course_id, new_active = instance.course_id, bool(instance.is_active)
+
+    if (old_course_id, old_active) != (new_course_id, new_active):
+        if old_active and old_course_id:
+            _adjust_enrollment_count(old_course_id, -1)
+        if new_active:
+            _adjust_enrollment_count(new_course_id, 1)
+
+    instance._counted_course_id = new_course_id
+    instance._counted_active = new_active
+
+
+@receiver(post_delete, sender=Enrollment)
+def update_enrollment_count_on_delete(sender, instance, **kwargs):
+    if instance._counted_active and instance._counted_course_id:
+        _adjust_enrollment_count(instance._counted_course_id, -1)
+
+
+# ==============================================================================
+# ATTENDANCE ROLLUPS
+# ==============================================================================
+
+def _attendance_cell(instance):
+    """Return the (enrollment_id, month) rollup an attendance row counts towards."""
+    value = instance.__dict__.get('date')
+    if value is None:
+        return None, None
+    day = instance._meta.get_field('date').to_python(value)
+    return instance.__dict__.get('enrollment_id'), day.replace(day=1)
+
+
+def _refresh_rollups(*cells):
+    cells = {cell for cell in cells if None not in cell}
+    if cells:
+        AttendanceMonthlyRollup.refresh({pk for pk, _ in cells}, {month for _, month in cells})
+
+
+@receiver(post_init, sender=Attendance)
+def remember_attendance_cell(sender, instance, **kwargs):
+    instance._saved_cell = _attendance_cell(instance)
+
+
+@receiver(post_save, sender=Attendance)
+def refresh_rollup_on_save(sender, instance, **kwargs):
+    cell = _attendance_cell(instance)
+    if cell[0] is not None:
+        # The live row replaces an archived one for the same day
+        day = instance._meta.get_field('date').to_python(instance.date)
+        AttendanceArchive.release([(cell[0], day)])
+    _refresh_rollups(cell, getattr(instance, '_saved_cell', (None, None)))
+    instance._saved_cell = cell
+
+
+@receiver(post_delete, sender=Attendance)
+def refresh_rollup_on_delete(sender, instance, origin=None, **kwargs):
+    # A delete cascading from an enrollment (or its student or course)
+    # removes that enrollment's rollups too; there is nothing to recompute
+    if origin is not None and not isinstance(origin, Attendance) and getattr(origin, 'model', None) is not Attendance:
+        return
+    _refresh_rollups(_attendance_cell(instance), getattr(instance, '_saved_cell', (None, None)))
+
+
+# ==============================================================================
+# PDF CACHE
+# ==============================================================================
+
+@receiver(post_save, sender=Payment)
+@receiver(post_delete, sender=Payment)
+def invalidate_invoice_pdf(sender, instance, **kwargs):
+    pdf_cache.invalidate('invoice', instance.pk)
+
+
+@receiver(post_save, sender=Instructor)
+@receiver(post_delete, sender=Instructor)
+def invalidate_contract_pdf(sender, instance, **kwargs):
+    pdf_cache.invalidate('contract', instance.pk)
+
+
+@receiver(post_save, sender=FinancialReport)
+@receiver(post_delete, sender=FinancialReport)
+def invalidate_report_pdf(sender, instance, **kwargs):
+    pdf_cache.invalidate('financial_report', instance.pk)
+
+
+@receiver(post_save, sender=ProfitDistribution)
+@receiver(post_delete, sender=ProfitDistribution)
+def invalidate_report_pdf_on_distribution(sender, instance, **kwargs):
+    pdf_cache.invalidate('financial_report', instance.financial_report_id)
@@ -1,3 +1,1068 @@
-from django.test import TestCase
+import base64
+import csv
+import io
+import json
+import re
+import shutil
+import tempfile
+import time
+import zipfile
+import zlib
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from io import BytesIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.db.models import F
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import benchmarks, billing, finance, jobs, ledger, metrics, pdf_cache, pdf_engine, pdf_generator
+from .attendance import archive_attendance, attendance_counts, attendance_matrix, attendance_tiers, upsert_attendance
+from .attendance_codes import STATUS_CODES
+from .management.commands import benchmark_pdf
+from .pagination import keyset_paginate
+from .models import (
+    Attendance, AttendanceArchive, AttendanceMonthlyRollup, AuditLog, CacheVersion, Course, DirtyReportMonth,
+    Enrollment, Expense, FinancialReport, Instructor, Job, Member, MonthlyKpiSnapshot, Payment, PaymentTransaction, Student,
+    User,
+)
+
+
+class BenchmarkDatasetTestCase(TestCase):
+    """Runs against the dataset the committed benchmark baseline was recorded on."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.media_root = tempfile.mkdtemp()
+        cls.media_override = override_settings(MEDIA_ROOT=cls.media_root)
+        cls.media_override.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.media_override.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.baseline = benchmarks.load_baseline()
+        if cls.baseline:
+            benchmarks.build_dataset(cls.baseline['dataset'])
+
+    def setUp(self):
+        if not self.baseline:
+            self.skipTest('No benchmark baseline committed.')
+        self.client.force_login(User.objects.get(username='benchmark'))
+
+
+class QueryBudgetTests(BenchmarkDatasetTestCase):
+    """Every page must stay within the SQL query budget recorded in benchmark_baseline.json."""
+
+    def test_views_within_query_budget(self):
+        for name, url in benchmarks.benchmark_urls():
+            with self.subTest(view=name):
+                result = benchmarks.measure(self.client, url, repeat=1)
+                self.assertEqual(result['status'], 200)
+                budget = self.baseline['views'].get(name)
+                self.assertIsNotNone(budget, f'{name} has no baseline entry')
+                self.assertLessEqual(result['queries'], budget['queries'])
+
+
+class QueryPlanTests(BenchmarkDatasetTestCase):
+    """Dashboard and report queries must reach the large tables through an index."""
+
+    def test_no_full_table_scans(self):
+        for name, url in benchmarks.benchmark_urls():
+            if name not in benchmarks.EXPLAIN_VIEWS:
+                continue
+            with self.subTest(view=name):
+                status, scans = benchmarks.full_table_scans(self.client, url)
+                self.assertEqual(status, 200)
+                self.assertEqual(scans, [])
+
+
+def pdf_text(pdf):
+    """The decompressed page content of a ReportLab PDF, where drawn strings can be found."""
+    streams = re.findall(rb'stream\r?\n(.*?)endstream', pdf, re.S)
+    return b''.join(zlib.decompress(base64.a85decode(b'<~' + stream.strip(), adobe=True)) for stream in streams)
+
+
+class PdfEngineTests(SimpleTestCase):
+    def invoice(self, pk):
+        return {
+            'pk': pk, 'month': date(2025, 11, 1), 'amount': Decimal('300'), 'amount_paid': Decimal('100'),
+            'remaining_amount': Decimal('200'), 'status_display': 'Partial',
+            'student': {'full_name': 'Sara Bennani', 'email': 'sara@example.com', 'phone': ''},
+        }
+
+    def test_render_many_through_process_pool(self):
+        # Spawned workers import pdf_generator without django.setup()
+        jobs = [('invoice', self.invoice(pk)) for pk in range(pdf_engine.MIN_PARALLEL_JOBS)]
+        pdfs = list(pdf_engine.render_many(jobs, workers=2))
+        self.assertEqual(len(pdfs), len(jobs))
+        self.assertTrue(all(pdf.startswith(b'%PDF') for pdf in pdfs))
+
+    def test_render_many_keeps_job_order(self):
+        jobs = [('invoice', self.invoice(pk)) for pk in range(pdf_engine.MIN_PARALLEL_JOBS * 2)]
+        for workers in [1, 3]:
+            with self.subTest(workers=workers):
+                pdfs = pdf_engine.render_many(jobs, workers=workers)
+                for pk, pdf in enumerate(pdfs):
+                    self.assertIn(f'INV-{pk:05d}'.encode(), pdf_text(pdf))
+
+    def test_shared_layouts_render_the_same_every_time(self):
+        documents = [
+            (pdf_generator.render_invoice, benchmark_pdf.SAMPLE_INVOICE),
+            (pdf_generator.render_contract, benchmark_pdf.SAMPLE_CONTRACT),
+            (pdf_generator.render_financial_report, benchmark_pdf.SAMPLE_REPORT),
+        ]
+        for render, data in documents:
+            with self.subTest(render=render.__name__):
+                first = pdf_text(render(data))
+                self.assertIn(b'Educational Cooperative', first)
+                self.assertEqual(pdf_text(render(data)), first)
+
+    def test_benchmark_pdf_times_every_document(self):
+        out = io.StringIO()
+        call_command('benchmark_pdf', iterations=2, stdout=out)
+        documents = [line.split()[0] for line in out.getvalue().splitlines()[1:]]
+        self.assertEqual(documents, ['invoice', 'contract', 'financial_report'])
+
+    def test_paged_table_pulls_rows_a_page_at_a_time(self):
+        pulled, placed = [], []
+
+        def rows():
+            for index in range(500):
+                pulled.append(index)
+                yield [str(index)]
+
+        def after_flowable(flowable):
+            if not isinstance(flowable, pdf_generator.LongTable):
+                return
+            if not placed:
+                self.assertLessEqual(len(pulled), pdf_generator.TABLE_PAGE_ROWS + 1)
+            placed.extend(row[0] for row in flowable._cellvalues[1:])
+
+        document = pdf_generator._document(BytesIO())
+        document.afterFlowable = after_flowable
+        document.build([pdf_generator.PagedTable(['#'], rows(), lambda row: row)])
+        self.assertEqual(placed, [str(index) for index in range(500)])
+
+
+class PdfCacheTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        media_override = override_settings(MEDIA_ROOT=media_root)
+        media_override.enable()
+        self.addCleanup(media_override.disable)
+        self.client.force_login(User.objects.create_user('manager', role='admin'))
+        self.student = Student.objects.create(first_name='Sara', last_name='Bennani', email='sara@example.com')
+        self.payment = Payment.objects.create(
+            student=self.student, payment_type='student_fee', month=date(2025, 11, 1), amount=Decimal('300'),
+        )
+        self.url = reverse('core:generate_invoice_pdf', args=[self.payment.pk])
+
+    def test_known_etag_is_not_modified_without_building_data(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        with mock.patch('core.views.invoice_data') as invoice_data:
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        invoice_data.assert_not_called()
+
+    def test_changed_student_changes_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        self.student.phone = '0600000000'
+        self.student.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_new_distribution_changes_report_etag(self):
+        report = FinancialReport.objects.create(month=date(2025, 11, 1), net_profit=Decimal('1000.00'))
+        url = reverse('core:generate_report_pdf', args=[report.pk])
+        etag = self.client.get(url)['ETag']
+        Member.objects.create(first_name='Member', last_name='0', email='member0@example.com', capital_shares=Decimal('100'))
+        finance.distribute_profits(report)
+        FinancialReport.objects.filter(pk=report.pk).update(updated_at=report.updated_at)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_failed_render_leaves_nothing_in_the_cache(self):
+        with mock.patch.dict(pdf_cache.RENDERERS, invoice=mock.Mock(side_effect=ValueError)):
+            with self.assertRaises(ValueError):
+                self.client.get(self.url)
+        self.assertEqual(list(pdf_cache.cache_dir().rglob('*.*')), [])
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        self.assertEqual(len(list(pdf_cache.cache_dir().rglob('*.pdf'))), 1)
+
+    def test_large_document_is_spooled_to_disk(self):
+        spools = []
+        spooled_file = tempfile.SpooledTemporaryFile
+
+        def spool(**kwargs):
+            spools.append(spooled_file(**kwargs))
+            return spools[-1]
+
+        with mock.patch.object(pdf_cache, 'SPOOL_MAX_SIZE', 16), \
+                mock.patch.object(pdf_cache.tempfile, 'SpooledTemporaryFile', spool):
+            response = self.client.get(self.url)
+        self.assertTrue(spools[0]._rolled)
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'%PDF'))
+
+
+class JobQueueTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('jobs', role='admin')
+
+    def test_enqueued_job_runs_to_completion(self):
+        job = jobs.enqueue('financial_report', {'month': '2025-11-01'}, self.user)
+        self.assertEqual(jobs.work(once=True), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'succeeded')
+        self.assertEqual(job.result['report_id'], FinancialReport.objects.get(month='2025-11-01').pk)
+
+    def test_job_is_claimed_once(self):
+        job = jobs.enqueue('financial_report', {'month': '2025-11-01'})
+        self.assertEqual(jobs.claim_next('a').pk, job.pk)
+        self.assertIsNone(jobs.claim_next('b'))
+
+    def test_failure_is_recorded(self):
+        job = jobs.enqueue('distribute_profits', {'report_id': 0})
+        jobs.work(once=True)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'failed')
+        self.assertIn('DoesNotExist', job.error)
+
+    def test_stale_jobs_are_requeued(self):
+        job = jobs.enqueue('financial_report', {'month': '2025-11-01'})
+        jobs.claim_next('dead-worker')
+        Job.objects.filter(pk=job.pk).update(updated_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(jobs.requeue_stale(), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'queued')
+
+    def test_old_job_files_are_purged(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        old = jobs.enqueue('financial_report', {'month': '2025-11-01'})
+        recent = jobs.enqueue('financial_report', {'month': '2025-11-01'})
+        Job.objects.filter(pk=old.pk).update(status='succeeded', finished_at=timezone.now() - timedelta(days=30))
+        Job.objects.filter(pk=recent.pk).update(status='succeeded', finished_at=timezone.now())
+        with override_settings(MEDIA_ROOT=media_root):
+            for pk in [old.pk, recent.pk, 999999]:
+                path = jobs.Path(media_root) / 'jobs' / str(pk)
+                path.mkdir(parents=True)
+                (path / 'invoices.zip').write_bytes(b'zip')
+            self.assertEqual(jobs.purge_job_files(), 2)
+            self.assertEqual([p.name for p in (jobs.Path(media_root) / 'jobs').iterdir()], [str(recent.pk)])
+
+
+class JobHeartbeatTests(TransactionTestCase):
+    def test_long_step_keeps_job_fresh(self):
+        def slow_handler(job):
+            started = Job.objects.get(pk=job.pk).updated_at
+            time.sleep(0.3)
+            return {'beat': Job.objects.get(pk=job.pk).updated_at > started}
+
+        with mock.patch.dict(jobs.HANDLERS, {'slow': slow_handler}), override_settings(JOB_HEARTBEAT_INTERVAL=0.05):
+            job = jobs.enqueue('slow', {})
+            jobs.work(once=True)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'succeeded')
+        self.assertTrue(job.result['beat'])
+
+
+class KpiSnapshotTests(TestCase):
+    def setUp(self):
+        self.month = date(2025, 11, 1)
+
+    def fee(self, amount, **fields):
+        name = f'student{Student.objects.count()}'
+        return Payment.objects.create(
+            student=Student.objects.create(first_name=name, last_name='Bennani', email=f'{name}@example.com'),
+            payment_type='student_fee', month=self.month, amount=Decimal(amount), **fields
+        )
+
+    def test_saving_payments_refreshes_month(self):
+        self.fee('300')
+        paid = self.fee('200', amount_paid=Decimal('200'), status='paid')
+        snapshot = MonthlyKpiSnapshot.objects.get(month=self.month)
+        self.assertEqual(snapshot.revenue_expected, Decimal('500'))
+        self.assertEqual(snapshot.revenue_paid, Decimal('200'))
+        self.assertEqual(snapshot.pending_student_payments, 1)
+
+        paid.delete()
+        snapshot.refresh_from_db()
+        self.assertEqual((snapshot.revenue_expected, snapshot.revenue_paid), (Decimal('300'), Decimal('0')))
+
+    def test_single_row_changes_apply_deltas(self):
+        def snapshots():
+            return list(MonthlyKpiSnapshot.objects.order_by('month').values(
+                'month', *MonthlyKpiSnapshot.PAYMENT_FIELDS, *MonthlyKpiSnapshot.EXPENSE_FIELDS
+            ))
+
+        self.fee('300')
+        expense = Expense.objects.create(
+            expense_type='rent', description='Rent', amount=Decimal('1000'), month=self.month, status='pending',
+        )
+        MonthlyKpiSnapshot.objects.create(month=date(2025, 12, 1))
+        with CaptureQueriesContext(connection) as queries:
+            payment = self.fee('250')
+            payment.amount_paid, payment.status = Decimal('250'), 'paid'
+            payment.save()
+            payment.month = date(2025, 12, 1)
+            payment.save()
+            expense.status = 'paid'
+            expense.save()
+            Payment.objects.get(pk=payment.pk).delete()
+        self.assertFalse([query['sql'] for query in queries if 'SUM(' in query['sql']])
+
+        incremental = snapshots()
+        MonthlyKpiSnapshot.refresh()
+        self.assertEqual(incremental[:1], snapshots())
+        self.assertEqual(incremental[0]['operational_expenses'], Decimal('1000'))
+
+    def test_full_rebuild_drops_empty_months(self):
+        self.fee('300')
+        MonthlyKpiSnapshot.objects.create(month=date(2025, 1, 1), revenue_expected=Decimal('999'))
+        MonthlyKpiSnapshot.objects.filter(month=self.month).update(revenue_expected=0)
+        self.assertEqual(MonthlyKpiSnapshot.refresh(), 1)
+        self.assertEqual(
+            list(MonthlyKpiSnapshot.objects.values_list('month', 'revenue_expected')), [(self.month, Decimal('300'))]
+        )
+
+
+class CourseEnrollmentStatsTests(TestCase):
+    def test_stats_are_annotated_in_one_query(self):
+        course = Course.objects.create(
+            name='Maths', course_type='tutoring', subject='math', monthly_fee=Decimal('250'), enrollment_limit=5,
+        )
+        for index, active in enumerate([True, True, False]):
+            student = Student.objects.create(first_name='Student', last_name=str(index), email=f's{index}@example.com')
+            Enrollment.objects.create(student=student, course=course, is_active=active)
+
+        with self.assertNumQueries(1):
+            course = Course.objects.with_enrollment_stats().get(pk=course.pk)
+            stats = (course.enrolled_count, course.available_slots, course.monthly_revenue, course.is_full)
+        self.assertEqual(stats, (2, 3, Decimal('500'), False))
+
+
+class EnrollmentCounterTests(TestCase):
+    def setUp(self):
+        self.maths, self.physics = [
+            Course.objects.create(name=name, course_type='tutoring', subject=subject, monthly_fee=Decimal('250'))
+            for name, subject in [('Maths', 'math'), ('Physics', 'physics')]
+        ]
+        self.student = Student.objects.create(first_name='Sara', last_name='Bennani', email='sara@example.com')
+
+    def counts(self):
+        return [Course.objects.get(pk=course.pk).active_enrollment_count for course in (self.maths, self.physics)]
+
+    def test_counter_follows_enrollment_changes(self):
+        enrollment = Enrollment.objects.create(student=self.student, course=self.maths)
+        self.assertEqual(self.counts(), [1, 0])
+        enrollment.course = self.physics
+        enrollment.save()
+        self.assertEqual(self.counts(), [0, 1])
+        enrollment.is_active = False
+        enrollment.save()
+        self.assertEqual(self.counts(), [0, 0])
+        enrollment.is_active = True
+        enrollment.save()
+        Enrollment.objects.get(pk=enrollment.pk).delete()
+        self.assertEqual(self.counts(), [0, 0])
+
+    def test_reconcile_repairs_drift(self):
+        Enrollment.objects.create(student=self.student, course=self.maths)
+        Course.objects.filter(pk=self.maths.pk).update(active_enrollment_count=7)
+        self.assertEqual(list(Course.objects.with_enrollment_drift().values_list('pk', flat=True)), [self.maths.pk])
+        Course.objects.reconcile_enrollment_counts()
+        self.assertFalse(Course.objects.with_enrollment_drift().exists())
+        self.assertEqual(self.counts(), [1, 0])
+
+
+class CsvExportTests(TestCase):
+    def test_payment_export_streams_filtered_rows(self):
+        self.client.force_login(User.objects.create_user('accountant', role='admin'))
+        for index, status in enumerate(['paid', 'pending', 'paid']):
+            student = Student.objects.create(first_name='Élodie', last_name=str(index), email=f's{index}@example.com')
+            Payment.objects.create(
+                student=student, payment_type='student_fee', month=date(2025, 9 + index, 1),
+                amount=Decimal('250'), status=status,
+            )
+
+        response = self.client.get(reverse('core:student_payment_list'), {'status': 'paid', 'export': 'csv'})
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="student_payments.csv"')
+        header, *rows = csv.reader(b''.join(response.streaming_content).decode('utf-8-sig').splitlines())
+        self.assertEqual(header[:3], ['Month', 'Student ID', 'First Name'])
+        self.assertEqual([(row[0], row[2], row[6]) for row in rows], [
+            ('2025-11-01', 'Élodie', 'paid'), ('2025-09-01', 'Élodie', 'paid'),
+        ])
+
+
+class KeysetPaginationTests(TestCase):
+    ordering = ['last_name', 'first_name', 'pk']
+
+    def setUp(self):
+        # Three students share every sort value but the pk
+        self.students = [
+            Student.objects.create(first_name=first_name, last_name=last_name, email=f's{index}@example.com')
+            for index, (first_name, last_name) in enumerate([
+                ('Omar', 'Chraibi'), ('Adam', 'Bennani'), ('Sara', 'Alaoui'), ('Adam', 'Bennani'), ('Adam', 'Bennani'),
+            ])
+        ]
+
+    def page(self, query=''):
+        request = RequestFactory().get(f'/students/?{query}')
+        return keyset_paginate(request, Student.objects.all(), self.ordering, per_page=2)
+
+    def test_walks_forward_and_back(self):
+        chraibi, bennani, alaoui = self.students[0], self.students[1::2] + self.students[4:], self.students[2]
+
+        first = self.page()
+        self.assertEqual(list(first), [alaoui, bennani[0]])
+        self.assertEqual((first.has_previous, first.has_next), (False, True))
+        middle = self.page(first.next_query)
+        self.assertEqual(list(middle), bennani[1:])
+        self.assertEqual((middle.has_previous, middle.has_next), (True, True))
+        last = self.page(middle.next_query)
+        self.assertEqual(list(last), [chraibi])
+        self.assertEqual((last.has_previous, last.has_next), (True, False))
+
+        back = self.page(last.previous_query)
+        self.assertEqual(list(back), list(middle))
+        self.assertEqual((back.has_previous, back.has_next), (True, True))
+        start = self.page(back.previous_query)
+        self.assertEqual(list(start), list(first))
+        self.assertEqual((start.has_previous, start.has_next), (False, True))
+
+    def test_malformed_cursor_falls_back_to_the_first_page(self):
+        first = list(self.page())
+        for query in ['after=not-a-cursor', 'before=%25%25', 'after=WyJBbGFvdWkiXQ']:
+            with self.subTest(query=query):
+                page = self.page(query)
+                self.assertEqual(list(page), first)
+                self.assertFalse(page.has_previous)
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        metrics.reset()
+        self.addCleanup(metrics.reset)
+        self.client.force_login(User.objects.create_user('operator', role='admin'))
+
+    def test_requests_are_recorded_by_url_name(self):
+        self.client.get(reverse('core:audit_log'))
+        body = self.client.get(reverse('core:metrics')).content.decode()
+
+        self.assertIn('http_request_duration_seconds_count{view="core:audit_log"} 1', body)
+        self.assertIn('http_request_sql_queries_count{view="core:audit_log"} 1', body)
+        # Session, user and the audit log page itself
+        self.assertRegex(body, r'http_request_sql_queries_sum\{view="core:audit_log"\} [1-9]')
+
+    def test_histogram_buckets_are_cumulative(self):
+        for seconds in [0.003, 0.2, 30]:
+            metrics.observe('pdf_render_duration_seconds', seconds, document='invoice')
+        body = metrics.render_prometheus()
+        self.assertIn('pdf_render_duration_seconds_bucket{document="invoice",le="0.005"} 1', body)
+        self.assertIn('pdf_render_duration_seconds_bucket{document="invoice",le="0.25"} 2', body)
+        self.assertIn('pdf_render_duration_seconds_bucket{document="invoice",le="10"} 2', body)
+        self.assertIn('pdf_render_duration_seconds_bucket{document="invoice",le="+Inf"} 3', body)
+
+
+class FixtureDataTests(TestCase):
+    options = {
+        'students': 30, 'courses': 4, 'months': 2, 'end_month': '2025-11', 'expenses_per_month': 3,
+        'audit_logs_per_month': 5, 'members': 3, 'stdout': io.StringIO(),
+    }
+
+    def fingerprint(self):
+        return (
+            list(Student.objects.order_by('pk').values_list('first_name', 'last_name')),
+            list(Payment.objects.order_by('pk').values_list('month', 'amount', 'amount_paid', 'status')),
+            Attendance.objects.count() + AttendanceArchive.objects.count(),
+        )
+
+    def test_same_seed_regenerates_same_data(self):
+        call_command('generate_fixture_data', **self.options)
+        first = self.fingerprint()
+        with self.assertRaises(CommandError):
+            call_command('generate_fixture_data', **self.options)
+        call_command('generate_fixture_data', flush=True, **self.options)
+        self.assertEqual(self.fingerprint(), first)
+        with mock.patch('django.utils.timezone.localdate', return_value=date(2025, 11, 2)):
+            call_command('generate_fixture_data', flush=True, **self.options)
+        self.assertEqual(self.fingerprint(), first)
+
+    def test_as_of_stops_attendance(self):
+        call_command('generate_fixture_data', as_of='2025-10-31', **self.options)
+        self.assertFalse(Attendance.objects.filter(date__gt=date(2025, 10, 31)).exists())
+        self.assertTrue(Attendance.objects.filter(date__month=10).exists())
+
+    def test_derived_tables_match_generated_rows(self):
+        call_command('generate_fixture_data', **self.options)
+        self.assertTrue(Enrollment.objects.exists())
+        self.assertFalse(Course.objects.with_enrollment_drift().exists())
+        self.assertFalse(ledger.with_ledger_drift().exists())
+        snapshots = list(MonthlyKpiSnapshot.objects.order_by('month').values())
+        MonthlyKpiSnapshot.refresh()
+        self.assertEqual(
+            [dict(row, updated_at=None) for row in MonthlyKpiSnapshot.objects.order_by('month').values()],
+            [dict(row, updated_at=None) for row in snapshots],
+        )
+
+
+class BulkInvoiceTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        media_override = override_settings(MEDIA_ROOT=media_root)
+        media_override.enable()
+        self.addCleanup(media_override.disable)
+        self.client.force_login(User.objects.create_user('manager', role='admin'))
+        self.course = Course.objects.create(name='Maths', course_type='tutoring', subject='math', monthly_fee=Decimal('250'))
+        for last_name, status, enrolled in [('Zahra', 'pending', True), ('Alaoui', 'pending', True),
+                                            ('Chami', 'paid', True), ('Idrissi', 'pending', False)]:
+            student = Student.objects.create(first_name='Sara', last_name=last_name, email=f'{last_name}@example.com')
+            if enrolled:
+                Enrollment.objects.create(student=student, course=self.course)
+            Payment.objects.create(
+                student=student, payment_type='student_fee', month=date(2025, 11, 1), amount=Decimal('250'), status=status,
+            )
+
+    def download(self, output):
+        response = self.client.post(reverse('core:bulk_invoices'), {
+            'month': '2025-11-15', 'status': 'pending', 'course': self.course.pk, 'output': output,
+        })
+        job = Job.objects.get(kind='bulk_invoices')
+        self.assertRedirects(response, reverse('core:job_detail', args=[job.pk]), fetch_redirect_response=False)
+        jobs.work(once=True)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'succeeded', job.error)
+        return b''.join(self.client.get(job.result['url']).streaming_content)
+
+    def test_zip_has_one_invoice_per_matching_payment(self):
+        archive = zipfile.ZipFile(BytesIO(self.download('zip')))
+        expected = Payment.objects.filter(student__last_name__in=['Alaoui', 'Zahra']).order_by('student__last_name')
+        self.assertEqual(archive.namelist(), [f'invoice_{payment.pk}.pdf' for payment in expected])
+        self.assertTrue(archive.read(archive.namelist()[0]).startswith(b'%PDF'))
+
+    def test_single_pdf_has_a_page_per_invoice(self):
+        pdf = self.download('pdf')
+        self.assertEqual(len(re.findall(rb'/Type /Page\b(?!s)', pdf)), 2)
+
+
+class BillingTests(TestCase):
+    def setUp(self):
+        self.month = date(2025, 11, 1)
+        instructor = Instructor.objects.create(first_name='Omar', last_name='Idrissi', email='omar@example.com', specialization='Maths')
+        course = Course.objects.create(name='Maths', course_type='tutoring', subject='math', monthly_fee=Decimal('250'))
+        course.instructors.add(instructor)
+        for name in ['Sara', 'Adam']:
+            student = Student.objects.create(first_name=name, last_name='Bennani', email=f'{name.lower()}@example.com')
+            Enrollment.objects.create(student=student, course=course)
+
+    def test_plan_amounts(self):
+        plan = billing.plan_monthly_payments(self.month)
+        self.assertEqual([payment.amount for payment in plan.student_payments], [Decimal('250')] * 2)
+        self.assertEqual([payment.amount for payment in plan.instructor_payments], [Decimal('200')])
+
+    def test_concurrent_runs_create_each_payment_once(self):
+        first = billing.plan_monthly_payments(self.month)
+        second = billing.plan_monthly_payments(self.month)
+        billing.apply_billing_plan(first)
+        billing.apply_billing_plan(second)
+
+        self.assertEqual(first.created, {'student_fee': 2, 'instructor_payment': 1})
+        self.assertEqual(second.created, {'student_fee': 0, 'instructor_payment': 0})
+        self.assertEqual((second.skipped('student_fee'), second.skipped('instructor_payment')), (2, 1))
+        self.assertEqual(Payment.objects.filter(month=self.month).count(), 3)
+
+        rerun = billing.generate_monthly_payments(self.month)
+        self.assertEqual((rerun.payments, len(rerun.existing), rerun.changed), ([], 3, {}))
+
+    def test_one_payment_per_person_type_and_month(self):
+        billing.generate_monthly_payments(self.month)
+        duplicates = [
+            Payment(student=Student.objects.first(), payment_type='student_fee', month=self.month, amount=Decimal('1')),
+            Payment(instructor=Instructor.objects.get(), payment_type='instructor_payment', month=self.month, amount=Decimal('1')),
+        ]
+        for payment in duplicates:
+            with self.subTest(payment_type=payment.payment_type), self.assertRaises(IntegrityError), transaction.atomic():
+                payment.save()
+
+
+
+class PaymentUniqueMigrationTests(TransactionTestCase):
+    before = [('core', '0003_course_active_enrollment_count')]
+    after = [('core', '0004_payment_unique_per_month')]
+
+    def setUp(self):
+        executor = MigrationExecutor(connection)
+        latest = executor.loader.graph.leaf_nodes('core')
+        executor.migrate(self.before)
+        self.addCleanup(lambda: MigrationExecutor(connection).migrate(latest))
+        apps = executor.loader.project_state(self.before).apps
+        self.Payment = apps.get_model('core', 'Payment')
+        # Cleanups run last-in first-out: clear the duplicates before re-migrating.
+        self.addCleanup(lambda: self.Payment.objects.all().delete())
+        self.student = apps.get_model('core', 'Student').objects.create(
+            first_name='Sara', last_name='Bennani', email='sara@example.com',
+        )
+        self.month = date(2025, 11, 1)
+
+    def duplicate(self, amount_paid=Decimal('0')):
+        return self.Payment.objects.create(
+            student=self.student, payment_type='student_fee', month=self.month,
+            amount=Decimal('250'), amount_paid=amount_paid,
+        )
+
+    def migrate(self):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(self.after)
+
+    def test_unpaid_duplicates_are_dropped(self):
+        self.duplicate()
+        paid = self.duplicate(Decimal('100'))
+        self.duplicate()
+        self.migrate()
+        self.assertEqual(list(self.Payment.objects.values_list('pk', flat=True)), [paid.pk])
+
+    def test_duplicates_with_money_on_two_rows_stop_the_migration(self):
+        first = self.duplicate(Decimal('100'))
+        second = self.duplicate(Decimal('50'))
+        with self.assertRaisesMessage(RuntimeError, f'payments {first.pk}, {second.pk}'):
+            self.migrate()
+        self.assertEqual(self.Payment.objects.count(), 2)
+
+
+class ReportRefreshTests(TestCase):
+    def setUp(self):
+        self.month = date(2025, 11, 1)
+        self.student = Student.objects.create(first_name='Sara', last_name='Bennani', email='sara@example.com')
+        self.report, _ = finance.build_financial_report(self.month)
+
+    def pay_late(self, amount):
+        Payment.objects.create(
+            student=self.student, payment_type='student_fee', month=self.month,
+            amount=amount, amount_paid=amount, status='paid',
+        )
+
+    def test_late_payment_refreshes_report(self):
+        self.pay_late(Decimal('500'))
+        self.assertTrue(DirtyReportMonth.objects.filter(month=self.month).exists())
+        self.assertEqual(Job.objects.filter(kind='refresh_reports', status='queued').count(), 1)
+
+        jobs.work(once=True)
+        self.report.refresh_from_db()
+        self.assertEqual(self.report.total_revenue, Decimal('500'))
+        self.assertEqual(self.report.net_profit, Decimal('500'))
+        self.assertFalse(DirtyReportMonth.objects.exists())
+
+    def test_generated_payments_refresh_report(self):
+        course = Course.objects.create(name='Maths', course_type='tutoring', subject='math', monthly_fee=Decimal('250'))
+        Enrollment.objects.create(student=self.student, course=course)
+        billing.generate_monthly_payments(self.month)
+        self.assertTrue(DirtyReportMonth.objects.filter(month=self.month).exists())
+        self.assertEqual(Job.objects.filter(kind='refresh_reports', status='queued').count(), 1)
+
+    def test_finalized_report_is_left_alone(self):
+        FinancialReport.objects.filter(pk=self.report.pk).update(is_finalized=True)
+        self.pay_late(Decimal('500'))
+        self.assertEqual(finance.refresh_dirty_reports(), (1, 0))
+        self.report.refresh_from_db()
+        self.assertEqual(self.report.total_revenue, Decimal('0'))
+
+
+class FinancialSeriesTests(TestCase):
+    def setUp(self):
+        self.student = Student.objects.create(first_name='Sara', last_name='Bennani', email='sara@example.com')
+
+    def pay(self, month, amount):
+        Payment.objects.create(
+            student=self.student, payment_type='student_fee', month=month,
+            amount=amount, amount_paid=amount, status='paid',
+        )
+
+    def test_quarters_sum_their_months(self):
+        self.pay(date(2025, 1, 1), Decimal('100'))
+        self.pay(date(2025, 3, 1), Decimal('50'))
+        self.pay(date(2025, 4, 1), Decimal('20'))
+        series = finance.financial_series(date(2025, 1, 1), date(2025, 6, 1), 'quarter')
+        self.assertEqual(series['periods'], ['2025-Q1', '2025-Q2'])
+        self.assertEqual(series['revenue'], [150.0, 20.0])
+        self.assertEqual(series['profit'], [150.0, 20.0])
+
+    def test_new_payment_invalidates_cached_series(self):
+        month = date(2025, 1, 1)
+        self.assertEqual(finance.financial_series(month, month)['revenue'], [0.0])
+        self.pay(month, Decimal('75'))
+        self.assertEqual(finance.financial_series(month, month)['revenue'], [75.0])
+
+    def test_version_bumped_elsewhere_reaches_this_process(self):
+        month = date(2025, 1, 1)
+        self.pay(month, Decimal('75'))
+        self.assertEqual(finance.financial_series(month, month)['revenue'], [75.0])
+        # Another process: writes without signals here, bumps the shared version
+        Payment.objects.update(amount_paid=Decimal('90'))
+        CacheVersion.objects.filter(name=finance.SERIES_VERSION).update(version=F('version') + 1)
+        self.assertEqual(finance.financial_series(month, month)['revenue'], [90.0])
+
+    def test_bulk_generated_payments_invalidate_series(self):
+        course = Course.objects.create(name='Maths', course_type='tutoring', subject='math', monthly_fee=Decimal('250'))
+        Enrollment.objects.create(student=self.student, course=course)
+        version = CacheVersion.current(finance.SERIES_VERSION)
+        billing.generate_monthly_payments(date(2025, 1, 1))
+        self.assertGreater(CacheVersion.current(finance.SERIES_VERSION), version)
+
+
+class ProfitDistributionTests(TestCase):
+    def test_largest_remainder_keeps_totals(self):
+        self.assertEqual(finance.allocate(100, [1, 1, 1]), [34, 33, 33])
+        self.assertEqual(finance.allocate(10, [0, 0]), [0, 0])
+
+    def test_distribution_adds_up_to_net_profit(self):
+        for index in range(3):
+            Member.objects.create(
+                first_name='Member', last_name=str(index), email=f'member{index}@example.com',
+                capital_shares=Decimal('100'),
+            )
+        report = FinancialReport.objects.create(month=date(2025, 11, 1), net_profit=Decimal('1000.00'))
+
+        preview = finance.plan_distribution(report)
+        self.assertFalse(report.distributions.exists())
+        self.assertEqual(sum(amount for _, _, amount in preview), Decimal('1000.00'))
+        self.assertEqual(sum(share for _, share, _ in preview), Decimal('100.00'))
+
+        self.assertEqual(finance.distribute_profits(report), 3)
+        amounts = sorted(report.distributions.values_list('amount', flat=True))
+        self.assertEqual(amounts, [Decimal('333.33'), Decimal('333.33'), Decimal('333.34')])
+        report.refresh_from_db()
+        self.assertTrue(report.is_finalized)
+
+    def test_redistribution_keeps_paid_shares_of_departed_members(self):
+        paid, unpaid, staying = [
+            Member.objects.create(
+                first_name='Member', last_name=str(index), email=f'member{index}@example.com',
+                capital_shares=Decimal('100'),
+            )
+            for index in range(3)
+        ]
+        report = FinancialReport.objects.create(month=date(2025, 11, 1), net_profit=Decimal('900.00'))
+        finance.distribute_profits(report)
+        report.distributions.filter(member=paid).update(is_paid=True, payment_date=date(2025, 12, 1))
+        Member.objects.filter(pk__in=[paid.pk, unpaid.pk]).update(is_active=False)
+
+        self.assertEqual(finance.distribute_profits(report), 1)
+        self.assertEqual(
+            dict(report.distributions.values_list('member_id', 'amount')),
+            {paid.pk: Decimal('300.00'), staying.pk: Decimal('900.00')},
+        )
+        self.assertTrue(report.distributions.get(member=paid).is_paid)
+
+
+class PaymentLedgerTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('cashier', role='accountant')
+        student = Student.objects.create(first_name='Sara', last_name='Bennani', email='sara@example.com')
+        self.payment = Payment.objects.create(
+            student=student, payment_type='student_fee', month=date(2025, 11, 1), amount=Decimal('300'),
+        )
+
+    def receipt(self, amount):
+        return {'payment': self.payment.pk, 'amount': Decimal(amount), 'payment_date': date(2025, 11, 5)}
+
+    def test_receipts_accumulate_and_set_status(self):
+        ledger.record_receipts([self.receipt('100')], self.user)
+        self.payment.refresh_from_db()
+        self.assertEqual((self.payment.amount_paid, self.payment.status), (Decimal('100'), 'partial'))
+
+        ledger.record_receipts([self.receipt('120'), self.receipt('80')], self.user)
+        self.payment.refresh_from_db()
+        self.assertEqual((self.payment.amount_paid, self.payment.status), (Decimal('300'), 'paid'))
+        self.assertEqual(self.payment.transactions.count(), 3)
+
+    def test_failing_receipt_records_nothing(self):
+        with self.assertRaises(ledger.ReceiptError) as raised:
+            ledger.record_receipts([self.receipt('200'), {**self.receipt('50'), 'payment': 0}], self.user)
+        self.assertEqual(raised.exception.index, 1)
+        self.assertFalse(PaymentTransaction.objects.exists())
+
+    def test_overpayment_and_notes_are_kept(self):
+        ledger.record_receipts([{**self.receipt('200'), 'notes': 'First half'}, self.receipt('150')], self.user)
+        ledger.record_receipts([{**self.receipt('10'), 'notes': 'Late fee'}], self.user)
+        self.payment.refresh_from_db()
+        self.assertEqual((self.payment.amount_paid, self.payment.status), (Decimal('360'), 'paid'))
+        self.assertEqual(self.payment.notes, 'Late fee')
+
+    def test_reconcile_rebuilds_from_ledger(self):
+        ledger.record_receipts([self.receipt('300')], self.user)
+        Payment.objects.filter(pk=self.payment.pk).update(amount_paid=Decimal('0'), status='pending')
+        self.assertEqual(ledger.reconcile_payments(), 1)
+        self.payment.refresh_from_db()
+        self.assertEqual((self.payment.amount_paid, self.payment.status), (Decimal('300'), 'paid'))
+
+    def test_batch_endpoint(self):
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('core:api_record_payments'), json.dumps({'receipts': [
+            {'payment': self.payment.pk, 'amount_paid': '50', 'payment_date': '2025-11-05', 'method': 'card'},
+        ]}), content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['payments'][0]['remaining'], 250.0)
+
+        response = self.client.post(reverse('core:api_record_payments'), json.dumps({'receipts': [
+            {'payment': self.payment.pk, 'amount_paid': '0', 'payment_date': '2025-11-05'},
+        ]}), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+
+class AttendanceRollupTests(TestCase):
+    def setUp(self):
+        course = Course.objects.create(name='Maths', course_type='tutoring', subject='math', monthly_fee=Decimal('250'))
+        student = Student.objects.create(first_name='Sara', last_name='Bennani', email='sara@example.com')
+        self.enrollment = Enrollment.objects.create(student=student, course=course)
+        self.course = course
+
+    def record(self, *days, status='present'):
+        upsert_attendance(Attendance(enrollment=self.enrollment, date=day, status=status) for day in days)
+
+    def rollup(self, month):
+        return AttendanceMonthlyRollup.objects.get(enrollment=self.enrollment, month=month)
+
+    def test_recording_updates_rollups(self):
+        self.record(date(2025, 10, 28), date(2025, 11, 4), date(2025, 11, 11))
+        self.record(date(2025, 11, 11), status='absent')
+        november = self.rollup(date(2025, 11, 1))
+        self.assertEqual((november.present, november.absent), (1, 1))
+        self.assertEqual(self.rollup(date(2025, 10, 1)).present, 1)
+
+        Attendance.objects.get(date=date(2025, 10, 28)).delete()
+        self.assertFalse(AttendanceMonthlyRollup.objects.filter(month=date(2025, 10, 1)).exists())
+
+    def test_counts_match_raw_attendance(self):
+        self.record(date(2025, 10, 28), date(2025, 11, 4), date(2025, 12, 2))
+        self.record(date(2025, 11, 18), status='excused')
+        for start, end in [
+            (None, None),
+            (date(2025, 10, 29), None),
+            (date(2025, 11, 1), date(2025, 11, 30)),
+            (date(2025, 10, 15), date(2025, 12, 1)),
+            (date(2025, 11, 5), date(2025, 11, 20)),
+        ]:
+            with self.subTest(start=start, end=end):
+                raw = Attendance.objects.all()
+                if start:
+                    raw = raw.filter(date__gte=start)
+                if end:
+                    raw = raw.filter(date__lte=end)
+                expected = {status: raw.filter(status=status).count() for status in ['present', 'absent', 'excused']}
+                self.assertEqual(attendance_counts(start, end, self.course.pk), expected)
+
+    def test_matrix_pivots_month_in_constant_queries(self):
+        other = Student.objects.create(first_name='Adam', last_name='Alami', email='adam@example.com')
+        left = Enrollment.objects.create(student=other, course=self.course)
+        upsert_attendance([Attendance(enrollment=left, date=date(2025, 11, 11), status='excused')])
+        left.is_active = False
+        left.save()
+        self.record(date(2025, 11, 4), date(2025, 12, 2))
+        self.record(date(2025, 11, 11), status='absent')
+
+        with self.assertNumQueries(3):
+            matrix = attendance_matrix(self.course, date(2025, 11, 20))
+        self.assertEqual(matrix.dates, [date(2025, 11, 4), date(2025, 11, 11)])
+        rows = [(last_name, list(codes), totals) for last_name, _, codes, totals in matrix.rows()]
+        self.assertEqual(rows, [
+            ('Alami', [0, STATUS_CODES['excused']], {'present': 0, 'absent': 0, 'excused': 1}),
+            ('Bennani', [STATUS_CODES['present'], STATUS_CODES['absent']], {'present': 1, 'absent': 1, 'excused': 0}),
+        ])
+        self.assertEqual(matrix.date_totals(), [1, 0])
+
+
+class AttendanceArchiveTests(TestCase):
+    def setUp(self):
+        self.course = Course.objects.create(name='Maths', course_type='tutoring', subject='math', monthly_fee=Decimal('250'))
+        student = Student.objects.create(first_name='Sara', last_name='Bennani', email='sara@example.com')
+        self.enrollment = Enrollment.objects.create(student=student, course=self.course)
+        upsert_attendance(
+            Attendance(enrollment=self.enrollment, date=day, status=status)
+            for day, status in [
+                (date(2025, 10, 7), 'present'), (date(2025, 10, 14), 'absent'),
+                (date(2025, 11, 4), 'present'), (date(2025, 11, 18), 'excused'),
+            ]
+        )
+
+    def rollups(self):
+        return list(AttendanceMonthlyRollup.objects.order_by('month').values_list('month', 'present', 'absent', 'excused'))
+
+    def test_archiving_keeps_rollups_and_reports(self):
+        rollups = self.rollups()
+        self.assertEqual(archive_attendance(date(2025, 11, 1), batch_size=1), 2)
+        self.assertEqual(list(Attendance.objects.values_list('date', flat=True).order_by('date')), [date(2025, 11, 4), date(2025, 11, 18)])
+        self.assertEqual(AttendanceArchive.objects.count(), 2)
+        self.assertEqual(self.rollups(), rollups)
+        AttendanceMonthlyRollup.refresh()
+        self.assertEqual(self.rollups(), rollups)
+
+        self.assertEqual(attendance_counts(date(2025, 10, 10), date(2025, 11, 10)), {'present': 1, 'absent': 1, 'excused': 0})
+        self.assertEqual(len(attendance_tiers(date(2025, 11, 1))), 1)
+        self.assertEqual(len(attendance_matrix(self.course, date(2025, 10, 1)).dates), 2)
+
+        # Recorded again after archiving: the live row replaces the archived one
+        upsert_attendance([Attendance(enrollment=self.enrollment, date=date(2025, 10, 14), status='present')])
+        archive_attendance(date(2025, 11, 1))
+        self.assertEqual(AttendanceArchive.objects.get(date=date(2025, 10, 14)).status, 'present')
+        self.assertEqual(self.rollups()[0], (date(2025, 10, 1), 2, 0, 0))
+
+    def test_recording_an_archived_day_replaces_it(self):
+        archive_attendance(date(2025, 11, 1))
+        upsert_attendance([Attendance(enrollment=self.enrollment, date=date(2025, 10, 7), status='absent')])
+        Attendance.objects.create(enrollment=self.enrollment, date=date(2025, 10, 14), status='excused')
+
+        self.assertFalse(AttendanceArchive.objects.exists())
+        self.assertEqual(self.rollups()[0], (date(2025, 10, 1), 0, 1, 1))
+        self.assertEqual(attendance_counts(date(2025, 10, 1), date(2025, 10, 20)), {'present': 0, 'absent': 1, 'excused': 1})
+        self.assertEqual(attendance_counts(date(2025, 10, 7), date(2025, 10, 7)), {'present': 0, 'absent': 1, 'excused': 0})
+
+    def test_report_reads_archive_only_when_needed(self):
+        archive_attendance(date(2025, 11, 1))
+        self.client.force_login(User.objects.create_user('staff', role='staff'))
+        response = self.client.get(reverse('core:attendance_report'), {'start_date': '2025-11-01'})
+        self.assertEqual(len(response.context['attendances']), 2)
+        response = self.client.get(reverse('core:attendance_report'), {'export': 'csv'})
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual([line.split(',')[0] for line in lines[1:]], ['2025-10-07', '2025-10-14', '2025-11-04', '2025-11-18'])
+
+    def test_report_preview_merges_tiers_newest_first(self):
+        archive_attendance(date(2025, 11, 5))
+        upsert_attendance([Attendance(enrollment=self.enrollment, date=date(2025, 10, 7), status='absent')])
+        self.client.force_login(User.objects.create_user('staff', role='staff'))
+        response = self.client.get(reverse('core:attendance_report'))
+        self.assertEqual(
+            [(type(row), row.date) for row in response.context['attendances']],
+            [(Attendance, date(2025, 11, 18)), (AttendanceArchive, date(2025, 11, 4)),
+             (AttendanceArchive, date(2025, 10, 14)), (Attendance, date(2025, 10, 7))],
+        )
+
+
+class AttendanceRecordTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('recorder', role='admin'))
+        self.course = Course.objects.create(name='Maths', course_type='tutoring', subject='math', monthly_fee=Decimal('250'))
+        self.enrollments = [
+            Enrollment.objects.create(
+                student=Student.objects.create(first_name=name, last_name='Bennani', email=f'{name.lower()}@example.com'),
+                course=self.course,
+            )
+            for name in ['Sara', 'Adam']
+        ]
+
+    def post(self, *statuses, dates=(date(2025, 11, 4),)):
+        data = {'course': self.course.pk, 'date': dates[0].isoformat(), 'extra_dates': ','.join(d.isoformat() for d in dates[1:])}
+        for enrollment, status in zip(self.enrollments, statuses):
+            data[f'status_{enrollment.pk}'] = status
+        return self.client.post(reverse('core:attendance_record'), data)
+
+    def test_rerecording_updates_marks_in_place(self):
+        self.post('present', 'present', dates=(date(2025, 11, 4), date(2025, 11, 5)))
+        self.post('absent', 'excused')
+        self.assertEqual(Attendance.objects.count(), 4)
+        marks = dict(Attendance.objects.filter(date=date(2025, 11, 4)).values_list('enrollment_id', 'status'))
+        self.assertEqual(marks, {self.enrollments[0].pk: 'absent', self.enrollments[1].pk: 'excused'})
+
+    def test_unknown_status_rejects_the_submission(self):
+        response = self.post('present', 'late')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Unknown attendance status: late', response.context['form'].non_field_errors()[0])
+        self.assertFalse(Attendance.objects.exists())
+
+
+class AttendanceSyncTests(TestCase):
+    def setUp(self):
+        instructor = Instructor.objects.create(first_name='Omar', last_name='Idrissi', email='omar@example.com', specialization='Maths')
+        self.user = User.objects.create_user('omar', role='instructor', instructor_profile=instructor)
+        self.course = Course.objects.create(name='Maths', course_type='tutoring', subject='math', monthly_fee=Decimal('250'))
+        self.course.instructors.add(instructor)
+        self.other_course = Course.objects.create(name='Physics', course_type='tutoring', subject='physics', monthly_fee=Decimal('250'))
+        self.student = Student.objects.create(first_name='Sara', last_name='Bennani', email='sara@example.com')
+        self.enrollment = Enrollment.objects.create(student=self.student, course=self.course)
+        self.client.force_login(self.user)
+
+    def sync(self, key, marks):
+        return self.client.post(
+            reverse('core:api_sync_attendance'), json.dumps({'key': key, 'marks': marks}), content_type='application/json'
+        )
+
+    def mark(self, day, status='present', course=None, **extra):
+        return {'course': (course or self.course).pk, 'student': self.student.pk, 'date': day, 'status': status, **extra}
+
+    def test_batch_applies_valid_marks_once(self):
+        Attendance.objects.create(enrollment=self.enrollment, date=date(2025, 11, 4), status='absent', notes='Sick')
+        marks = [
+            self.mark('2025-11-04'),
+            self.mark('2025-11-11', 'absent', notes='Late bus'),
+            self.mark('2025-11-11', course=self.other_course),
+            self.mark('2025-11-18', 'asleep'),
+        ]
+        response = self.sync('tablet-1', marks)
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual((body['applied'], body['rejected'], body['replayed']), (2, 2, False))
+        self.assertEqual([result['status'] for result in body['results']], ['applied', 'applied', 'rejected', 'rejected'])
+
+        records = {record.date.day: (record.status, record.notes) for record in Attendance.objects.all()}
+        self.assertEqual(records, {4: ('present', 'Sick'), 11: ('absent', 'Late bus')})
+        self.assertEqual(AttendanceMonthlyRollup.objects.get(month=date(2025, 11, 1)).present, 1)
+
+        Attendance.objects.filter(date=date(2025, 11, 4)).update(status='excused')
+        replay = self.sync('tablet-1', marks)
+        self.assertEqual(replay.json()['results'], body['results'])
+        self.assertTrue(replay.json()['replayed'])
+        self.assertEqual(Attendance.objects.get(date=date(2025, 11, 4)).status, 'excused')
+
+        self.assertEqual(self.sync('tablet-1', marks[:1]).status_code, 409)
+
+    def test_instructor_may_sync_courses_they_do_not_teach(self):
+        # The same rule as attendance_record: the role decides, not the course
+        Enrollment.objects.create(student=self.student, course=self.other_course)
+        body = self.sync('tablet-1', [self.mark('2025-11-11', course=self.other_course)]).json()
+        self.assertEqual(body['applied'], 1)
+        self.assertTrue(Attendance.objects.filter(enrollment__course=self.other_course).exists())
+
+
+class AuditLogViewTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user('auditor', role='admin')
+        self.clerk = User.objects.create_user('clerk', role='staff')
+        self.client.force_login(self.admin)
+        for user, day in [(self.admin, 3), (self.clerk, 3), (self.clerk, 4)]:
+            log = AuditLog.objects.create(user=user, action='update', model_name='Payment', description=f'{user.username} {day}')
+            AuditLog.objects.filter(pk=log.pk).update(timestamp=timezone.make_aware(datetime(2025, 11, day, 12)))
+
+    def logs(self, **params):
+        response = self.client.get(reverse('core:audit_log'), {'model': 'Payment', **params})
+        self.assertEqual(response.status_code, 200)
+        return sorted(log.description for log in response.context['audit_logs'])
+
+    def test_filters_by_user_and_date(self):
+        self.assertEqual(self.logs(user=self.clerk.pk), ['clerk 3', 'clerk 4'])
+        self.assertEqual(self.logs(date='2025-11-03'), ['auditor 3', 'clerk 3'])
+        self.assertEqual(self.logs(user=self.clerk.pk, date='2025-11-04'), ['clerk 4'])
+
+    def test_malformed_filters_redirect_with_message(self):
+        for params in [{'user': 'abc'}, {'date': 'bad'}]:
+            with self.subTest(params=params):
+                response = self.client.get(reverse('core:audit_log'), params)
+                self.assertRedirects(response, reverse('core:audit_log'))
@@ -5,6 +5,7 @@ app_name = 'core'
 
 urlpatterns = [
     path('', views.dashboard, name='dashboard'),
+    path('metrics', views.metrics, name='metrics'),
 
     # Authentication
     path('login/', views.user_login, name='login'),
@@ -37,6 +38,9 @@ urlpatterns = [
     # API Endpoints (NEW)
     path('api/financial-summary/', views.api_financial_summary, name='api_financial_summary'),
     path('api/enrollment-stats/', views.api_enrollment_stats, name='api_enrollment_stats'),
+    path('api/financial-series/', views.api_financial_series, name='api_financial_series'),
+    path('api/payments/receipts/', views.api_record_payments, name='api_record_payments'),
+    path('api/attendance/sync/', views.api_sync_attendance, name='api_sync_attendance'),
     
     path('students/', views.student_list, name='student_list'),
     path('students/add/', views.student_create, name='student_create'),
@@ -63,6 +67,7 @@ urlpatterns = [
     path('attendance/', views.attendance_list, name='attendance_list'),
     path('attendance/record/', views.attendance_record, name='attendance_record'),
     path('attendance/report/', views.attendance_report, name='attendance_report'),
+    path('attendance/matrix/', views.attendance_matrix, name='attendance_matrix'),
     
     path('payments/', views.payment_list, name='payment_list'),
     path('payments/student/', views.student_payment_list, name='student_payment_list'),
@@ -82,6 +87,11 @@ urlpatterns = [
     path('financial/distribute/<int:pk>/', views.distribute_profits, name='distribute_profits'),
     
     path('pdf/invoice/<int:payment_pk>/', views.generate_invoice_pdf, name='generate_invoice_pdf'),
+    path('pdf/invoices/', views.bulk_invoices, name='bulk_invoices'),
     path('pdf/contract/<int:instructor_pk>/', views.generate_contract_pdf, name='generate_contract_pdf'),
     path('pdf/report/<int:report_pk>/', views.generate_report_pdf, name='generate_report_pdf'),
+    
+    path('jobs/<int:pk>/', views.job_detail, name='job_detail'),
+    path('jobs/<int:pk>/status/', views.job_status, name='job_status'),
+    path('jobs/<int:pk>/download/', views.job_download, name='job_download'),
 ]
@@ -0,0 +1,10 @@
+from datetime import date
+
+
+def parse_month(value):
+    """Parse a ``YYYY-MM`` (or ``YYYY-MM-DD``) string into the first day of that month."""
+    try:
+        year, month_num = value.split('-')[:2]
+        return date(int(year), int(month_num), 1)
+    except (AttributeError, ValueError):
+        raise ValueError(f'Invalid month "{value}". Use the YYYY-MM format.')
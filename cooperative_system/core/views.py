@@ -1,7 +1,15 @@
+import json
+from heapq import merge
+from itertools import islice
+from operator import attrgetter
+
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib import messages
-from django.db.models import Sum, Count, Q
-from django.http import HttpResponse
+from django.db.models import Sum, Count, Q, F, Max
+from django.http import HttpResponse, FileResponse, Http404
+from django.views.decorators.http import require_POST
+from django.conf import settings
+from pathlib import Path
 from django.utils import timezone
 from datetime import date, timedelta
 from decimal import Decimal
@@ -9,14 +17,29 @@ from dateutil.relativedelta import relativedelta
 
 from .models import (
     Student, Instructor, Course, Enrollment, Attendance,
-    Payment, Member, InstructorHours, FinancialReport, ProfitDistribution
+    Payment, Member, FinancialReport, ProfitDistribution
 )
 from .forms import (
     StudentForm, InstructorForm, CourseForm, EnrollmentForm,
-    AttendanceForm, BulkAttendanceForm, PaymentRecordForm,
-    MemberForm, InstructorHoursForm, GeneratePaymentsForm
+    AttendanceForm, BulkAttendanceForm, PaymentRecordForm, PaymentReceiptForm,
+    MemberForm, InstructorHoursForm, GeneratePaymentsForm, BulkInvoiceForm
+)
+from .pdf_generator import invoice_data, contract_data, report_data, generate_attendance_matrix
+from .pdf_cache import serve_pdf
+from . import finance, jobs, ledger
+from .utils import parse_month
+from .attendance import (
+    attendance_counts, attendance_matrix as build_attendance_matrix, attendance_tiers, upsert_attendance, sync_attendance,
+    SyncKeyConflict, MAX_SYNC_MARKS,
+    VALID_STATUSES as VALID_ATTENDANCE_STATUSES
+)
+from .attendance_codes import STATUS_LETTERS as ATTENDANCE_LETTERS
+from .pagination import keyset_paginate
+from .metrics import render_prometheus
+from .exports import (
+    wants_csv, export_queryset_csv, export_merged_csv, stream_csv,
+    PAYMENT_EXPORT_COLUMNS, ATTENDANCE_EXPORT_COLUMNS, EXPENSE_EXPORT_COLUMNS
 )
-from .pdf_generator import generate_invoice, generate_contract, generate_financial_report
 
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib import messages
@@ -30,7 +53,7 @@ from collections import defaultdict
 
 from .models import (
     Student, Instructor, Course, Enrollment, Attendance,
-    Payment, Member, InstructorHours, FinancialReport, ProfitDistribution
+    Payment, Member, FinancialReport, ProfitDistribution
 )
 
 from django.shortcuts import render, redirect, get_object_or_404
@@ -43,7 +66,7 @@ from datetime import date, timedelta
 from decimal import Decimal
 from functools import wraps
 
-from .models import User, Expense, ExpenseCategory, RecurringExpense, AuditLog
+from .models import User, Expense, ExpenseCategory, RecurringExpense, AuditLog, MonthlyKpiSnapshot, Job
 
 from .decorators import (
     admin_required,
@@ -74,55 +97,12 @@ def generate_financial_report(request):
         else:
             month = date.today().replace(day=1)
         
-        # Calculate total revenue from paid student fees
-        total_revenue = Payment.objects.filter(
-            payment_type='student_fee',
-            month=month,
-            status='paid'
-        ).aggregate(total=Sum('amount_paid'))['total'] or Decimal('0')
-        
-        # Calculate total instructor payments
-        total_instructor = Payment.objects.filter(
-            payment_type='instructor_payment',
-            month=month,
-            status='paid'
-        ).aggregate(total=Sum('amount_paid'))['total'] or Decimal('0')
-        
-        # Calculate total operational expenses (NEW)
-        total_expenses = Expense.objects.filter(
-            month=month,
-            status='paid'
-        ).aggregate(total=Sum('amount'))['total'] or Decimal('0')
-        
-        # Calculate profits
-        gross_profit = total_revenue - total_instructor
-        net_profit = gross_profit - total_expenses  # Now includes expenses
-        
-        # Create or update the financial report
-        report, created = FinancialReport.objects.update_or_create(
-            month=month,
-            defaults={
-                'total_revenue': total_revenue,
-                'total_instructor_payments': total_instructor,
-                'total_expenses': total_expenses,  # Now properly set
-                'gross_profit': gross_profit,
-                'net_profit': net_profit,
-            }
-        )
-        
-        # Log the action
-        AuditLog.objects.create(
-            user=request.user,
-            action='create' if created else 'update',
-            model_name='FinancialReport',
-            object_id=report.pk,
-            description=f'{"Generated" if created else "Updated"} financial report for {month.strftime("%B %Y")}',
-            ip_address=request.META.get('REMOTE_ADDR')
-        )
-        
-        action = 'generated' if created else 'updated'
-        messages.success(request, f'Financial report for {month.strftime("%B %Y")} {action}. Total expenses: {total_expenses} DH included.')
-        return redirect('core:financial_report_detail', pk=report.pk)
+        job = jobs.enqueue('financial_report', {
+            'month': month.isoformat(),
+            'ip_address': request.META.get('REMOTE_ADDR'),
+        }, request.user)
+        messages.info(request, f'Financial report for {month.strftime("%B %Y")} queued.')
+        return redirect('core:job_detail', pk=job.pk)
     
     return render(request, 'core/generate_financial_report.html')
 
@@ -164,33 +144,25 @@ def financial_overview(request):
     
     today = date.today()
     first_of_month = today.replace(day=1)
+    kpi = MonthlyKpiSnapshot.for_month(first_of_month)
     
     # Current month revenue
-    current_revenue = Payment.objects.filter(
-        payment_type='student_fee',
-        month=first_of_month
-    ).aggregate(
-        total=Sum('amount'),
-        paid=Sum('amount_paid')
-    )
+    current_revenue = {
+        'total': kpi.revenue_expected,
+        'paid': kpi.revenue_collected,
+    }
     
     # Current month instructor payments
-    current_expenses = Payment.objects.filter(
-        payment_type='instructor_payment',
-        month=first_of_month
-    ).aggregate(
-        total=Sum('amount'),
-        paid=Sum('amount_paid')
-    )
+    current_expenses = {
+        'total': kpi.instructor_payouts_expected,
+        'paid': kpi.instructor_payouts_disbursed,
+    }
     
     # Current month operational expenses (NEW)
-    current_operational_expenses = Expense.objects.filter(
-        month=first_of_month,
-        status='paid'
-    ).aggregate(total=Sum('amount'))['total'] or Decimal('0')
+    current_operational_expenses = kpi.operational_expenses
     
     # Total expenses = instructor payments + operational expenses
-    total_current_expenses = (current_expenses.get('paid') or Decimal('0')) + current_operational_expenses
+    total_current_expenses = current_expenses['paid'] + current_operational_expenses
     
     # Member capital
     total_capital = Member.objects.filter(is_active=True).aggregate(total=Sum('capital_shares'))['total'] or Decimal('0')
@@ -217,35 +189,22 @@ def dashboard(request):
     total_courses = Course.objects.filter(is_active=True).count()
     total_enrollments = Enrollment.objects.filter(is_active=True).count()
     
-    # Revenue
-    monthly_revenue = Payment.objects.filter(
-        payment_type='student_fee',
-        month=first_of_month,
-        status='paid'
-    ).aggregate(total=Sum('amount_paid'))['total'] or Decimal('0')
+    kpi = MonthlyKpiSnapshot.for_month(first_of_month)
     
-    expected_revenue = Payment.objects.filter(
-        payment_type='student_fee',
-        month=first_of_month
-    ).aggregate(total=Sum('amount'))['total'] or Decimal('0')
+    # Revenue
+    monthly_revenue = kpi.revenue_paid
+    expected_revenue = kpi.revenue_expected
     
-    pending_payments = Payment.objects.filter(
-        payment_type='student_fee',
-        status__in=['pending', 'partial', 'overdue']
-    ).count()
+    # Outstanding student fees across all months
+    pending_payments = MonthlyKpiSnapshot.objects.aggregate(
+        total=Sum('pending_student_payments')
+    )['total'] or 0
     
     # Instructor payments
-    monthly_instructor_payments = Payment.objects.filter(
-        payment_type='instructor_payment',
-        month=first_of_month,
-        status='paid'
-    ).aggregate(total=Sum('amount_paid'))['total'] or Decimal('0')
+    monthly_instructor_payments = kpi.instructor_payouts
     
     # Operational expenses (NEW)
-    monthly_operational_expenses = Expense.objects.filter(
-        month=first_of_month,
-        status='paid'
-    ).aggregate(total=Sum('amount'))['total'] or Decimal('0')
+    monthly_operational_expenses = kpi.operational_expenses
     
     # Total expenses = instructor payments + operational expenses
     monthly_expenses = monthly_instructor_payments + monthly_operational_expenses
@@ -259,7 +218,7 @@ def dashboard(request):
     
     # Top courses
     top_courses = []
-    for course in Course.objects.filter(is_active=True):
+    for course in Course.objects.filter(is_active=True).order_by('-active_enrollment_count', 'name')[:5]:
         top_courses.append({
             'name': course.name,
             'enrolled_count': course.enrolled_count,
@@ -268,8 +227,6 @@ def dashboard(request):
             'course_type': course.get_course_type_display(),
             'pk': course.pk
         })
-    top_courses.sort(key=lambda x: x['enrolled_count'], reverse=True)
-    top_courses = top_courses[:5]
     
     context = {
         'total_students': total_students,
@@ -458,7 +415,8 @@ def student_list(request):
             Q(last_name__icontains=search) |
             Q(email__icontains=search)
         )
-    return render(request, 'core/student_list.html', {'students': students, 'search': search})
+    page = keyset_paginate(request, students, ['last_name', 'first_name', 'pk'])
+    return render(request, 'core/student_list.html', {'students': page, 'page': page, 'search': search})
 
 
 @login_required
@@ -529,7 +487,7 @@ def instructor_list(request):
 @login_required
 def instructor_detail(request, pk):
     instructor = get_object_or_404(Instructor, pk=pk)
-    courses = instructor.courses.all()
+    courses = instructor.courses.with_enrollment_stats()
     payments = instructor.payments.all()[:10]
     hours = instructor.hours.all()[:10]
     return render(request, 'core/instructor_detail.html', {
@@ -582,15 +540,17 @@ def instructor_delete(request, pk):
 
 @login_required
 def course_list(request):
-    courses = Course.objects.all()
+    courses = Course.objects.with_enrollment_stats()
     course_type = request.GET.get('type', '')
     subject = request.GET.get('subject', '')
     if course_type:
         courses = courses.filter(course_type=course_type)
     if subject:
         courses = courses.filter(subject=subject)
+    page = keyset_paginate(request, courses, ['name', 'pk'])
     return render(request, 'core/course_list.html', {
-        'courses': courses,
+        'courses': page,
+        'page': page,
         'course_type': course_type,
         'subject': subject,
         'course_types': Course.COURSE_TYPE_CHOICES,
@@ -599,7 +559,7 @@ def course_list(request):
 
 @login_required
 def course_detail(request, pk):
-    course = get_object_or_404(Course, pk=pk)
+    course = get_object_or_404(Course.objects.with_enrollment_stats(), pk=pk)
     enrollments = course.enrollments.filter(is_active=True).select_related('student')
     instructors = course.instructors.all()
     return render(request, 'core/course_detail.html', {
@@ -657,8 +617,10 @@ def enrollment_list(request):
     if course_id:
         enrollments = enrollments.filter(course_id=course_id)
     courses = Course.objects.filter(is_active=True)
+    page = keyset_paginate(request, enrollments, ['-enrollment_date', '-pk'])
     return render(request, 'core/enrollment_list.html', {
-        'enrollments': enrollments,
+        'enrollments': page,
+        'page': page,
         'courses': courses,
         'selected_course': course_id
     })
@@ -697,34 +659,72 @@ def attendance_list(request):
 @login_required
 @can_record_attendance
 def attendance_record(request):
+    posted_dates = []
     if request.method == 'POST':
         form = BulkAttendanceForm(request.POST)
         if form.is_valid():
             course = form.cleaned_data['course']
-            att_date = form.cleaned_data['date']
-            enrollments = Enrollment.objects.filter(course=course, is_active=True)
+            dates = form.cleaned_data['dates']
+            multiple = len(dates) > 1
+            enrollment_ids = Enrollment.objects.filter(course=course, is_active=True).values_list('id', flat=True)
+            
+            records = []
+            unknown = set()
+            for enrollment_id in enrollment_ids:
+                for att_date in dates:
+                    status = None
+                    if multiple:
+                        status = request.POST.get(f'status_{enrollment_id}_{att_date.isoformat()}')
+                    status = status or request.POST.get(f'status_{enrollment_id}', 'present')
+                    if status not in VALID_ATTENDANCE_STATUSES:
+                        unknown.add(status)
+                    records.append(Attendance(enrollment_id=enrollment_id, date=att_date, status=status))
             
-            for enrollment in enrollments:
-                status = request.POST.get(f'status_{enrollment.id}', 'present')
-                Attendance.objects.update_or_create(
-                    enrollment=enrollment,
-                    date=att_date,
-                    defaults={'status': status}
-                )
-            messages.success(request, f'Attendance recorded for {course.name} on {att_date}.')
-            return redirect('core:attendance_list')
+            if unknown:
+                form.add_error(None, f'Unknown attendance status: {", ".join(sorted(unknown))}. Nothing was recorded.')
+                posted_dates = dates if multiple else []
+            else:
+                upsert_attendance(records)
+                
+                if multiple:
+                    period = f'{dates[0]} to {dates[-1]} ({len(dates)} dates)'
+                else:
+                    period = f'{dates[0]}'
+                messages.success(request, f'Attendance recorded for {course.name} on {period}.')
+                return redirect('core:attendance_list')
     else:
         form = BulkAttendanceForm()
     
-    course_id = request.GET.get('course')
+    # A rejected submission is shown again for the course and dates it was for
+    course_id = request.GET.get('course') or request.POST.get('course')
     enrollments = []
     if course_id:
         enrollments = Enrollment.objects.filter(course_id=course_id, is_active=True).select_related('student')
     
+    # Week mode: one column per consecutive session date
+    session_dates = posted_dates
+    start = request.GET.get('start')
+    try:
+        days = min(max(int(request.GET.get('days', 1)), 1), BulkAttendanceForm.MAX_DATES)
+    except ValueError:
+        days = 1
+    if posted_dates:
+        start, days = posted_dates[0].isoformat(), len(posted_dates)
+    elif start and days > 1:
+        try:
+            start_date = datetime.strptime(start, '%Y-%m-%d').date()
+            session_dates = [start_date + timedelta(days=offset) for offset in range(days)]
+        except ValueError:
+            session_dates = []
+    
     return render(request, 'core/attendance_record.html', {
         'form': form,
         'enrollments': enrollments,
-        'selected_course': course_id
+        'selected_course': course_id,
+        'session_dates': session_dates,
+        'extra_dates': ','.join(d.isoformat() for d in session_dates[1:]),
+        'start': start,
+        'days': days,
     })
 
 @login_required
@@ -733,21 +733,40 @@ def attendance_report(request):
     start_date = request.GET.get('start_date')
     end_date = request.GET.get('end_date')
     
-    attendances = Attendance.objects.select_related('enrollment__student', 'enrollment__course')
-    
+    try:
+        start = date.fromisoformat(start_date) if start_date else None
+        end = date.fromisoformat(end_date) if end_date else None
+    except ValueError:
+        messages.error(request, 'Dates must use the YYYY-MM-DD format.')
+        return redirect('core:attendance_report')
+    
+    # The archive is only read when the date range reaches back into it
+    tiers = [
+        tier.select_related('enrollment__student', 'enrollment__course')
+        for tier in attendance_tiers(start, end)
+    ]
     if course_id:
-        attendances = attendances.filter(enrollment__course_id=course_id)
-    if start_date:
-        attendances = attendances.filter(date__gte=start_date)
-    if end_date:
-        attendances = attendances.filter(date__lte=end_date)
+        tiers = [tier.filter(enrollment__course_id=course_id) for tier in tiers]
+    
+    if wants_csv(request):
+        return export_merged_csv(
+            tiers, ATTENDANCE_EXPORT_COLUMNS, 'attendance.csv', ['date', 'enrollment__course__name']
+        )
     
     courses = Course.objects.filter(is_active=True)
     
-    stats = attendances.values('status').annotate(count=Count('id'))
+    counts = attendance_counts(start=start, end=end, course_id=course_id)
+    stats = [{'status': status, 'count': count} for status, count in counts.items() if count]
+    
+    # Newest first across both tiers: a day recorded again after archiving
+    # is live while later days may still be archived
+    attendances = list(islice(merge(
+        *[tier.order_by('-date', '-pk')[:200] for tier in tiers],
+        key=attrgetter('date', 'pk'), reverse=True,
+    ), 200))
     
     return render(request, 'core/attendance_report.html', {
-        'attendances': attendances[:200],
+        'attendances': attendances,
         'courses': courses,
         'stats': stats,
         'selected_course': course_id,
@@ -755,6 +774,54 @@ def attendance_report(request):
         'end_date': end_date
     })
 
+@login_required
+def attendance_matrix(request):
+    courses = Course.objects.filter(is_active=True).order_by('name')
+    course_id = request.GET.get('course')
+    if course_id:
+        if not course_id.isdigit():
+            raise Http404('Unknown course')
+        course = get_object_or_404(Course, pk=course_id)
+    else:
+        course = courses.first()
+
+    month_value = request.GET.get('month')
+    if month_value:
+        try:
+            month = parse_month(month_value)
+        except ValueError as exc:
+            messages.error(request, str(exc))
+            return redirect('core:attendance_matrix')
+    else:
+        # Default to the course's latest month with attendance
+        latest = None
+        if course is not None:
+            latest = Attendance.objects.filter(enrollment__course=course).order_by('-date').values_list('date', flat=True).first()
+        month = (latest or date.today()).replace(day=1)
+
+    matrix = build_attendance_matrix(course, month) if course is not None else None
+    export = request.GET.get('export')
+    if matrix is not None and export == 'csv':
+        header = ['Last Name', 'First Name'] + [day.isoformat() for day in matrix.dates] + ['Present', 'Absent', 'Excused']
+        rows = (
+            [last_name, first_name] + [ATTENDANCE_LETTERS[code] for code in codes]
+            + [totals['present'], totals['absent'], totals['excused']]
+            for last_name, first_name, codes, totals in matrix.rows()
+        )
+        return stream_csv(f'attendance_{course.pk}_{month.strftime("%Y_%m")}.csv', header, rows)
+    if matrix is not None and export == 'pdf':
+        return generate_attendance_matrix(matrix)
+
+    return render(request, 'core/attendance_matrix.html', {
+        'courses': courses,
+        'course': course,
+        'month': month,
+        'matrix': matrix,
+        'rows': list(matrix.rows()) if matrix is not None else [],
+        'present_totals': matrix.date_totals() if matrix is not None else [],
+        'colspan': len(matrix.dates) + 4 if matrix is not None else 4,
+    })
+
 @login_required
 @can_view_payments
 def payment_list(request):
@@ -765,17 +832,25 @@ def payment_list(request):
 @login_required
 @can_view_payments
 def student_payment_list(request):
-    payments = Payment.objects.filter(payment_type='student_fee').select_related('student').order_by('-month')
+    payments = Payment.objects.filter(payment_type='student_fee').select_related('student')
     status = request.GET.get('status')
     if status:
         payments = payments.filter(status=status)
-    return render(request, 'core/student_payment_list.html', {'payments': payments, 'selected_status': status})
+    if wants_csv(request):
+        return export_queryset_csv(payments.order_by('-month', '-pk'), PAYMENT_EXPORT_COLUMNS, 'student_payments.csv')
+    page = keyset_paginate(request, payments, ['-month', '-pk'])
+    return render(request, 'core/student_payment_list.html', {
+        'payments': page,
+        'page': page,
+        'selected_status': status
+    })
 
 
 @login_required
 def instructor_payment_list(request):
-    payments = Payment.objects.filter(payment_type='instructor_payment').select_related('instructor').order_by('-month')
-    return render(request, 'core/instructor_payment_list.html', {'payments': payments})
+    payments = Payment.objects.filter(payment_type='instructor_payment').select_related('instructor')
+    page = keyset_paginate(request, payments, ['-month', '-pk'])
+    return render(request, 'core/instructor_payment_list.html', {'payments': page, 'page': page})
 
 
 @login_required
@@ -785,70 +860,9 @@ def generate_monthly_payments(request):
         form = GeneratePaymentsForm(request.POST)
         if form.is_valid():
             month = form.cleaned_data['month'].replace(day=1)
-            
-            created_student_payments = 0
-            for enrollment in Enrollment.objects.filter(is_active=True).select_related('student', 'course'):
-                payment, created = Payment.objects.get_or_create(
-                    student=enrollment.student,
-                    payment_type='student_fee',
-                    month=month,
-                    defaults={
-                        'amount': enrollment.course.monthly_fee,
-                        'status': 'pending'
-                    }
-                )
-                if created:
-                    created_student_payments += 1
-            
-            created_instructor_payments = 0
-            instructor_totals = {}
-            
-            for course in Course.objects.filter(is_active=True).prefetch_related('instructors', 'enrollments'):
-                for instructor in course.instructors.all():
-                    if instructor.pk not in instructor_totals:
-                        instructor_totals[instructor.pk] = {'instructor': instructor, 'amount': Decimal('0')}
-                    
-                    if course.course_type == 'tutoring':
-                        student_count = course.enrollments.filter(is_active=True).count()
-                        amount = Decimal('100') * student_count
-                    else:
-                        hours_record = InstructorHours.objects.filter(
-                            instructor=instructor,
-                            course=course,
-                            month=month
-                        ).first()
-                        
-                        if hours_record:
-                            hours = min(hours_record.hours_worked, 8)
-                        else:
-                            hours = min(course.duration_hours, 8)
-                            InstructorHours.objects.create(
-                                instructor=instructor,
-                                course=course,
-                                month=month,
-                                hours_worked=hours
-                            )
-                        
-                        amount = Decimal('120') * hours
-                    
-                    instructor_totals[instructor.pk]['amount'] += amount
-            
-            for data in instructor_totals.values():
-                if data['amount'] > 0:
-                    payment, created = Payment.objects.get_or_create(
-                        instructor=data['instructor'],
-                        payment_type='instructor_payment',
-                        month=month,
-                        defaults={
-                            'amount': data['amount'],
-                            'status': 'pending'
-                        }
-                    )
-                    if created:
-                        created_instructor_payments += 1
-            
-            messages.success(request, f'Generated {created_student_payments} student payments and {created_instructor_payments} instructor payments for {month.strftime("%B %Y")}.')
-            return redirect('core:payment_list')
+            job = jobs.enqueue('monthly_payments', {'month': month.isoformat()}, request.user)
+            messages.info(request, f'Payment generation for {month.strftime("%B %Y")} queued.')
+            return redirect('core:job_detail', pk=job.pk)
     else:
         form = GeneratePaymentsForm(initial={'month': date.today().replace(day=1)})
     
@@ -858,27 +872,22 @@ def generate_monthly_payments(request):
 @login_required
 @can_manage_payments
 def record_payment(request, pk):
-    payment = get_object_or_404(Payment, pk=pk)
+    payment = get_object_or_404(Payment.objects.select_related('student', 'instructor'), pk=pk)
     if request.method == 'POST':
         form = PaymentRecordForm(request.POST)
         if form.is_valid():
-            payment.amount_paid += form.cleaned_data['amount_paid']
-            payment.payment_date = form.cleaned_data['payment_date']
-            if form.cleaned_data['notes']:
-                payment.notes = form.cleaned_data['notes']
-            
-            if payment.amount_paid >= payment.amount:
-                payment.status = 'paid'
-            elif payment.amount_paid > 0:
-                payment.status = 'partial'
-            
-            payment.save()
-            messages.success(request, f'Payment of {form.cleaned_data["amount_paid"]} DH recorded.')
-            return redirect('core:payment_list')
+            try:
+                ledger.record_receipts([form.receipt(payment.pk)], request.user)
+            except ledger.ReceiptError as exc:
+                form.add_error('amount_paid', str(exc))
+            else:
+                messages.success(request, f'Payment of {form.cleaned_data["amount_paid"]} DH recorded.')
+                return redirect('core:payment_list')
     else:
         form = PaymentRecordForm(initial={'payment_date': date.today()})
     
-    return render(request, 'core/record_payment.html', {'form': form, 'payment': payment})
+    transactions = payment.transactions.select_related('recorded_by')
+    return render(request, 'core/record_payment.html', {'form': form, 'payment': payment, 'transactions': transactions})
 
 
 @login_required
@@ -1000,41 +1009,47 @@ def distribute_profits(request, pk):
     report = get_object_or_404(FinancialReport, pk=pk)
     
     if request.method == 'POST':
-        members = Member.objects.filter(is_active=True)
-        total_shares = members.aggregate(total=Sum('capital_shares'))['total'] or Decimal('1')
-        
-        for member in members:
-            if total_shares > 0:
-                share_pct = (member.capital_shares / total_shares) * 100
-                amount = (member.capital_shares / total_shares) * report.net_profit
-            else:
-                share_pct = Decimal('0')
-                amount = Decimal('0')
-            
-            ProfitDistribution.objects.update_or_create(
-                financial_report=report,
-                member=member,
-                defaults={
-                    'share_percentage': share_pct,
-                    'amount': amount,
-                }
-            )
-        
-        report.is_finalized = True
-        report.save()
-        
-        messages.success(request, f'Profits distributed to {members.count()} members.')
-        return redirect('core:financial_report_detail', pk=pk)
+        job = jobs.enqueue('distribute_profits', {'report_id': report.pk}, request.user)
+        messages.info(request, f'Profit distribution for {report.month.strftime("%B %Y")} queued.')
+        return redirect('core:job_detail', pk=job.pk)
     
-    return render(request, 'core/distribute_profits.html', {'report': report})
+    # Preview exactly what the job will write
+    preview = finance.plan_distribution(report)
+    return render(request, 'core/distribute_profits.html', {
+        'report': report,
+        'preview': preview,
+        'preview_total': sum((amount for _, _, amount in preview), Decimal('0')),
+    })
 
 
 @login_required
 @manager_required
 def generate_invoice_pdf(request, payment_pk):
-    payment = get_object_or_404(Payment, pk=payment_pk)
-    response = generate_invoice(payment)
-    return response
+    payment = get_object_or_404(Payment.objects.select_related('student'), pk=payment_pk)
+    return serve_pdf(
+        request, 'invoice', payment.pk,
+        [payment.updated_at, payment.student.updated_at if payment.student else None],
+        lambda: invoice_data(payment), f'invoice_{payment.pk}.pdf'
+    )
+
+
+@login_required
+@manager_required
+def bulk_invoices(request):
+    form = BulkInvoiceForm(request.POST or None)
+    if form.is_valid():
+        month = form.cleaned_data['month'].replace(day=1)
+        course = form.cleaned_data['course']
+        job = jobs.enqueue('bulk_invoices', {
+            'month': month.isoformat(),
+            'status': form.cleaned_data['status'],
+            'course_id': course.pk if course else None,
+            'output': form.cleaned_data['output'],
+        }, request.user)
+        messages.info(request, f'Invoices for {month.strftime("%B %Y")} queued.')
+        return redirect('core:job_detail', pk=job.pk)
+    
+    return render(request, 'core/bulk_invoices.html', {'form': form})
 
 
 @login_required
@@ -1045,16 +1060,26 @@ def generate_contract_pdf(request, instructor_pk):
     course = None
     if course_id:
         course = get_object_or_404(Course, pk=course_id)
-    response = generate_contract(instructor, course)
-    return response
+    return serve_pdf(
+        request, 'contract', instructor.pk,
+        [instructor.updated_at, course.updated_at if course else None],
+        lambda: contract_data(instructor, course), f'contract_{instructor.pk}.pdf'
+    )
 
 
 @login_required
 @can_view_financials
 def generate_report_pdf(request, report_pk):
     report = get_object_or_404(FinancialReport, pk=report_pk)
-    response = generate_financial_report(report)
-    return response
+    # One aggregate stands in for the distribution rows: any added, removed
+    # or edited row, or a renamed member, changes it
+    distributions = report.distributions.aggregate(
+        count=Count('pk'), updated=Max('updated_at'), members_updated=Max('member__updated_at')
+    )
+    return serve_pdf(
+        request, 'financial_report', report.pk, [report.updated_at, distributions],
+        lambda: report_data(report), f'financial_report_{report.month.strftime("%Y_%m")}.pdf'
+    )
 
 # Enhanced views.py with Intelligence & Automation Features
 # Add these new views to your existing core/views.py file
@@ -1095,8 +1120,11 @@ def detect_instructor_conflicts():
     conflicts = []
     
     # Check if instructors are assigned to too many courses
-    for instructor in Instructor.objects.filter(is_active=True):
-        course_count = instructor.courses.filter(is_active=True).count()
+    instructors = Instructor.objects.filter(is_active=True).annotate(
+        active_course_count=Count('courses', filter=Q(courses__is_active=True))
+    )
+    for instructor in instructors:
+        course_count = instructor.active_course_count
         if course_count > 5:  # Threshold for too many courses
             conflicts.append({
                 'type': 'workload',
@@ -1121,16 +1149,18 @@ def detect_instructor_conflicts():
         })
     
     # Check for overfilled courses
-    overfilled_courses = Course.objects.filter(is_active=True)
+    overfilled_courses = Course.objects.filter(
+        is_active=True,
+        active_enrollment_count__gte=F('enrollment_limit')
+    )
     for course in overfilled_courses:
-        if course.enrolled_count >= course.enrollment_limit:
-            conflicts.append({
-                'type': 'capacity',
-                'severity': 'medium',
-                'course': course,
-                'message': f'{course.name} is at full capacity ({course.enrolled_count}/{course.enrollment_limit})',
-                'recommendation': 'Consider opening a new section or increasing capacity'
-            })
+        conflicts.append({
+            'type': 'capacity',
+            'severity': 'medium',
+            'course': course,
+            'message': f'{course.name} is at full capacity ({course.enrolled_count}/{course.enrollment_limit})',
+            'recommendation': 'Consider opening a new section or increasing capacity'
+        })
     
     return conflicts
 
@@ -1176,20 +1206,11 @@ def detect_instructor_conflicts():
 def generate_schedule_suggestions():
     suggestions = []
     
-    # FIX: Use property instead of annotation
-    popular_courses = Course.objects.filter(is_active=True)
-    course_list = []
-    for course in popular_courses:
-        course_list.append({
-            'course': course,
-            'count': course.enrolled_count
-        })
-    course_list.sort(key=lambda x: x['count'], reverse=True)
-    popular_subjects = course_list[:3]
+    courses = list(Course.objects.filter(is_active=True).with_enrollment_stats())
+    popular_courses = sorted(courses, key=lambda course: course.enrolled_count, reverse=True)[:3]
     
-    for item in popular_subjects:
-        course = item['course']
-        count = item['count']
+    for course in popular_courses:
+        count = course.enrolled_count
         if count >= course.enrollment_limit * 0.8:
             suggestions.append({
                 'type': 'expansion',
@@ -1200,7 +1221,7 @@ def generate_schedule_suggestions():
             })
     
     # Underperforming courses
-    for course in Course.objects.filter(is_active=True):
+    for course in courses:
         if course.enrolled_count < 5:
             suggestions.append({
                 'type': 'optimization',
@@ -1342,12 +1363,11 @@ def calculate_scenario_costs(student_count):
 def analyze_course_performance():
     recommendations = []
     
-    # FIX: Use different annotation name
-    courses = Course.objects.filter(is_active=True)
+    courses = Course.objects.filter(is_active=True).with_enrollment_stats()
     
     for course in courses:
-        enrollment_count = course.enrolled_count  # Use the property
-        revenue = course.monthly_fee * enrollment_count
+        enrollment_count = course.enrolled_count
+        revenue = course.monthly_revenue
         
         if course.course_type == 'tutoring':
             cost = Decimal('100') * enrollment_count
@@ -1459,24 +1479,14 @@ def comprehensive_report(request):
         registration_date__gte=first_of_month
     ).count()
     
-    # Revenue metrics
-    current_month_revenue = Payment.objects.filter(
-        payment_type='student_fee',
-        month=first_of_month,
-        status='paid'
-    ).aggregate(total=Sum('amount_paid'))['total'] or Decimal('0')
+    kpi = MonthlyKpiSnapshot.for_month(first_of_month)
     
-    expected_revenue = Payment.objects.filter(
-        payment_type='student_fee',
-        month=first_of_month
-    ).aggregate(total=Sum('amount'))['total'] or Decimal('0')
+    # Revenue metrics
+    current_month_revenue = kpi.revenue_paid
+    expected_revenue = kpi.revenue_expected
     
     # Expense metrics
-    instructor_payments = Payment.objects.filter(
-        payment_type='instructor_payment',
-        month=first_of_month,
-        status='paid'
-    ).aggregate(total=Sum('amount_paid'))['total'] or Decimal('0')
+    instructor_payments = kpi.instructor_payouts
     
     # Enrollment metrics
     enrollment_by_subject = Course.objects.filter(is_active=True).values(
@@ -1492,15 +1502,9 @@ def comprehensive_report(request):
     )
     
     # Attendance metrics
-    this_month_attendance = Attendance.objects.filter(
-        date__gte=first_of_month
-    ).values('status').annotate(count=Count('id'))
-    
-    attendance_rate = 0
-    if this_month_attendance:
-        total = sum(item['count'] for item in this_month_attendance)
-        present = next((item['count'] for item in this_month_attendance if item['status'] == 'present'), 0)
-        attendance_rate = (present / total * 100) if total > 0 else 0
+    this_month_attendance = attendance_counts(start=first_of_month)
+    total = sum(this_month_attendance.values())
+    attendance_rate = (this_month_attendance['present'] / total * 100) if total > 0 else 0
     
     # Financial health indicators
     profit_margin = ((current_month_revenue - instructor_payments) / current_month_revenue * 100) if current_month_revenue > 0 else 0
@@ -1534,18 +1538,10 @@ def api_financial_summary(request):
     """
     today = date.today()
     first_of_month = today.replace(day=1)
+    kpi = MonthlyKpiSnapshot.for_month(first_of_month)
     
-    revenue = Payment.objects.filter(
-        payment_type='student_fee',
-        month=first_of_month,
-        status='paid'
-    ).aggregate(total=Sum('amount_paid'))['total'] or Decimal('0')
-    
-    expenses = Payment.objects.filter(
-        payment_type='instructor_payment',
-        month=first_of_month,
-        status='paid'
-    ).aggregate(total=Sum('amount_paid'))['total'] or Decimal('0')
+    revenue = kpi.revenue_paid
+    expenses = kpi.instructor_payouts
     
     data = {
         'month': first_of_month.strftime('%Y-%m'),
@@ -1589,6 +1585,115 @@ def api_enrollment_stats(request):
     
     return JsonResponse(stats)
 
+
+@login_required
+@can_view_financials
+def api_financial_series(request):
+    """
+    JSON time series of revenue, instructor payouts, expenses and profit.
+
+    ``from`` and ``to`` are YYYY-MM months (default: the last 12 months) and
+    ``granularity`` is month, quarter or year. Values are returned as parallel
+    lists aligned with ``periods``.
+    """
+    granularity = request.GET.get('granularity', 'month')
+    if granularity not in finance.SERIES_GRANULARITIES:
+        return JsonResponse({'error': 'granularity must be month, quarter or year.'}, status=400)
+    try:
+        end = parse_month(request.GET['to']) if request.GET.get('to') else date.today().replace(day=1)
+        start = parse_month(request.GET['from']) if request.GET.get('from') else end - relativedelta(months=11)
+    except ValueError as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+    if start > end:
+        return JsonResponse({'error': '"from" must not be after "to".'}, status=400)
+    months = (end.year - start.year) * 12 + end.month - start.month + 1
+    if months > finance.SERIES_MAX_PERIODS:
+        return JsonResponse({'error': f'At most {finance.SERIES_MAX_PERIODS} months per request.'}, status=400)
+
+    return JsonResponse(finance.financial_series(start, end, granularity))
+
+
+@login_required
+@can_manage_payments
+@require_POST
+def api_record_payments(request):
+    """
+    Record a batch of receipts in one transaction.
+
+    Expects ``{"receipts": [{"payment", "amount_paid", "payment_date",
+    "method", "reference", "notes"}, ...]}``. Either every receipt is recorded
+    or none is, and a 400 response names the first one that failed.
+    """
+    try:
+        rows = json.loads(request.body)['receipts']
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({'error': 'Expected a JSON object with a "receipts" list.'}, status=400)
+    if not isinstance(rows, list):
+        return JsonResponse({'error': '"receipts" must be a list.'}, status=400)
+
+    receipts = []
+    for index, row in enumerate(rows):
+        form = PaymentReceiptForm(row if isinstance(row, dict) else {})
+        if not form.is_valid():
+            return JsonResponse({'error': 'Invalid receipt.', 'index': index, 'fields': form.errors}, status=400)
+        receipts.append(form.receipt(form.cleaned_data['payment']))
+
+    try:
+        payments = ledger.record_receipts(receipts, request.user)
+    except ledger.ReceiptError as exc:
+        return JsonResponse({'error': str(exc), 'index': exc.index}, status=400)
+
+    return JsonResponse({
+        'recorded': len(receipts),
+        'payments': [
+            {
+                'id': payment.pk,
+                'amount_paid': float(payment.amount_paid),
+                'remaining': float(payment.remaining_amount),
+                'status': payment.status,
+            }
+            for payment in payments.values()
+        ],
+    })
+
+
+@login_required
+@can_record_attendance
+@require_POST
+def api_sync_attendance(request):
+    """
+    Apply a batch of attendance marks taken offline.
+
+    Expects ``{"key": "<client idempotency key>", "marks": [{"course",
+    "student", "date", "status", "notes"}, ...]}``. Marks may span courses
+    and dates; each gets an "applied" or "rejected" result. Posting the same
+    batch again under its key returns the stored results without reapplying.
+    """
+    try:
+        body = json.loads(request.body)
+        key, items = body['key'], body['marks']
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({'error': 'Expected a JSON object with a "key" and a "marks" list.'}, status=400)
+    if not isinstance(key, str) or not 0 < len(key) <= 64:
+        return JsonResponse({'error': '"key" must be a string of 1 to 64 characters.'}, status=400)
+    if not isinstance(items, list):
+        return JsonResponse({'error': '"marks" must be a list.'}, status=400)
+    if len(items) > MAX_SYNC_MARKS:
+        return JsonResponse({'error': f'At most {MAX_SYNC_MARKS} marks per batch.'}, status=400)
+
+    try:
+        batch, replayed = sync_attendance(request.user, key, items)
+    except SyncKeyConflict as exc:
+        return JsonResponse({'error': str(exc)}, status=409)
+
+    return JsonResponse({
+        'key': batch.key,
+        'replayed': replayed,
+        'applied': batch.applied,
+        'rejected': batch.item_count - batch.applied,
+        'results': batch.results,
+    })
+
 # ==============================================================================
 # AUTHENTICATION & EXPENSE VIEWS
 # Add these to your core/views.py file
@@ -1762,8 +1867,11 @@ def expense_list(request):
     
     pending_count = expenses.filter(status='pending').count()
     
+    page = keyset_paginate(request, expenses, ['-expense_date', '-pk'])
+    
     context = {
-        'expenses': expenses[:100],
+        'expenses': page,
+        'page': page,
         'total_expenses': total_expenses,
         'pending_count': pending_count,
         'expense_types': Expense.EXPENSE_TYPE_CHOICES,
@@ -1892,13 +2000,16 @@ def expense_report(request):
     start_date = request.GET.get('start_date')
     end_date = request.GET.get('end_date')
     
-    expenses = Expense.objects.filter(status='paid')
+    expenses = Expense.objects.filter(status='paid').select_related('submitted_by')
     
     if start_date:
         expenses = expenses.filter(expense_date__gte=start_date)
     if end_date:
         expenses = expenses.filter(expense_date__lte=end_date)
     
+    if wants_csv(request):
+        return export_queryset_csv(expenses.order_by('expense_date', 'pk'), EXPENSE_EXPORT_COLUMNS, 'expenses.csv')
+    
     # Summary by type
     by_type = expenses.values('expense_type').annotate(
         total=Sum('amount'),
@@ -1975,9 +2086,76 @@ def recurring_expense_create(request):
 @admin_required
 def audit_log_view(request):
     """View audit logs"""
-    logs = AuditLog.objects.select_related('user').all()[:200]
+    logs = AuditLog.objects.select_related('user').all()
+    
+    # Filtering
+    user_id = request.GET.get('user')
+    action = request.GET.get('action')
+    model_name = request.GET.get('model')
+    log_date = request.GET.get('date')
+    
+    try:
+        user_id = int(user_id) if user_id else None
+        log_date = date.fromisoformat(log_date) if log_date else None
+    except ValueError:
+        messages.error(request, 'Choose a user from the list and enter dates in the YYYY-MM-DD format.')
+        return redirect('core:audit_log')
+    
+    if user_id:
+        logs = logs.filter(user_id=user_id)
+    if action:
+        logs = logs.filter(action=action)
+    if model_name:
+        logs = logs.filter(model_name__icontains=model_name)
+    if log_date:
+        logs = logs.filter(timestamp__date=log_date)
+    
+    page = keyset_paginate(request, logs, ['-timestamp', '-pk'])
     
     context = {
-        'logs': logs,
+        'audit_logs': page,
+        'page': page,
+        'users': User.objects.order_by('username'),
     }
     return render(request, 'core/audit_log.html', context)
+
+
+@login_required
+@admin_required
+def metrics(request):
+    """Request and PDF timing histograms in Prometheus text format"""
+    return HttpResponse(render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+# ==============================================================================
+# BACKGROUND JOBS
+# ==============================================================================
+
+def _user_job(request, pk):
+    """A job is visible to whoever queued it and to admins."""
+    job = get_object_or_404(Job, pk=pk)
+    if job.created_by_id != request.user.pk and not request.user.is_admin:
+        raise Http404
+    return job
+
+
+@login_required
+def job_detail(request, pk):
+    return render(request, 'core/job_detail.html', {'job': _user_job(request, pk)})
+
+
+@login_required
+def job_status(request, pk):
+    """Polled by the job page until the job finishes"""
+    return JsonResponse(_user_job(request, pk).as_dict())
+
+
+@login_required
+def job_download(request, pk):
+    job = _user_job(request, pk)
+    if job.status != 'succeeded' or not (job.result or {}).get('file'):
+        raise Http404
+    path = Path(settings.MEDIA_ROOT) / job.result['file']
+    if not path.exists():
+        raise Http404
+    return FileResponse(path.open('rb'), as_attachment=True, filename=path.name)